@@ -0,0 +1,338 @@
+"""Snapshot colunar dos gastos em memória para os relatórios analíticos.
+
+Cada gasto é uma linha em arrays NumPy: dia (dias desde 1970-01-01), valor em centavos,
+versão e códigos de dicionário para categoria, tipo de pagamento e descrição (normalizada,
+sem acentos). Qualquer agrupamento (pivot categoria × mês, ano a ano, média móvel, top N
+descrições) é um `bincount` sobre a chave combinada das dimensões, sem consultar o MongoDB.
+
+A carga completa acontece uma vez (e de tempos em tempos, para absorver migrações); depois
+o snapshot só aplica o delta por `versao`: gastos gravados depois da versão consolidada da
+última atualização e os tombstones de `remocoes`. Uma escrita concorrente pode reservar a versão
+antes de outra e gravar depois dela, então o snapshot guarda a versão consolidada (todas as
+anteriores já gravadas) e não a maior vista; o que passou dela é relido e aplicado de novo.
+"""
+import time
+from datetime import date
+
+import numpy as np
+
+from autocompletar import normalizar
+from formato import centavos_do_gasto, data_iso
+
+EPOCA = date(1970, 1, 1).toordinal()
+DELTA_MAXIMO = 50000  # acima disso é mais barato recarregar tudo
+PROJECAO = {
+    "data_gasto": 1, "valor": 1, "valor_centavos": 1, "descricao": 1,
+    "categoria.id": 1, "tipo_pagamento.id": 1, "versao": 1
+}
+COLUNAS = (("dias", np.int32), ("centavos", np.int64), ("versoes", np.int64),
+           ("categorias", np.int32), ("tipos", np.int32), ("descricoes", np.int32), ("ativas", np.bool_))
+DIMENSOES = ("categoria", "tipo_pagamento", "mes", "ano")  # dimensões aceitas no pivot
+
+
+def dia(data_gasto) -> int:
+    """data_gasto (date, data BSON ou string legada) em dias desde 1970-01-01"""
+    if not isinstance(data_gasto, date):
+        data_gasto = date.fromisoformat(data_iso(data_gasto))
+    return data_gasto.toordinal() - EPOCA
+
+
+def rotulo_mes(meses_desde_1970: int) -> str:
+    return f"{1970 + meses_desde_1970 // 12:04d}-{meses_desde_1970 % 12 + 1:02d}"
+
+
+class Dicionario:
+    """Codificação por dicionário: valor -> código inteiro estável enquanto o snapshot existir"""
+
+    def __init__(self):
+        self.valores = []
+        self.codigos = {}
+
+    def codigo(self, valor) -> int:
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def __len__(self):
+        return len(self.valores)
+
+
+class SnapshotGastos:
+    def __init__(self):
+        self.carregado_em = None
+        self.versao_colecao = None  # versão da coleção (ETag) que o snapshot já refletia
+        self.recargas = 0
+        self.deltas = 0
+        self._limpar()
+
+    def _limpar(self):
+        self.n = 0
+        self.removidas = 0
+        self.marca = 0  # versão consolidada: todas as anteriores estão aplicadas
+        self._linhas = {}
+        self._ids = []
+        for nome, tipo in COLUNAS:
+            setattr(self, nome, np.zeros(0, tipo))
+        self.dicionario_categorias = Dicionario()
+        self.dicionario_tipos = Dicionario()
+        self.dicionario_descricoes = Dicionario()
+        self.textos_descricoes = []  # código -> descrição como foi digitada por último
+
+    # 🔄 Carga e atualização
+    def _codigo_descricao(self, descricao) -> int:
+        descricao = descricao if isinstance(descricao, str) else ""
+        codigo = self.dicionario_descricoes.codigo(normalizar(descricao))
+        if codigo == len(self.textos_descricoes):
+            self.textos_descricoes.append(descricao)
+        else:
+            self.textos_descricoes[codigo] = descricao
+        return codigo
+
+    def _linha(self, documento: dict) -> tuple:
+        return (
+            dia(documento["data_gasto"]),
+            centavos_do_gasto(documento),
+            documento.get("versao", 0),
+            self.dicionario_categorias.codigo((documento.get("categoria") or {}).get("id")),
+            self.dicionario_tipos.codigo((documento.get("tipo_pagamento") or {}).get("id")),
+            self._codigo_descricao(documento.get("descricao")),
+            True,
+        )
+
+    def _reservar(self, quantidade: int):
+        capacidade = len(self.dias)
+        if self.n + quantidade <= capacidade:
+            return
+        nova = max(1024, capacidade * 2, self.n + quantidade)
+        for nome, tipo in COLUNAS:
+            coluna = np.zeros(nova, tipo)
+            coluna[:self.n] = getattr(self, nome)[:self.n]
+            setattr(self, nome, coluna)
+
+    async def recarregar(self, gastos, versao: int):
+        """Carga completa; `versao` é a versão consolidada lida antes da consulta"""
+        # Monta em um snapshot novo e troca no fim: consultas durante a carga veem o anterior
+        novo = SnapshotGastos()
+        ids = []
+        linhas = []
+        async for documento in gastos.find({}, PROJECAO):
+            try:
+                linhas.append(novo._linha(documento))
+            except (KeyError, TypeError, ValueError):
+                continue  # documento sem data/valor válidos não entra nos relatórios
+            ids.append(str(documento["_id"]))
+
+        novo._reservar(len(linhas))
+        if linhas:
+            for (nome, tipo), valores in zip(COLUNAS, zip(*linhas)):
+                getattr(novo, nome)[:len(linhas)] = np.fromiter(valores, tipo, len(linhas))
+        novo.n = len(linhas)
+        novo._ids = ids
+        novo._linhas = {gasto_id: linha for linha, gasto_id in enumerate(ids)}
+        novo.marca = versao
+        novo.carregado_em = time.monotonic()
+        novo.versao_colecao = self.versao_colecao
+        novo.recargas = self.recargas + 1
+        novo.deltas = self.deltas
+        self.__dict__.update(novo.__dict__)
+
+    def aplicar(self, documento: dict):
+        gasto_id = str(documento["_id"])
+        linha = self._linhas.get(gasto_id)
+        versao = documento.get("versao", 0)
+        if linha is not None and self.versoes[linha] >= versao:
+            return  # já aplicado (sobreposição do delta)
+        try:
+            valores = self._linha(documento)
+        except (KeyError, TypeError, ValueError):
+            self.remover(gasto_id)
+            return
+        if linha is None:
+            self._reservar(1)
+            linha = self._linhas[gasto_id] = self.n
+            self._ids.append(gasto_id)
+            self.n += 1
+        for (nome, _), valor in zip(COLUNAS, valores):
+            getattr(self, nome)[linha] = valor
+
+    def remover(self, gasto_id: str):
+        linha = self._linhas.pop(gasto_id, None)
+        if linha is not None:
+            self.ativas[linha] = False
+            self.removidas += 1
+
+    async def aplicar_delta(self, gastos, remocoes, consolidada: int) -> bool:
+        """Aplica as alterações desde a última versão consolidada; False se o delta for grande demais"""
+        desde = self.marca
+        alterados = await gastos.find({"versao": {"$gt": desde}}, PROJECAO).sort("versao", 1).limit(DELTA_MAXIMO + 1).to_list(None)
+        removidos = await remocoes.find(
+            {"colecao": "gastos", "versao": {"$gt": desde}}, {"documento_id": 1, "versao": 1}
+        ).sort("versao", 1).limit(DELTA_MAXIMO + 1).to_list(None)
+        if len(alterados) > DELTA_MAXIMO or len(removidos) > DELTA_MAXIMO:
+            return False
+
+        eventos = sorted(
+            [(documento["versao"], 0, documento) for documento in alterados] +
+            [(remocao["versao"], 1, remocao) for remocao in removidos],
+            key=lambda evento: evento[:2]
+        )
+        for versao, removido, documento in eventos:
+            if removido:
+                self.remover(documento["documento_id"])
+            else:
+                self.aplicar(documento)
+        self.marca = max(self.marca, consolidada)
+        if self.removidas > 1024 and self.removidas > self.n // 4:
+            self._compactar()
+        self.deltas += 1
+        return True
+
+    def _compactar(self):
+        ativas = np.flatnonzero(self.ativas[:self.n])
+        for nome, _ in COLUNAS:
+            setattr(self, nome, getattr(self, nome)[ativas].copy())
+        self._ids = [self._ids[linha] for linha in ativas]
+        self._linhas = {gasto_id: linha for linha, gasto_id in enumerate(self._ids)}
+        self.n = len(self._ids)
+        self.removidas = 0
+
+    # 📊 Consultas vetorizadas
+    def filtrar(self, de=None, ate=None, categoria_id=None, tipo_pagamento_id=None) -> np.ndarray:
+        """Índices das linhas ativas no período (inclusive) e nos filtros"""
+        mascara = self.ativas[:self.n].copy()
+        dias = self.dias[:self.n]
+        if de is not None:
+            mascara &= dias >= dia(de)
+        if ate is not None:
+            mascara &= dias <= dia(ate)
+        for valor, dicionario, coluna in (
+            (categoria_id, self.dicionario_categorias, self.categorias),
+            (tipo_pagamento_id, self.dicionario_tipos, self.tipos),
+        ):
+            if valor is not None:
+                codigo = dicionario.codigos.get(valor)
+                if codigo is None:
+                    return np.zeros(0, np.int64)
+                mascara &= coluna[:self.n] == codigo
+        return np.flatnonzero(mascara)
+
+    def _meses(self, linhas: np.ndarray) -> np.ndarray:
+        """Meses desde 1970-01 de cada linha; converte só os dias distintos do intervalo e indexa"""
+        dias = self.dias[linhas]
+        if not len(dias):
+            return np.zeros(0, np.int32)
+        inicio = int(dias.min())
+        tabela = np.arange(inicio, int(dias.max()) + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+        return tabela[dias - inicio]
+
+    def _dimensao(self, dimensao: str, linhas: np.ndarray) -> tuple:
+        """(código por linha, chave de cada código) de uma dimensão"""
+        if dimensao == "categoria":
+            return self.categorias[linhas], list(self.dicionario_categorias.valores)
+        if dimensao == "tipo_pagamento":
+            return self.tipos[linhas], list(self.dicionario_tipos.valores)
+        if dimensao == "descricao":
+            return self.descricoes[linhas], list(self.textos_descricoes)
+
+        meses = self._meses(linhas)
+        if dimensao == "mes_do_ano":
+            return meses % 12, list(range(1, 13))
+        if dimensao == "ano":
+            anos = meses // 12
+            inicio = int(anos.min()) if len(anos) else 0
+            quantidade = int(anos.max()) - inicio + 1 if len(anos) else 0
+            return anos - inicio, [1970 + inicio + indice for indice in range(quantidade)]
+        # Meses contíguos entre o primeiro e o último (os vazios aparecem com zero)
+        inicio = int(meses.min()) if len(meses) else 0
+        quantidade = int(meses.max()) - inicio + 1 if len(meses) else 0
+        return meses - inicio, [rotulo_mes(inicio + indice) for indice in range(quantidade)]
+
+    def agrupar(self, dimensoes: tuple, linhas: np.ndarray) -> tuple:
+        """(chaves de cada dimensão, totais em centavos, quantidades), arrays com uma dimensão por agrupamento"""
+        codigos, chaves = zip(*(self._dimensao(dimensao, linhas) for dimensao in dimensoes))
+        formato = tuple(max(len(chave), 1) for chave in chaves)
+        tamanho = int(np.prod(formato))
+        # Chave combinada em aritmética int32 (mais rápida que ravel_multi_index em milhões de linhas)
+        tipo = np.int32 if tamanho < 2 ** 31 else np.int64
+        combinada = codigos[0].astype(tipo, copy=False)
+        for codigo, cardinalidade in zip(codigos[1:], formato[1:]):
+            combinada = combinada * tipo(cardinalidade) + codigo
+        totais = np.bincount(combinada, weights=self.centavos[linhas], minlength=tamanho)
+        quantidades = np.bincount(combinada, minlength=tamanho)
+        # Pesos viram float64: exato para somas até 2^53 centavos
+        recorte = tuple(slice(0, len(chave)) for chave in chaves)
+        totais = np.rint(totais).astype(np.int64).reshape(formato)[recorte]
+        return list(chaves), totais, quantidades.reshape(formato)[recorte]
+
+    def pivot(self, dimensao_linhas: str, dimensao_colunas: str, linhas: np.ndarray) -> dict:
+        """Tabela linhas × colunas; categorias/tipos sem gasto na seleção ficam de fora (meses e anos não)"""
+        (chaves_linhas, chaves_colunas), totais, quantidades = self.agrupar((dimensao_linhas, dimensao_colunas), linhas)
+        eixos = []
+        for eixo, dimensao in enumerate((dimensao_linhas, dimensao_colunas)):
+            if dimensao in ("categoria", "tipo_pagamento"):
+                eixos.append(np.flatnonzero(quantidades.sum(axis=1 - eixo)))
+            else:
+                eixos.append(np.arange(quantidades.shape[eixo]))
+        totais = totais[np.ix_(*eixos)]
+        quantidades = quantidades[np.ix_(*eixos)]
+        return {
+            "linhas": [chaves_linhas[indice] for indice in eixos[0]],
+            "colunas": [chaves_colunas[indice] for indice in eixos[1]],
+            "totais": totais.tolist(),
+            "quantidades": quantidades.tolist()
+        }
+
+    def ano_a_ano(self, ano: int, por: str, linhas: np.ndarray) -> dict:
+        """Totais de `ano` e do ano anterior por mês do ano, categoria ou tipo de pagamento"""
+        dimensao = "mes_do_ano" if por == "mes" else por
+        (anos, chaves), totais, quantidades = self.agrupar(("ano", dimensao), linhas)
+        resultado = {}
+        for rotulo, alvo in (("atual", ano), ("anterior", ano - 1)):
+            if alvo in anos:
+                resultado[rotulo] = (totais[anos.index(alvo)], quantidades[anos.index(alvo)])
+            else:
+                resultado[rotulo] = (np.zeros(len(chaves), np.int64), np.zeros(len(chaves), np.int64))
+        manter = np.arange(len(chaves)) if por == "mes" else np.flatnonzero(resultado["atual"][1] + resultado["anterior"][1])
+        return {
+            "chaves": [chaves[indice] for indice in manter],
+            "totais": resultado["atual"][0][manter].tolist(),
+            "totais_anteriores": resultado["anterior"][0][manter].tolist(),
+            "quantidades": resultado["atual"][1][manter].tolist(),
+            "quantidades_anteriores": resultado["anterior"][1][manter].tolist()
+        }
+
+    def media_movel(self, janela: int, linhas: np.ndarray) -> dict:
+        """Série mensal contígua com a média dos últimos `janela` meses (None até completar a janela)"""
+        (meses,), totais, quantidades = self.agrupar(("mes",), linhas)
+        acumulado = np.concatenate(([0], np.cumsum(totais)))
+        medias = (acumulado[janela:] - acumulado[:-janela]) / janela if len(totais) >= janela else np.zeros(0)
+        return {
+            "meses": meses,
+            "totais": totais.tolist(),
+            "quantidades": quantidades.tolist(),
+            "medias": [None] * min(janela - 1, len(totais)) + medias.tolist()
+        }
+
+    def top_descricoes(self, quantidade: int, metrica: str, linhas: np.ndarray) -> list:
+        """As `quantidade` descrições de maior total (ou frequência): (descrição, total, quantidade)"""
+        (textos,), totais, quantidades = self.agrupar(("descricao",), linhas)
+        valores = totais if metrica == "total" else quantidades
+        candidatas = np.flatnonzero(quantidades)
+        if len(candidatas) > quantidade:
+            # argpartition: O(n) para separar as N maiores, ordenando só elas
+            candidatas = candidatas[np.argpartition(-valores[candidatas], quantidade - 1)[:quantidade]]
+        candidatas = candidatas[np.lexsort((-quantidades[candidatas], -valores[candidatas]))]
+        return [(textos[indice], int(totais[indice]), int(quantidades[indice])) for indice in candidatas]
+
+    def estatisticas(self) -> dict:
+        return {
+            "linhas": self.n - self.removidas,
+            "removidas_pendentes": self.removidas,
+            "versao": self.marca,
+            "recargas": self.recargas,
+            "deltas": self.deltas,
+            "memoria_bytes": sum(getattr(self, nome).nbytes for nome, _ in COLUNAS),
+            "idade_segundos": round(time.monotonic() - self.carregado_em, 1) if self.carregado_em else None
+        }
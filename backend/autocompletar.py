@@ -0,0 +1,101 @@
+"""Índice em memória de descrições de gastos para autocompletar.
+
+Guarda as descrições usadas mais recentemente (até `tamanho_maximo`) em uma lista
+ordenada de chaves normalizadas (minúsculas, sem acentos): a busca por prefixo é
+um `bisect` seguido de uma varredura curta. Além da descrição inteira, cada
+palavra a partir da segunda também vira chave, então "ub" sugere "Corrida Uber".
+"""
+import bisect
+import time
+import unicodedata
+
+MAX_CANDIDATOS = 500
+
+
+def normalizar(texto: str) -> str:
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return " ".join("".join(c for c in decomposto if not unicodedata.combining(c)).split())
+
+
+def _chaves(normalizada: str) -> list:
+    palavras = normalizada.split(" ")
+    return [" ".join(palavras[indice:]) for indice in range(len(palavras))]
+
+
+class IndiceDescricoes:
+    def __init__(self, tamanho_maximo: int = 5000):
+        self.tamanho_maximo = tamanho_maximo
+        self._entradas = {}  # normalizada -> [descrição, quantidade, último uso]
+        self._chaves = []    # (chave, normalizada), ordenada
+
+    def carregar(self, descricoes):
+        """Substitui o conteúdo por (descrição, quantidade, último uso) vindos do banco"""
+        entradas = {}
+        for descricao, quantidade, ultimo_uso in descricoes:
+            normalizada = normalizar(descricao)
+            if normalizada:
+                entradas[normalizada] = [descricao, quantidade, ultimo_uso]
+        self._reconstruir(entradas)
+
+    def registrar(self, descricao: str):
+        """Conta um uso da descrição (gasto criado/atualizado)"""
+        normalizada = normalizar(descricao)
+        if not normalizada:
+            return
+        entrada = self._entradas.get(normalizada)
+        if entrada is not None:
+            entrada[0] = descricao
+            entrada[1] += 1
+            entrada[2] = time.time()
+            return
+
+        self._entradas[normalizada] = [descricao, 1, time.time()]
+        for chave in _chaves(normalizada):
+            bisect.insort(self._chaves, (chave, normalizada))
+        # Poda em blocos para não pagar O(n) a cada descrição nova
+        if len(self._entradas) > self.tamanho_maximo * 1.2:
+            self._reconstruir(self._entradas)
+
+    def descartar(self, descricao: str):
+        """Desconta um uso da descrição (gasto removido ou com a descrição alterada)"""
+        normalizada = normalizar(descricao)
+        entrada = self._entradas.get(normalizada)
+        if entrada is None:
+            return
+        entrada[1] -= 1
+        if entrada[1] > 0:
+            return
+
+        del self._entradas[normalizada]
+        for chave in _chaves(normalizada):
+            posicao = bisect.bisect_left(self._chaves, (chave, normalizada))
+            if posicao < len(self._chaves) and self._chaves[posicao] == (chave, normalizada):
+                del self._chaves[posicao]
+
+    def sugerir(self, prefixo: str, limite: int = 10) -> list:
+        prefixo = normalizar(prefixo)
+        if not prefixo:
+            return []
+
+        candidatos = {}
+        posicao = bisect.bisect_left(self._chaves, (prefixo,))
+        while posicao < len(self._chaves) and len(candidatos) < MAX_CANDIDATOS:
+            chave, normalizada = self._chaves[posicao]
+            if not chave.startswith(prefixo):
+                break
+            candidatos[normalizada] = self._entradas[normalizada]
+            posicao += 1
+
+        # Mais usadas primeiro; empate pela mais recente
+        melhores = sorted(candidatos.values(), key=lambda entrada: (-entrada[1], -entrada[2]))[:limite]
+        return [{"descricao": descricao, "quantidade": quantidade} for descricao, quantidade, _ in melhores]
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _reconstruir(self, entradas: dict):
+        # Poda pelo uso mais recente (descrições novas não são expulsas pelas antigas frequentes);
+        # a frequência só ordena as sugestões
+        mantidas = sorted(entradas.items(), key=lambda item: -item[1][2])[:self.tamanho_maximo]
+        self._entradas = dict(mantidas)
+        self._chaves = sorted((chave, normalizada) for normalizada in self._entradas for chave in _chaves(normalizada))
@@ -0,0 +1,1052 @@
+"""Banco embutido em memória com a interface do Motor usada pelo projeto.
+
+Usado com `ARMAZENAMENTO=local`, no modo offline (quando o MongoDB não responde ao
+ping da inicialização) e para rodar a API e o benchmark sem servidor de banco. No modo
+offline os dados são outros: o que for gravado aqui não é enviado ao MongoDB depois.
+
+As rotas não mudam: cada coleção expõe find/find_one/count_documents, insert/update/delete,
+find_one_and_*, bulk_write e aggregate, mas só com os operadores que as rotas e os
+scripts usam; qualquer outro levanta OperationFailure (código 115) em vez de ser
+aproximado. `paridade.py` compara os resultados com os do MongoDB nas consultas das rotas.
+`indices.sincronizar` cria aqui os índices declarados em `indices.py`. Os únicos
+(inclusive parciais) são respeitados com o mesmo erro 11000 do MongoDB; o de texto
+atende `$text` por palavras inteiras (sem acento/caixa), sem o stemming do servidor; os
+demais são listas ordenadas: o filtro vira uma faixa do primeiro campo (bisect) e, quando
+o índice já está na ordem pedida, a leitura para no limite. As operações são síncronas
+por dentro, então cada uma é atômica no event loop.
+
+Com `ARMAZENAMENTO_LOCAL_DIR` os dados são carregados desse diretório e salvos em
+`<banco>/<coleção>.bson` (o formato do mongodump, restaurável com mongorestore);
+sem ele ficam só na memória. Um processo por diretório: com vários workers cada um
+teria a própria cópia dos dados.
+"""
+import bisect
+import heapq
+import os
+from datetime import datetime
+
+import bson
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, IndexModel, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from autocompletar import normalizar
+
+_FALTANDO = object()
+
+# Ordem de comparação entre tipos do BSON (null < números < strings < objetos < ... < datas)
+_ORDEM_NULO, _ORDEM_NUMERO, _ORDEM_TEXTO, _ORDEM_OBJETO, _ORDEM_LISTA = 1, 2, 3, 4, 5
+_ORDEM_BINARIO, _ORDEM_OBJECTID, _ORDEM_BOOLEANO, _ORDEM_DATA = 6, 7, 8, 9
+
+# $type só com os tipos que as consultas do projeto usam (datas gravadas como texto pela versão antiga)
+_TIPOS = {
+    "string": lambda valor: isinstance(valor, str),
+    "date": lambda valor: isinstance(valor, datetime),
+}
+
+
+def _nao_suportado(descricao: str):
+    return OperationFailure(f"{descricao} não é suportado pelo banco local", code=115)
+
+
+# 🧩 Documentos: caminhos com ponto, cópia e ordenação
+def _valor(documento: dict, caminho: str):
+    atual = documento
+    for parte in caminho.split("."):
+        if not isinstance(atual, dict) or parte not in atual:
+            return _FALTANDO
+        atual = atual[parte]
+    return atual
+
+
+def _definir(documento: dict, caminho: str, valor):
+    *pais, campo = caminho.split(".")
+    for parte in pais:
+        documento = documento.setdefault(parte, {})
+    documento[campo] = valor
+
+
+def _remover(documento: dict, caminho: str):
+    *pais, campo = caminho.split(".")
+    for parte in pais:
+        documento = documento.get(parte)
+        if not isinstance(documento, dict):
+            return
+    documento.pop(campo, None)
+
+
+def _copiar(valor):
+    if isinstance(valor, dict):
+        return {chave: _copiar(item) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar(item) for item in valor]
+    return valor
+
+
+def _ordem(valor) -> int:
+    if valor is None or valor is _FALTANDO:
+        return _ORDEM_NULO
+    if isinstance(valor, bool):
+        return _ORDEM_BOOLEANO
+    if isinstance(valor, (int, float)):
+        return _ORDEM_NUMERO
+    if isinstance(valor, str):
+        return _ORDEM_TEXTO
+    if isinstance(valor, dict):
+        return _ORDEM_OBJETO
+    if isinstance(valor, list):
+        return _ORDEM_LISTA
+    if isinstance(valor, bytes):
+        return _ORDEM_BINARIO
+    if isinstance(valor, ObjectId):
+        return _ORDEM_OBJECTID
+    if isinstance(valor, datetime):
+        return _ORDEM_DATA
+    raise _nao_suportado(f"O tipo {type(valor).__name__}")
+
+
+def _chave_ordenacao(valor) -> tuple:
+    ordem = _ordem(valor)
+    if ordem == _ORDEM_NULO:
+        return (ordem, 0)
+    if ordem in (_ORDEM_OBJETO, _ORDEM_LISTA):
+        return (ordem, repr(valor))
+    return (ordem, valor)
+
+
+def _hashavel(valor):
+    if valor is _FALTANDO:
+        return None
+    if isinstance(valor, (dict, list)):
+        return repr(valor)
+    return valor
+
+
+# 🔍 Filtros (linguagem de consulta do MongoDB, subconjunto)
+def _corresponde(documento: dict, filtro: dict) -> bool:
+    for chave, condicao in filtro.items():
+        if chave == "$or":
+            if not any(_corresponde(documento, item) for item in condicao):
+                return False
+        elif chave == "$and":
+            if not all(_corresponde(documento, item) for item in condicao):
+                return False
+        elif chave.startswith("$"):
+            raise _nao_suportado(f"O operador {chave}")
+        elif not _condicao(_valor(documento, chave), condicao):
+            return False
+    return True
+
+
+def _eh_operador(condicao) -> bool:
+    return isinstance(condicao, dict) and bool(condicao) and all(chave.startswith("$") for chave in condicao)
+
+
+def _condicao(valor, condicao) -> bool:
+    if _eh_operador(condicao):
+        return all(_operador(valor, operador, argumento) for operador, argumento in condicao.items())
+    return _igual(valor, condicao)
+
+
+def _igual(valor, esperado) -> bool:
+    if valor is _FALTANDO:
+        return esperado is None
+    if isinstance(valor, list) and not isinstance(esperado, list):
+        return any(_igual(item, esperado) for item in valor)
+    return _ordem(valor) == _ordem(esperado) and valor == esperado
+
+
+def _comparar(valor, argumento, comparacao) -> bool:
+    # Comparações só entre valores do mesmo tipo BSON, como no servidor
+    if isinstance(valor, list):
+        return any(_comparar(item, argumento, comparacao) for item in valor)
+    if valor is _FALTANDO or _ordem(valor) != _ordem(argumento):
+        return False
+    try:
+        return comparacao(_chave_ordenacao(valor), _chave_ordenacao(argumento))
+    except TypeError:
+        return False
+
+
+def _operador(valor, operador: str, argumento) -> bool:
+    if operador == "$ne":
+        return not _igual(valor, argumento)
+    if operador == "$gt":
+        return _comparar(valor, argumento, lambda a, b: a > b)
+    if operador == "$gte":
+        return _comparar(valor, argumento, lambda a, b: a >= b)
+    if operador == "$lt":
+        return _comparar(valor, argumento, lambda a, b: a < b)
+    if operador == "$lte":
+        return _comparar(valor, argumento, lambda a, b: a <= b)
+    if operador == "$in":
+        return any(_igual(valor, item) for item in argumento)
+    if operador == "$exists":
+        return (valor is not _FALTANDO) == bool(argumento)
+    if operador == "$type":
+        tipos = argumento if isinstance(argumento, list) else [argumento]
+        for tipo in tipos:
+            if tipo not in _TIPOS:
+                raise _nao_suportado(f"O tipo {tipo!r} em $type")
+        return valor is not _FALTANDO and any(_TIPOS[tipo](valor) for tipo in tipos)
+    raise _nao_suportado(f"O operador {operador}")
+
+
+# ✏️ Atualizações
+def _aplicar_atualizacao(documento: dict, atualizacao: dict, inserindo: bool) -> dict:
+    """Documento resultante (cópia) de uma atualização com operadores ou de uma substituição"""
+    if not any(chave.startswith("$") for chave in atualizacao):
+        novo = _copiar(atualizacao)
+        if "_id" in documento:
+            novo["_id"] = documento["_id"]
+        return novo
+
+    novo = _copiar(documento)
+    for operador, campos in atualizacao.items():
+        if operador == "$setOnInsert" and not inserindo:
+            continue
+        for caminho, argumento in campos.items():
+            if caminho == "_id" and operador != "$setOnInsert":
+                raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+            atual = _valor(novo, caminho)
+            if operador in ("$set", "$setOnInsert"):
+                _definir(novo, caminho, _copiar(argumento))
+            elif operador == "$unset":
+                _remover(novo, caminho)
+            elif operador == "$inc":
+                if atual is not _FALTANDO and _ordem(atual) != _ORDEM_NUMERO:
+                    raise WriteError(f"Cannot apply $inc to a value of non-numeric type ({caminho})", 14)
+                _definir(novo, caminho, argumento if atual is _FALTANDO else atual + argumento)
+            elif operador == "$max":
+                if atual is _FALTANDO or _chave_ordenacao(argumento) > _chave_ordenacao(atual):
+                    _definir(novo, caminho, _copiar(argumento))
+            else:
+                raise _nao_suportado(f"O operador de atualização {operador}")
+    return novo
+
+
+def _base_upsert(filtro: dict) -> dict:
+    """Campos de igualdade do filtro, que viram o documento inicial de um upsert"""
+    base = {}
+    for chave, condicao in filtro.items():
+        if chave == "$and":
+            for item in condicao:
+                for caminho, valor in _base_upsert(item).items():
+                    _definir(base, caminho, valor)
+        elif not chave.startswith("$") and not _eh_operador(condicao):
+            _definir(base, chave, _copiar(condicao))
+    return base
+
+
+# 🎯 Projeção e ordenação
+def _projetar(documento: dict, projecao, pontuacao=None) -> dict:
+    if not projecao:
+        return _copiar(documento)
+
+    incluidos, excluidos, meta = [], [], []
+    for caminho, opcao in projecao.items():
+        if isinstance(opcao, dict) and opcao.get("$meta") == "textScore":
+            meta.append(caminho)
+        elif opcao:
+            incluidos.append(caminho)
+        elif caminho != "_id":
+            excluidos.append(caminho)
+
+    if incluidos:
+        resultado = {}
+        if projecao.get("_id", 1) and "_id" in documento:
+            resultado["_id"] = documento["_id"]
+        for caminho in incluidos:
+            valor = _valor(documento, caminho)
+            if valor is not _FALTANDO:
+                _definir(resultado, caminho, _copiar(valor))
+    else:
+        resultado = _copiar(documento)
+        for caminho in excluidos:
+            _remover(resultado, caminho)
+        if not projecao.get("_id", 1):
+            resultado.pop("_id", None)
+
+    for caminho in meta:
+        resultado[caminho] = pontuacao or 0.0
+    return resultado
+
+
+def _criterios(ordenacao, pontuacoes: dict) -> list:
+    criterios = []
+    for campo, direcao in ordenacao:
+        if isinstance(direcao, dict):
+            # {"$meta": "textScore"}: maior relevância primeiro
+            criterios.append((lambda documento: pontuacoes.get(documento["_id"], 0.0), -1))
+        else:
+            criterios.append((lambda documento, campo=campo: _chave_ordenacao(_valor(documento, campo)), direcao))
+    return criterios
+
+
+def _ordenar(documentos: list, ordenacao, quantidade: int = 0, pontuacoes: dict = None) -> list:
+    criterios = _criterios(ordenacao, pontuacoes or {})
+    direcoes = {direcao for _, direcao in criterios}
+    if len(direcoes) == 1:
+        def chave(documento):
+            return tuple(funcao(documento) for funcao, _ in criterios)
+        decrescente = direcoes == {-1}
+        if quantidade and quantidade < len(documentos):
+            # Só as primeiras posições (listagens paginadas): O(n log k)
+            selecionar = heapq.nlargest if decrescente else heapq.nsmallest
+            return selecionar(quantidade, documentos, key=chave)
+        return sorted(documentos, key=chave, reverse=decrescente)
+
+    documentos = list(documentos)
+    for funcao, direcao in reversed(criterios):
+        documentos.sort(key=funcao, reverse=direcao == -1)
+    return documentos
+
+
+# 🧮 Agregação
+def _avaliar(expressao, documento: dict):
+    if isinstance(expressao, str) and expressao.startswith("$"):
+        valor = _valor(documento, expressao[1:])
+        return None if valor is _FALTANDO else valor
+    if isinstance(expressao, list):
+        return [_avaliar(item, documento) for item in expressao]
+    if not isinstance(expressao, dict):
+        return expressao
+    if not _eh_operador(expressao):
+        return {chave: _avaliar(item, documento) for chave, item in expressao.items()}
+
+    (operador, argumento), = expressao.items()
+    valores = _avaliar(argumento if isinstance(argumento, list) else [argumento], documento)
+    if operador == "$ifNull":
+        return next((valor for valor in valores if valor is not None), None)
+    if operador in ("$year", "$month"):
+        data = valores[0]
+        if data is None:
+            return None
+        if not isinstance(data, datetime):
+            raise OperationFailure(f"can't convert from BSON type {type(data).__name__} to Date", code=16006)
+        return data.year if operador == "$year" else data.month
+    if any(valor is None for valor in valores):
+        return None
+    if operador == "$add":
+        return sum(valores)
+    if operador == "$multiply":
+        resultado = 1
+        for valor in valores:
+            resultado *= valor
+        return resultado
+    if operador == "$round":
+        # Como no servidor: arredondamento bancário (metade para o par)
+        resultado = round(valores[0], valores[1] if len(valores) > 1 else 0)
+        return float(resultado) if isinstance(valores[0], float) else resultado
+    raise _nao_suportado(f"O operador de expressão {operador}")
+
+
+def _acumular(operador: str, valores: list):
+    if operador == "$sum":
+        return sum(valor for valor in valores if _ordem(valor) == _ORDEM_NUMERO)
+    if operador == "$first":
+        return valores[0] if valores else None
+    if operador == "$last":
+        return valores[-1] if valores else None
+    if operador == "$max":
+        presentes = [valor for valor in valores if valor is not None]
+        return max(presentes, key=_chave_ordenacao) if presentes else None
+    raise _nao_suportado(f"O acumulador {operador}")
+
+
+def _agrupar(documentos: list, especificacao: dict) -> list:
+    grupos = {}
+    for documento in documentos:
+        chave = _avaliar(especificacao["_id"], documento)
+        grupo = grupos.setdefault(repr(chave), (chave, []))
+        grupo[1].append(documento)
+
+    resultado = []
+    for chave, membros in grupos.values():
+        saida = {"_id": chave}
+        for campo, acumulador in especificacao.items():
+            if campo == "_id":
+                continue
+            (operador, expressao), = acumulador.items()
+            saida[campo] = _acumular(operador, [_avaliar(expressao, membro) for membro in membros])
+        resultado.append(saida)
+    return resultado
+
+
+def _projetar_estagio(documento: dict, especificacao: dict) -> dict:
+    # 0/1 incluem ou excluem campos; qualquer outro valor é uma expressão calculada
+    simples = {campo: opcao for campo, opcao in especificacao.items() if isinstance(opcao, (bool, int))}
+    calculados = {campo: opcao for campo, opcao in especificacao.items() if campo not in simples}
+    if not calculados and not any(opcao for campo, opcao in simples.items() if campo != "_id"):
+        return _projetar(documento, simples)
+
+    resultado = {}
+    if simples.get("_id", 1) and "_id" in documento:
+        resultado["_id"] = documento["_id"]
+    for campo, opcao in simples.items():
+        valor = _valor(documento, campo)
+        if opcao and campo != "_id" and valor is not _FALTANDO:
+            _definir(resultado, campo, _copiar(valor))
+    for campo, expressao in calculados.items():
+        _definir(resultado, campo, _copiar(_avaliar(expressao, documento)))
+    return resultado
+
+
+# 📐 Planejamento: intervalo de chaves que um filtro permite no primeiro campo de um índice
+# (lo, lo_inclusivo, hi, hi_inclusivo) sobre as chaves de ordenação; None de um lado = aberto
+def _intervalo_condicao(condicao):
+    if not _eh_operador(condicao):
+        chave = _chave_ordenacao(condicao)
+        return (chave, True, chave, True)
+
+    intervalo = None
+    for operador, argumento in condicao.items():
+        ordem = _ordem(argumento) if operador in ("$gt", "$gte", "$lt", "$lte") else None
+        if operador == "$eq":
+            chave = _chave_ordenacao(argumento)
+            atual = (chave, True, chave, True)
+        elif operador in ("$gt", "$gte"):
+            # Comparações respeitam o tipo BSON: o limite superior é o fim do tipo do argumento
+            atual = (_chave_ordenacao(argumento), operador == "$gte", (ordem + 1,), False)
+        elif operador in ("$lt", "$lte"):
+            atual = ((ordem,), True, _chave_ordenacao(argumento), operador == "$lte")
+        elif operador == "$in" and argumento:
+            chaves = sorted(_chave_ordenacao(valor) for valor in argumento)
+            atual = (chaves[0], True, chaves[-1], True)
+        else:
+            continue
+        intervalo = _intersecao(intervalo, atual)
+    return intervalo
+
+
+def _intersecao(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    lo, lo_inclusivo = max((a[0], a[1]), (b[0], b[1]), key=lambda lado: (lado[0] is not None, lado[0] or (), not lado[1]))
+    hi, hi_inclusivo = min((a[2], a[3]), (b[2], b[3]), key=lambda lado: (lado[0] is None, lado[0] or (), lado[1]))
+    return (lo, lo_inclusivo, hi, hi_inclusivo)
+
+
+def _uniao(intervalos: list):
+    lo = lo_inclusivo = hi = hi_inclusivo = None
+    for atual in intervalos:
+        if lo is not False:
+            if atual[0] is None:
+                lo = False
+            elif lo is None or atual[0] < lo or atual[0] == lo and atual[1]:
+                lo, lo_inclusivo = atual[0], atual[1]
+        if hi is not False:
+            if atual[2] is None:
+                hi = False
+            elif hi is None or atual[2] > hi or atual[2] == hi and atual[3]:
+                hi, hi_inclusivo = atual[2], atual[3]
+    return (lo or None, lo_inclusivo, hi or None, hi_inclusivo)
+
+
+def _intervalo(filtro: dict, campo: str):
+    """Intervalo que contém todos os valores de `campo` aceitos pelo filtro; None se não restringe"""
+    intervalo = None
+    for chave, condicao in filtro.items():
+        if chave == campo:
+            atual = _intervalo_condicao(condicao)
+        elif chave == "$and":
+            atual = None
+            for item in condicao:
+                atual = _intersecao(atual, _intervalo(item, campo))
+        elif chave == "$or":
+            ramos = [_intervalo(item, campo) for item in condicao]
+            atual = None if not ramos or None in ramos else _uniao(ramos)
+        else:
+            continue
+        intervalo = _intersecao(intervalo, atual)
+    return intervalo
+
+
+def _primeira_chave(entrada):
+    return entrada[0][0]
+
+
+class _IndiceOrdenado:
+    """Entradas (chaves dos campos + _id, _id) em ordem crescente; percorrido nos dois sentidos"""
+
+    def __init__(self, campos: list):
+        self.campos = campos
+        self.entradas = []
+
+    def entrada(self, documento: dict) -> tuple:
+        chaves = tuple(_chave_ordenacao(_valor(documento, campo)) for campo in self.campos)
+        return (chaves + (_chave_ordenacao(documento["_id"]),), documento["_id"])
+
+    def adicionar(self, documento: dict):
+        bisect.insort(self.entradas, self.entrada(documento))
+
+    def remover(self, documento: dict):
+        entrada = self.entrada(documento)
+        posicao = bisect.bisect_left(self.entradas, entrada)
+        if posicao < len(self.entradas) and self.entradas[posicao] == entrada:
+            del self.entradas[posicao]
+
+    def faixa(self, intervalo) -> tuple:
+        inicio, fim = 0, len(self.entradas)
+        if intervalo is None:
+            return inicio, fim
+        lo, lo_inclusivo, hi, hi_inclusivo = intervalo
+        if lo is not None:
+            busca = bisect.bisect_left if lo_inclusivo else bisect.bisect_right
+            inicio = busca(self.entradas, lo, key=_primeira_chave)
+        if hi is not None:
+            busca = bisect.bisect_right if hi_inclusivo else bisect.bisect_left
+            fim = busca(self.entradas, hi, key=_primeira_chave)
+        return inicio, max(inicio, fim)
+
+    def ordem(self, ordenacao, intervalo):
+        """1/-1 se percorrer o índice já entrega a ordenação pedida; None se não"""
+        if not ordenacao or any(not isinstance(direcao, int) for _, direcao in ordenacao):
+            return None
+        direcoes = {direcao for _, direcao in ordenacao}
+        if len(direcoes) != 1:
+            return None
+        campos = [campo for campo, _ in ordenacao]
+        igualdade = intervalo is not None and intervalo[0] == intervalo[2] and intervalo[1] and intervalo[3]
+        disponiveis = self.campos + ["_id"]
+        if disponiveis[:len(campos)] == campos or igualdade and disponiveis[1:1 + len(campos)] == campos:
+            return direcoes.pop()
+        return None
+
+
+# 📦 Coleções e cursores
+class CursorLocal:
+    """Cursor preguiçoso: a consulta roda na primeira leitura, com a ordenação/limite configurados"""
+
+    def __init__(self, executar):
+        self._executar = executar
+        self._ordenacao = None
+        self._pular = 0
+        self._limite = 0
+        self._resultados = None
+
+    def sort(self, chave, direcao=None):
+        self._ordenacao = [(chave, direcao if direcao is not None else 1)] if isinstance(chave, str) else list(chave)
+        return self
+
+    def skip(self, quantidade: int):
+        self._pular = quantidade
+        return self
+
+    def limit(self, quantidade: int):
+        self._limite = quantidade
+        return self
+
+    def batch_size(self, quantidade: int):
+        return self
+
+    def _iniciar(self):
+        if self._resultados is None:
+            self._resultados = iter(self._executar(self._ordenacao, self._pular, self._limite))
+        return self._resultados
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iniciar())
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None) -> list:
+        resultados = self._iniciar()
+        if length is None:
+            return list(resultados)
+        return [documento for _, documento in zip(range(length), resultados)]
+
+
+class ColecaoLocal:
+    def __init__(self, banco, nome: str):
+        self.database = banco
+        self.name = nome
+        self.modificada = False
+        self._documentos = {}     # _id -> documento (ordem de inserção = ordem natural)
+        self._indices = {"_id_": {"key": [("_id", 1)]}}
+        self._unicos = {}         # nome do índice -> {chave: _id}
+        self._ordenados = {}      # nome do índice -> _IndiceOrdenado
+
+    # Índices
+    def _chave_unica(self, documento: dict, especificacao: dict):
+        parcial = especificacao.get("partialFilterExpression")
+        if parcial and not _corresponde(documento, parcial):
+            return None
+        return tuple(_hashavel(_valor(documento, campo)) for campo, _ in especificacao["key"])
+
+    def _verificar_unicos(self, documento: dict, ignorar=_FALTANDO):
+        for nome, donos in self._unicos.items():
+            chave = self._chave_unica(documento, self._indices[nome])
+            if chave is None:
+                continue
+            dono = donos.get(chave, _FALTANDO)
+            if dono is not _FALTANDO and dono != ignorar:
+                valores = {campo: valor for (campo, _), valor in zip(self._indices[nome]["key"], chave)}
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: {nome} dup key: {valores}",
+                    11000,
+                    {"index": 0, "code": 11000, "keyPattern": dict(self._indices[nome]["key"]), "keyValue": valores}
+                )
+
+    def _indexar(self, documento: dict):
+        for nome, donos in self._unicos.items():
+            chave = self._chave_unica(documento, self._indices[nome])
+            if chave is not None:
+                donos[chave] = documento["_id"]
+        for indice in self._ordenados.values():
+            indice.adicionar(documento)
+
+    def _desindexar(self, documento: dict):
+        for nome, donos in self._unicos.items():
+            chave = self._chave_unica(documento, self._indices[nome])
+            if chave is not None:
+                donos.pop(chave, None)
+        for indice in self._ordenados.values():
+            indice.remover(documento)
+
+    def _plano(self, filtro: dict, ordenacao=None):
+        """(documentos candidatos, já ordenados?) pelo melhor índice para o filtro e a ordenação"""
+        if "_id" in filtro and not _eh_operador(filtro["_id"]):
+            documento = self._documentos.get(filtro["_id"])
+            return ([documento] if documento is not None else []), True
+
+        # Igualdade em todos os campos de um índice único: uma consulta ao dicionário
+        for nome, donos in self._unicos.items():
+            especificacao = self._indices[nome]
+            campos = [campo for campo, _ in especificacao["key"]]
+            if especificacao.get("partialFilterExpression") or not all(
+                campo in filtro and not _eh_operador(filtro[campo]) for campo in campos
+            ):
+                continue
+            documento_id = donos.get(tuple(_hashavel(filtro[campo]) for campo in campos), _FALTANDO)
+            return ([self._documentos[documento_id]] if documento_id is not _FALTANDO else []), True
+
+        melhor = None
+        for indice in self._ordenados.values():
+            intervalo = _intervalo(filtro, indice.campos[0])
+            sentido = indice.ordem(ordenacao, intervalo)
+            if intervalo is None and sentido is None:
+                continue
+            inicio, fim = indice.faixa(intervalo)
+            # Preferência: índice que filtra e ordena; depois o que filtra menos documentos; depois o que só ordena
+            custo = (sentido is None, fim - inicio if intervalo is not None else len(self._documentos) + 1)
+            if melhor is None or custo < melhor[0]:
+                melhor = (custo, indice, inicio, fim, sentido)
+
+        if melhor is None:
+            return self._documentos.values(), False
+        _, indice, inicio, fim, sentido = melhor
+        posicoes = range(fim - 1, inicio - 1, -1) if sentido == -1 else range(inicio, fim)
+        entradas = indice.entradas
+        return (self._documentos[entradas[posicao][1]] for posicao in posicoes), sentido is not None
+
+    def _selecionar(self, filtro, ordenacao=None, quantidade: int = 0) -> tuple:
+        """(documentos que atendem o filtro, já ordenados?); com ordem pelo índice para em `quantidade`"""
+        filtro = filtro or {}
+        candidatos, ordenados = self._plano(filtro, ordenacao)
+        selecionados = []
+        for documento in candidatos:
+            if _corresponde(documento, filtro):
+                selecionados.append(documento)
+                if ordenados and quantidade and len(selecionados) >= quantidade:
+                    break
+        return selecionados, ordenados
+
+    # Texto
+    def _pontuar(self, busca: dict, documentos: list) -> dict:
+        campos = [
+            campo for especificacao in self._indices.values()
+            for campo, tipo in especificacao["key"] if tipo == "text"
+        ]
+        if not campos:
+            raise OperationFailure("text index required for $text query", code=27)
+
+        # Palavras inteiras sem acento/caixa; sem stemming, "mercados" não encontra "mercado"
+        termos, excluidos = set(), set()
+        for palavra in normalizar(busca["$search"].replace('"', " ")).split(" "):
+            if palavra.startswith("-"):
+                excluidos.add(palavra[1:])
+            elif palavra:
+                termos.add(palavra)
+
+        pontuacoes = {}
+        for documento in documentos:
+            palavras = []
+            for campo in campos:
+                valor = _valor(documento, campo)
+                if isinstance(valor, str):
+                    palavras.extend(normalizar(valor).split(" "))
+            if excluidos.intersection(palavras):
+                continue
+            pontuacao = sum(1.0 for palavra in palavras if palavra in termos)
+            if pontuacao:
+                pontuacoes[documento["_id"]] = pontuacao / len(palavras) + len(termos.intersection(palavras))
+        return pontuacoes
+
+    def _buscar(self, filtro, projecao, ordenacao, pular: int, limite: int) -> list:
+        filtro = dict(filtro or {})
+        busca = filtro.pop("$text", None)
+        quantidade = pular + limite if limite else 0
+        if busca is not None:
+            # A ordenação por relevância só existe depois da pontuação
+            documentos, _ = self._selecionar(filtro)
+            pontuacoes = self._pontuar(busca, documentos)
+            documentos = [documento for documento in documentos if documento["_id"] in pontuacoes]
+            ordenados = False
+        else:
+            documentos, ordenados = self._selecionar(filtro, ordenacao, quantidade)
+            pontuacoes = {}
+        if ordenacao and not ordenados:
+            documentos = _ordenar(documentos, ordenacao, quantidade, pontuacoes)
+        documentos = documentos[pular:pular + limite] if limite else documentos[pular:]
+        return [_projetar(documento, projecao, pontuacoes.get(documento["_id"])) for documento in documentos]
+
+    # Leitura
+    def find(self, filter=None, projection=None, sort=None, limit=0, skip=0, **_opcoes) -> CursorLocal:
+        cursor = CursorLocal(lambda ordenacao, pular, limite: self._buscar(filter, projection, ordenacao, pular, limite))
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter=None, projection=None, sort=None, **_opcoes):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        resultado = self._buscar(filter, projection, sort, 0, 1)
+        return resultado[0] if resultado else None
+
+    async def count_documents(self, filter, **_opcoes) -> int:
+        return len(self._selecionar(filter)[0])
+
+    async def estimated_document_count(self, **_opcoes) -> int:
+        return len(self._documentos)
+
+    def aggregate(self, pipeline: list, **_opcoes) -> CursorLocal:
+        return CursorLocal(lambda *_: self._agregar(pipeline))
+
+    def _agregar(self, pipeline: list) -> list:
+        documentos = None
+        for indice, estagio in enumerate(pipeline):
+            (nome, especificacao), = estagio.items()
+            if documentos is None:
+                # O primeiro estágio $match usa os índices
+                if nome == "$match":
+                    documentos = self._buscar(especificacao, None, None, 0, 0)
+                    continue
+                documentos = [_copiar(documento) for documento in self._documentos.values()]
+
+            if nome == "$match":
+                documentos = [documento for documento in documentos if _corresponde(documento, especificacao)]
+            elif nome == "$group":
+                documentos = _agrupar(documentos, especificacao)
+            elif nome == "$sort":
+                documentos = _ordenar(documentos, list(especificacao.items()))
+            elif nome == "$limit":
+                documentos = documentos[:especificacao]
+            elif nome == "$project":
+                documentos = [_projetar_estagio(documento, especificacao) for documento in documentos]
+            elif nome == "$facet":
+                documentos = [{
+                    campo: ColecaoLocal._agregar_lista(documentos, subpipeline)
+                    for campo, subpipeline in especificacao.items()
+                }]
+            elif nome == "$out":
+                if indice != len(pipeline) - 1:
+                    raise OperationFailure("$out can only be the final stage in the pipeline", code=40601)
+                self.database[especificacao]._substituir(documentos)
+                return []
+            else:
+                raise _nao_suportado(f"O estágio {nome}")
+        return documentos if documentos is not None else [_copiar(documento) for documento in self._documentos.values()]
+
+    @staticmethod
+    def _agregar_lista(documentos: list, pipeline: list) -> list:
+        temporaria = ColecaoLocal(None, "$facet")
+        temporaria._documentos = {indice: documento for indice, documento in enumerate(documentos)}
+        return temporaria._agregar(pipeline)
+
+    # Escrita
+    def _inserir(self, documento: dict):
+        if "_id" not in documento:
+            # Como o pymongo: o _id gerado também aparece no documento do chamador
+            documento["_id"] = ObjectId()
+        novo = _copiar(documento)
+        if novo["_id"] in self._documentos:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.database.name}.{self.name} index: _id_",
+                11000,
+                {"index": 0, "code": 11000, "keyPattern": {"_id": 1}, "keyValue": {"_id": novo["_id"]}}
+            )
+        self._verificar_unicos(novo)
+        self._documentos[novo["_id"]] = novo
+        self._indexar(novo)
+        self.modificada = True
+
+    def _substituir_documento(self, anterior: dict, novo: dict) -> bool:
+        if novo == anterior:
+            return False
+        self._verificar_unicos(novo, ignorar=anterior["_id"])
+        self._desindexar(anterior)
+        self._documentos[novo["_id"]] = novo
+        self._indexar(novo)
+        self.modificada = True
+        return True
+
+    def _excluir(self, documento: dict):
+        self._desindexar(documento)
+        del self._documentos[documento["_id"]]
+        self.modificada = True
+
+    def _substituir(self, documentos: list):
+        for documento in list(self._documentos.values()):
+            self._excluir(documento)
+        for documento in documentos:
+            self._inserir(documento)
+        self.modificada = True
+
+    def _atualizar(self, filtro: dict, atualizacao: dict, upsert: bool, varios: bool, ordenacao=None):
+        """(anterior, novo, correspondidos, modificados, _id inserido) da atualização"""
+        alvos, _ = self._selecionar(filtro)
+        if ordenacao:
+            alvos = _ordenar(alvos, ordenacao, 1)
+        if not varios:
+            alvos = alvos[:1]
+
+        if not alvos:
+            if not upsert:
+                return None, None, 0, 0, None
+            novo = _aplicar_atualizacao(_base_upsert(filtro), atualizacao, inserindo=True)
+            self._inserir(novo)
+            return None, self._documentos[novo["_id"]], 0, 0, novo["_id"]
+
+        modificados = 0
+        anterior = novo = None
+        for alvo in alvos:
+            anterior = alvo
+            novo = _aplicar_atualizacao(alvo, atualizacao, inserindo=False)
+            if self._substituir_documento(alvo, novo):
+                modificados += 1
+        return anterior, novo, len(alvos), modificados, None
+
+    async def insert_one(self, document: dict, **_opcoes) -> InsertOneResult:
+        self._inserir(document)
+        return InsertOneResult(document["_id"], True)
+
+    async def insert_many(self, documents, ordered: bool = True, **_opcoes) -> InsertManyResult:
+        documentos = list(documents)
+        erros = []
+        for indice, documento in enumerate(documentos):
+            try:
+                self._inserir(documento)
+            except DuplicateKeyError as e:
+                erros.append({**e.details, "index": indice, "errmsg": str(e), "op": documento})
+                if ordered:
+                    break
+        if erros:
+            raise BulkWriteError({
+                "writeErrors": erros, "writeConcernErrors": [], "nInserted": len(documentos) - len(erros),
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+            })
+        return InsertManyResult([documento["_id"] for documento in documentos], True)
+
+    async def update_one(self, filter, update, upsert: bool = False, **_opcoes) -> UpdateResult:
+        _, _, correspondidos, modificados, inserido = self._atualizar(filter, update, upsert, varios=False)
+        return UpdateResult({"n": correspondidos or int(inserido is not None), "nModified": modificados, "upserted": inserido}, True)
+
+    async def update_many(self, filter, update, upsert: bool = False, **_opcoes) -> UpdateResult:
+        _, _, correspondidos, modificados, inserido = self._atualizar(filter, update, upsert, varios=True)
+        return UpdateResult({"n": correspondidos or int(inserido is not None), "nModified": modificados, "upserted": inserido}, True)
+
+    async def replace_one(self, filter, replacement, upsert: bool = False, **_opcoes) -> UpdateResult:
+        return await self.update_one(filter, replacement, upsert)
+
+    async def find_one_and_update(
+        self, filter, update, projection=None, sort=None, upsert: bool = False, return_document: bool = False, **_opcoes
+    ):
+        anterior, novo, _, _, _ = self._atualizar(filter, update, upsert, varios=False, ordenacao=sort)
+        documento = novo if return_document else anterior
+        return _projetar(documento, projection) if documento is not None else None
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **_opcoes):
+        alvos, _ = self._selecionar(filter)
+        if not alvos:
+            return None
+        alvo = _ordenar(alvos, sort, 1)[0] if sort else alvos[0]
+        self._excluir(alvo)
+        return _projetar(alvo, projection)
+
+    async def delete_one(self, filter, **_opcoes) -> DeleteResult:
+        alvos = self._selecionar(filter)[0][:1]
+        for alvo in alvos:
+            self._excluir(alvo)
+        return DeleteResult({"n": len(alvos)}, True)
+
+    async def delete_many(self, filter, **_opcoes) -> DeleteResult:
+        alvos, _ = self._selecionar(filter)
+        for alvo in alvos:
+            self._excluir(alvo)
+        return DeleteResult({"n": len(alvos)}, True)
+
+    async def bulk_write(self, requests, ordered: bool = True, **_opcoes) -> BulkWriteResult:
+        resultado = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []
+        }
+        for indice, operacao in enumerate(requests):
+            try:
+                if isinstance(operacao, InsertOne):
+                    self._inserir(operacao._doc)
+                    resultado["nInserted"] += 1
+                elif isinstance(operacao, (UpdateOne, UpdateMany, ReplaceOne)):
+                    _, _, correspondidos, modificados, inserido = self._atualizar(
+                        operacao._filter, operacao._doc, bool(operacao._upsert), varios=isinstance(operacao, UpdateMany)
+                    )
+                    resultado["nMatched"] += correspondidos
+                    resultado["nModified"] += modificados
+                    if inserido is not None:
+                        resultado["nUpserted"] += 1
+                        resultado["upserted"].append({"index": indice, "_id": inserido})
+                elif isinstance(operacao, (DeleteOne, DeleteMany)):
+                    alvos, _ = self._selecionar(operacao._filter)
+                    for alvo in alvos if isinstance(operacao, DeleteMany) else alvos[:1]:
+                        self._excluir(alvo)
+                        resultado["nRemoved"] += 1
+                else:
+                    raise _nao_suportado(f"A operação {type(operacao).__name__}")
+            except (DuplicateKeyError, WriteError) as e:
+                resultado["writeErrors"].append({
+                    **(e.details or {}), "index": indice, "code": e.code, "errmsg": str(e), "op": operacao
+                })
+                if ordered:
+                    break
+        if resultado["writeErrors"]:
+            raise BulkWriteError(resultado)
+        return BulkWriteResult(resultado, True)
+
+    # Gerência de índices (usada por indices.sincronizar)
+    async def create_indexes(self, indexes, **_opcoes) -> list:
+        nomes = []
+        for modelo in indexes:
+            especificacao = dict(modelo.document)
+            nome = especificacao.pop("name")
+            especificacao["key"] = list(especificacao["key"].items())
+            if especificacao.get("unique"):
+                donos = {}
+                for documento in self._documentos.values():
+                    chave = self._chave_unica(documento, especificacao)
+                    if chave is None:
+                        continue
+                    if chave in donos:
+                        raise OperationFailure(f"E11000 duplicate key error index: {nome}", code=11000)
+                    donos[chave] = documento["_id"]
+                self._unicos[nome] = donos
+            if all(tipo != "text" for _, tipo in especificacao["key"]):
+                indice = _IndiceOrdenado([campo for campo, _ in especificacao["key"]])
+                indice.entradas = sorted(indice.entrada(documento) for documento in self._documentos.values())
+                self._ordenados[nome] = indice
+            self._indices[nome] = especificacao
+            nomes.append(nome)
+        return nomes
+
+    async def create_index(self, keys, **opcoes) -> str:
+        return (await self.create_indexes([IndexModel(keys, **opcoes)]))[0]
+
+    async def drop_index(self, index_or_name, **_opcoes):
+        nome = index_or_name if isinstance(index_or_name, str) else IndexModel(index_or_name).document["name"]
+        if nome == "_id_" or nome not in self._indices:
+            raise OperationFailure(f"index not found with name [{nome}]", code=27)
+        especificacao = self._indices.pop(nome)
+        self._unicos.pop(nome, None)
+        self._ordenados.pop(nome, None)
+
+    async def index_information(self) -> dict:
+        return {nome: {**_copiar(especificacao), "v": 2} for nome, especificacao in self._indices.items()}
+
+
+class BancoLocal:
+    def __init__(self, cliente, nome: str):
+        self.client = cliente
+        self.name = nome
+        self._colecoes = {}
+
+    def __getitem__(self, nome: str) -> ColecaoLocal:
+        colecao = self._colecoes.get(nome)
+        if colecao is None:
+            colecao = self._colecoes[nome] = ColecaoLocal(self, nome)
+        return colecao
+
+    def __getattr__(self, nome: str) -> ColecaoLocal:
+        if nome.startswith("_"):
+            raise AttributeError(nome)
+        return self[nome]
+
+    async def list_collection_names(self, **_opcoes) -> list:
+        return [nome for nome, colecao in self._colecoes.items() if colecao._documentos]
+
+    async def command(self, comando, *_argumentos, **_opcoes) -> dict:
+        nome = comando if isinstance(comando, str) else next(iter(comando))
+        if nome == "ping":
+            return {"ok": 1.0}
+        raise _nao_suportado(f"O comando {nome}")
+
+    def watch(self, *_argumentos, **_opcoes):
+        raise _nao_suportado("Change stream")
+
+
+class ClienteLocal:
+    """Substituto do AsyncIOMotorClient; `diretorio` (opcional) guarda os dados entre execuções"""
+
+    def __init__(self, diretorio=None):
+        self.diretorio = diretorio
+        self._bancos = {}
+        self.admin = BancoLocal(self, "admin")
+
+    def __getitem__(self, nome: str) -> BancoLocal:
+        banco = self._bancos.get(nome)
+        if banco is None:
+            banco = self._bancos[nome] = BancoLocal(self, nome)
+            self._carregar(banco)
+        return banco
+
+    def _carregar(self, banco: BancoLocal):
+        pasta = os.path.join(self.diretorio, banco.name) if self.diretorio else None
+        if not pasta or not os.path.isdir(pasta):
+            return
+        for arquivo in sorted(os.listdir(pasta)):
+            if not arquivo.endswith(".bson"):
+                continue
+            colecao = banco[arquivo[:-len(".bson")]]
+            with open(os.path.join(pasta, arquivo), "rb") as entrada:
+                for documento in bson.decode_all(entrada.read()):
+                    colecao._inserir(documento)
+            colecao.modificada = False
+
+    def salvar(self) -> int:
+        """Grava as coleções alteradas desde o último salvamento; retorna quantas foram gravadas"""
+        if not self.diretorio:
+            return 0
+        gravadas = 0
+        for banco in self._bancos.values():
+            pasta = os.path.join(self.diretorio, banco.name)
+            for colecao in list(banco._colecoes.values()):
+                if not colecao.modificada:
+                    continue
+                os.makedirs(pasta, exist_ok=True)
+                caminho = os.path.join(pasta, f"{colecao.name}.bson")
+                # Escrita atômica: um salvamento interrompido não corrompe o arquivo anterior
+                with open(caminho + ".tmp", "wb") as saida:
+                    for documento in colecao._documentos.values():
+                        saida.write(bson.encode(documento))
+                os.replace(caminho + ".tmp", caminho)
+                colecao.modificada = False
+                gravadas += 1
+        return gravadas
+
+    def close(self):
+        self.salvar()
@@ -0,0 +1,403 @@
+"""Benchmark reproduzível das rotas da API.
+
+1. Popular um MongoDB local com um volume conhecido de gastos (determinístico pela semente):
+
+    python benchmark.py popular --gastos 10000 --categorias 10 --limpar
+
+2. Subir a API apontando para o mesmo banco e gerar carga concorrente em cada rota,
+   com latência p50/p95/p99, vazão e RSS do servidor (processo e workers filhos):
+
+    python benchmark.py executar --url http://localhost:8000 --pid <pid do uvicorn> --saida base.json
+
+3. Medir o custo de CPU da serialização das listas (response_model vs. resposta rápida), sem banco:
+
+    python benchmark.py serializacao --linhas 10000
+
+4. Comparar duas execuções (exit 1 se alguma rota piorar além da tolerância):
+
+    python benchmark.py comparar base.json novo.json --tolerancia 10
+
+Requer `httpx` (requirements-dev.txt). Use um banco dedicado (MONGODB_DATABASE): `--limpar` apaga as coleções.
+
+Sem servidor de banco, com o banco local embutido (um worker só):
+
+    ARMAZENAMENTO=local ARMAZENAMENTO_LOCAL_DIR=dados python benchmark.py popular --gastos 10000
+    ARMAZENAMENTO=local ARMAZENAMENTO_LOCAL_DIR=dados uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+try:
+    import httpx
+except ImportError:  # dependência apenas de desenvolvimento
+    httpx = None
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from banco_local import ClienteLocal
+from formato import data_para_bson, para_centavos
+from migracoes import CARGA_ORCAMENTOS, MIGRACAO_CENTAVOS
+from orcamentos import COLECAO_ALERTAS, COLECAO_ORCAMENTOS, reconstruir as reconstruir_orcamentos
+from resumos import COLECAO_RESUMOS, reconstruir
+
+ANO_BENCHMARK = 2024
+LOTE_POPULAR = 5000
+PERCENTIS = (50, 95, 99)
+METRICAS_COMPARADAS = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "req_s": -1}
+
+DESCRICOES = ["Mercado", "Uber", "Padaria", "Farmácia", "Restaurante", "Combustível", "Cinema", "Assinatura"]
+ICONES = ["💳", "💵", "📱", "🏦"]
+# Todas as coleções em que a API grava: `--limpar` não pode deixar contadores, faixas de versão
+# concluídas ou totais de orçamento de uma execução anterior
+COLECOES_DA_API = (
+    "categorias", "tipos_pagamento", "gastos", "remocoes", "contadores", "versoes_concluidas",
+    "propagacoes", COLECAO_RESUMOS, COLECAO_ORCAMENTOS, COLECAO_ALERTAS,
+)
+
+
+# 🌱 POPULAR O BANCO
+async def popular(database, gastos: int, categorias: int, tipos: int, semente: int, limpar: bool):
+    """Insere categorias, tipos de pagamento e gastos sintéticos no formato de armazenamento atual"""
+    aleatorio = random.Random(semente)
+    if limpar:
+        for nome in COLECOES_DA_API:
+            await database[nome].delete_many({})
+
+    agora = datetime.now()
+    resultado = await database.categorias.insert_many([
+        {"nome": f"Categoria {i}", "cor": f"#{aleatorio.randrange(0x1000000):06x}", "criado_em": agora, "versao": 0}
+        for i in range(categorias)
+    ])
+    lista_categorias = await database.categorias.find({"_id": {"$in": resultado.inserted_ids}}).to_list(None)
+    resultado = await database.tipos_pagamento.insert_many([
+        {"nome": f"Tipo {i}", "icone": ICONES[i % len(ICONES)], "cor": "#333333", "criado_em": agora, "versao": 0}
+        for i in range(tipos)
+    ])
+    lista_tipos = await database.tipos_pagamento.find({"_id": {"$in": resultado.inserted_ids}}).to_list(None)
+
+    inicio = date(ANO_BENCHMARK - 1, 1, 1)
+    dias = (date(ANO_BENCHMARK + 1, 1, 1) - inicio).days
+    # Reserva a faixa de versões no mesmo contador da API (sem --limpar, continua de onde a base está)
+    contador = await database.contadores.find_one_and_update(
+        {"_id": "versao"}, {"$inc": {"valor": gastos}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    versao = primeira_versao = contador["valor"] - gastos
+    for deslocamento in range(0, gastos, LOTE_POPULAR):
+        lote = []
+        for _ in range(min(LOTE_POPULAR, gastos - deslocamento)):
+            categoria = aleatorio.choice(lista_categorias)
+            tipo = aleatorio.choice(lista_tipos)
+            versao += 1
+            lote.append({
+                "descricao": f"{aleatorio.choice(DESCRICOES)} {aleatorio.randrange(1000)}",
+                "valor_centavos": para_centavos(round(aleatorio.uniform(1, 500), 2)),
+                "data_gasto": data_para_bson(inicio + timedelta(days=aleatorio.randrange(dias))),
+                "categoria": {"id": str(categoria["_id"]), "nome": categoria["nome"], "cor": categoria["cor"]},
+                "tipo_pagamento": {
+                    "id": str(tipo["_id"]), "nome": tipo["nome"], "icone": tipo["icone"], "cor": tipo["cor"]
+                },
+                "criado_em": agora,
+                "versao": versao
+            })
+        await database.gastos.insert_many(lote, ordered=False)
+        print(f"🌱 {deslocamento + len(lote)}/{gastos} gastos")
+
+    if gastos:
+        # Faixa concluída, como a de uma escrita da API: o token de sincronização avança sobre ela
+        await database.versoes_concluidas.insert_one({"_id": primeira_versao + 1, "fim": versao, "concluida_em": agora})
+    linhas = await reconstruir(database)
+    await reconstruir_orcamentos(database)
+    # Base nova já está no formato atual: não há o que migrar nem carga de orçamentos pendente
+    for marcador in (MIGRACAO_CENTAVOS, CARGA_ORCAMENTOS):
+        await database.contadores.update_one(
+            {"_id": marcador}, {"$set": {"concluida": True, "concluida_em": agora}}, upsert=True
+        )
+    print(f"✅ {gastos} gastos, {categorias} categorias, {tipos} tipos; {linhas} linha(s) de resumo")
+
+
+# 🚀 GERAR CARGA
+def _rss_kb(pid: int) -> int:
+    """RSS (kB) do processo e de todos os descendentes (workers do uvicorn), lido de /proc"""
+    total = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with open(f"/proc/{atual}/status") as status:
+                for linha in status:
+                    if linha.startswith("VmRSS:"):
+                        total += int(linha.split()[1])
+                        break
+            for tarefa in os.listdir(f"/proc/{atual}/task"):
+                with open(f"/proc/{atual}/task/{tarefa}/children") as filhos:
+                    pendentes.extend(int(filho) for filho in filhos.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+def _percentil(ordenadas: list, percentil: int) -> float:
+    if not ordenadas:
+        return 0.0
+    indice = min(len(ordenadas) - 1, max(0, round(percentil / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+def _cenarios(categoria_ids: list, tipo_ids: list, gasto_ids: list) -> dict:
+    """Rota -> função que monta (método, caminho, corpo) de cada requisição"""
+    def novo_gasto(aleatorio):
+        return {
+            "descricao": f"Benchmark {aleatorio.randrange(10 ** 6)}",
+            "valor": round(aleatorio.uniform(1, 500), 2),
+            "categoria_id": aleatorio.choice(categoria_ids),
+            "tipo_pagamento_id": aleatorio.choice(tipo_ids),
+            "data_gasto": (date(ANO_BENCHMARK, 1, 1) + timedelta(days=aleatorio.randrange(365))).isoformat()
+        }
+
+    return {
+        "GET /gastos?limit=100": lambda a: ("GET", "/gastos?limit=100", None),
+        "GET /gastos?mes&ano": lambda a: ("GET", f"/gastos?ano={ANO_BENCHMARK}&mes={a.randint(1, 12)}&limit=500", None),
+        "POST /gastos": lambda a: ("POST", "/gastos", novo_gasto(a)),
+        "PUT /gastos/{id}": lambda a: ("PUT", f"/gastos/{a.choice(gasto_ids)}", novo_gasto(a)),
+        "GET /relatorio/mensal (resumo)": lambda a: (
+            "GET", f"/relatorio/mensal/{ANO_BENCHMARK}/{a.randint(1, 12)}?include_gastos=false", None
+        ),
+        "GET /relatorio/mensal (stream)": lambda a: ("GET", f"/relatorio/mensal/{ANO_BENCHMARK}/{a.randint(1, 12)}", None),
+        "GET /relatorio/anual": lambda a: ("GET", f"/relatorio/anual/{ANO_BENCHMARK}", None),
+    }
+
+
+async def _medir_rota(cliente, montar, duracao: float, concorrencia: int, semente: int, pid) -> dict:
+    latencias = []
+    erros = 0
+    rss_max = _rss_kb(pid) if pid else None
+    fim = time.perf_counter() + duracao
+
+    async def trabalhador(indice: int):
+        nonlocal erros
+        aleatorio = random.Random(semente + indice)
+        while time.perf_counter() < fim:
+            metodo, caminho, corpo = montar(aleatorio)
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.request(metodo, caminho, json=corpo)
+                await resposta.aread()
+                if resposta.status_code >= 400:
+                    erros += 1
+            except httpx.HTTPError:
+                erros += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    async def amostrar_rss():
+        nonlocal rss_max
+        while True:
+            await asyncio.sleep(0.25)
+            rss_max = max(rss_max, _rss_kb(pid))
+
+    amostrador = asyncio.create_task(amostrar_rss()) if pid else None
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador(indice) for indice in range(concorrencia)))
+    decorrido = time.perf_counter() - inicio
+    if amostrador:
+        amostrador.cancel()
+
+    latencias.sort()
+    resultado = {f"p{percentil}_ms": round(_percentil(latencias, percentil), 2) for percentil in PERCENTIS}
+    resultado.update({
+        "requisicoes": len(latencias),
+        "erros": erros,
+        "req_s": round(len(latencias) / decorrido, 1),
+        "rss_max_kb": rss_max
+    })
+    return resultado
+
+
+async def executar(url: str, duracao: float, concorrencia: int, semente: int, pid, rotas=None) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=httpx.Limits(max_connections=concorrencia)) as cliente:
+        categoria_ids = [categoria["id"] for categoria in (await cliente.get("/categorias")).json()]
+        tipo_ids = [tipo["id"] for tipo in (await cliente.get("/tipos-pagamento")).json()]
+        gasto_ids = [gasto["id"] for gasto in (await cliente.get("/gastos?limit=500&fields=descricao")).json()]
+        if not categoria_ids or not tipo_ids or not gasto_ids:
+            raise RuntimeError("Banco sem dados: rode `python benchmark.py popular` antes")
+
+        cenarios = _cenarios(categoria_ids, tipo_ids, gasto_ids)
+        resultados = {}
+        for rota, montar in cenarios.items():
+            if rotas and rota not in rotas:
+                continue
+            resultados[rota] = await _medir_rota(cliente, montar, duracao, concorrencia, semente, pid)
+            print(f"📊 {rota}: {json.dumps(resultados[rota])}")
+
+    return {
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {"url": url, "duracao_s": duracao, "concorrencia": concorrencia, "semente": semente},
+        "ambiente": {"python": platform.python_version(), "maquina": platform.machine(), "cpus": os.cpu_count()},
+        "rotas": resultados
+    }
+
+
+# 🧮 SERIALIZAÇÃO
+def _documentos_sinteticos(quantidade: int, semente: int) -> list:
+    aleatorio = random.Random(semente)
+    agora = datetime.now()
+    return [
+        {
+            "_id": ObjectId(),
+            "descricao": f"{aleatorio.choice(DESCRICOES)} {aleatorio.randrange(1000)}",
+            "valor_centavos": aleatorio.randrange(100, 50000),
+            "data_gasto": data_para_bson(date(ANO_BENCHMARK, 1, 1) + timedelta(days=aleatorio.randrange(365))),
+            "categoria": {"id": str(ObjectId()), "nome": "Alimentação", "cor": "#e74c3c"},
+            "tipo_pagamento": {"id": str(ObjectId()), "nome": "Cartão", "icone": "💳", "cor": "#3498db"},
+            "criado_em": agora,
+            "versao": indice
+        }
+        for indice in range(quantidade)
+    ]
+
+
+def serializacao(linhas: int, repeticoes: int, semente: int) -> dict:
+    """CPU (ms por 1k linhas) de GET /gastos: caminho do response_model vs. RespostaRapida"""
+    # Importação tardia: main não conecta ao banco na importação
+    from typing import List
+    from pydantic import TypeAdapter
+    import main
+
+    adaptador = TypeAdapter(List[main.Gasto])
+
+    def via_response_model(documentos):
+        # O que o FastAPI faz com response_model=List[Gasto] e JSONResponse
+        validados = adaptador.validate_python([main._gasto_resposta(documento) for documento in documentos])
+        conteudo = adaptador.dump_python(validados, mode="json")
+        return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def via_resposta_rapida(documentos):
+        return main.RespostaRapida([main._gasto_resposta(documento) for documento in documentos]).body
+
+    resultado = {"linhas": linhas, "encoder": "orjson" if main.orjson is not None else "json", "modos": {}}
+    for nome, serializar in (("response_model", via_response_model), ("resposta_rapida", via_resposta_rapida)):
+        tempos = []
+        for _ in range(repeticoes):
+            documentos = _documentos_sinteticos(linhas, semente)
+            inicio = time.process_time()
+            corpo = serializar(documentos)
+            tempos.append(time.process_time() - inicio)
+        resultado["modos"][nome] = {
+            "cpu_ms_por_1k": round(min(tempos) * 1000 / (linhas / 1000), 3),
+            "bytes": len(corpo)
+        }
+        print(f"🧮 {nome}: {json.dumps(resultado['modos'][nome])}")
+
+    antes = resultado["modos"]["response_model"]["cpu_ms_por_1k"]
+    depois = resultado["modos"]["resposta_rapida"]["cpu_ms_por_1k"]
+    resultado["economia_cpu_ms_por_1k"] = round(antes - depois, 3)
+    print(f"📊 Economia: {resultado['economia_cpu_ms_por_1k']} ms de CPU por 1k linhas ({antes / depois:.1f}x)")
+    return resultado
+
+
+# 🔍 COMPARAR EXECUÇÕES
+def comparar(base: dict, novo: dict, tolerancia: float) -> list:
+    """Variação percentual de cada métrica por rota; retorna as regressões acima da tolerância"""
+    regressoes = []
+    for rota, metricas in novo["rotas"].items():
+        anteriores = base["rotas"].get(rota)
+        if not anteriores:
+            print(f"🆕 {rota}")
+            continue
+        partes = []
+        regressoes_rota = []
+        for metrica, direcao in METRICAS_COMPARADAS.items():
+            if not anteriores.get(metrica):
+                continue
+            variacao = (metricas[metrica] - anteriores[metrica]) / anteriores[metrica] * 100
+            # direção 1: maior é pior (latência); -1: menor é pior (vazão)
+            piorou = variacao * direcao > tolerancia
+            partes.append(f"{metrica} {anteriores[metrica]} → {metricas[metrica]} ({variacao:+.1f}%){' ❌' if piorou else ''}")
+            if piorou:
+                regressoes_rota.append(f"{rota} {metrica}")
+        print(f"{'❌' if regressoes_rota else '✅'} {rota}: {'; '.join(partes)}")
+        regressoes.extend(regressoes_rota)
+    return regressoes
+
+
+async def _executar(args) -> int:
+    if args.comando == "serializacao":
+        resultado = serializacao(args.linhas, args.repeticoes, args.semente)
+        if args.saida:
+            with open(args.saida, "w") as saida:
+                json.dump(resultado, saida, ensure_ascii=False, indent=2)
+        return 0
+
+    if args.comando == "comparar":
+        with open(args.base) as arquivo_base, open(args.novo) as arquivo_novo:
+            regressoes = comparar(json.load(arquivo_base), json.load(arquivo_novo), args.tolerancia)
+        print(f"📊 {len(regressoes)} regressão(ões) acima de {args.tolerancia}%")
+        return 1 if regressoes else 0
+
+    if args.comando == "popular":
+        load_dotenv()
+        if os.environ.get("ARMAZENAMENTO") == "local":
+            # Sem servidor de banco: grava os arquivos que a API carrega com o mesmo ARMAZENAMENTO_LOCAL_DIR
+            client = ClienteLocal(os.environ.get("ARMAZENAMENTO_LOCAL_DIR"))
+        else:
+            client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+        try:
+            await popular(
+                client[os.environ.get("MONGODB_DATABASE", "controle_gastos")],
+                args.gastos, args.categorias, args.tipos, args.semente, args.limpar
+            )
+        finally:
+            client.close()
+        return 0
+
+    if httpx is None:
+        print("❌ httpx não instalado: pip install -r requirements-dev.txt")
+        return 1
+    resultado = await executar(args.url, args.duracao, args.concorrencia, args.semente, args.pid, args.rota)
+    with open(args.saida, "w") as saida:
+        json.dump(resultado, saida, ensure_ascii=False, indent=2)
+    print(f"💾 Resultado salvo em {args.saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reproduzível das rotas da API")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    popular_parser = comandos.add_parser("popular", help="popular o banco com dados sintéticos")
+    popular_parser.add_argument("--gastos", type=int, default=10000)
+    popular_parser.add_argument("--categorias", type=int, default=10)
+    popular_parser.add_argument("--tipos", type=int, default=4)
+    popular_parser.add_argument("--semente", type=int, default=42)
+    popular_parser.add_argument("--limpar", action="store_true", help="apagar as coleções antes de popular")
+
+    executar_parser = comandos.add_parser("executar", help="gerar carga concorrente em cada rota")
+    executar_parser.add_argument("--url", default="http://localhost:8000")
+    executar_parser.add_argument("--duracao", type=float, default=10, help="segundos por rota")
+    executar_parser.add_argument("--concorrencia", type=int, default=16)
+    executar_parser.add_argument("--semente", type=int, default=42)
+    executar_parser.add_argument("--pid", type=int, help="PID do servidor para medir RSS (inclui workers)")
+    executar_parser.add_argument("--rota", action="append", help="limitar a uma rota (repetível)")
+    executar_parser.add_argument("--saida", default="benchmark.json")
+
+    serializacao_parser = comandos.add_parser("serializacao", help="CPU da serialização de listas por 1k linhas")
+    serializacao_parser.add_argument("--linhas", type=int, default=10000)
+    serializacao_parser.add_argument("--repeticoes", type=int, default=5)
+    serializacao_parser.add_argument("--semente", type=int, default=42)
+    serializacao_parser.add_argument("--saida")
+
+    comparar_parser = comandos.add_parser("comparar", help="comparar dois resultados")
+    comparar_parser.add_argument("base")
+    comparar_parser.add_argument("novo")
+    comparar_parser.add_argument("--tolerancia", type=float, default=10, help="piora máxima aceita, em %%")
+
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
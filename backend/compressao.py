@@ -0,0 +1,113 @@
+"""Compressão das respostas HTTP: brotli (se o pacote `brotli` estiver instalado) ou gzip.
+
+Diferente do GZipMiddleware do Starlette, as respostas em fluxo (relatório em stream,
+exportação NDJSON) são comprimidas com flush a cada pedaço, então o cliente continua
+recebendo os dados conforme saem do cursor, e `text/event-stream` nunca é comprimido
+(os eventos SSE ficariam presos no buffer do compressor).
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele só gzip
+    brotli = None
+
+TAMANHO_MINIMO = int(os.environ.get("COMPRESSAO_MINIMO_BYTES", 1024))
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 4
+TIPOS_SEM_COMPRESSAO = ("text/event-stream", "image/", "application/zip", "application/gzip")
+
+
+def codificacao(accept_encoding: str) -> Optional[str]:
+    """Codificação usada para o Accept-Encoding do cliente (br > gzip); None se nenhuma"""
+    aceitas = set()
+    for parte in accept_encoding.lower().split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        parametros = parametros.replace(" ", "")
+        if parametros.startswith("q=") and parametros[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        aceitas.add(nome.strip())
+    if brotli is not None and "br" in aceitas:
+        return "br"
+    if "gzip" in aceitas:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, nome: str):
+        if nome == "br":
+            self._brotli = brotli.Compressor(quality=QUALIDADE_BROTLI)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)  # 31: cabeçalho gzip
+
+    def comprimir(self, dados: bytes, final: bool) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(dados) + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(dados) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class Compressao:
+    """Middleware ASGI: comprime respostas a partir de `minimo` bytes (e todas as em fluxo)"""
+
+    def __init__(self, app, minimo: int = TAMANHO_MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        nome = codificacao(Headers(scope=scope).get("accept-encoding", ""))
+        if nome is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        compressor = None
+        direto = False
+
+        async def enviar(mensagem):
+            nonlocal inicio, compressor, direto
+            if mensagem["type"] == "http.response.start":
+                inicio = mensagem
+                return
+            if mensagem["type"] != "http.response.body" or direto:
+                await send(mensagem)
+                return
+
+            corpo = mensagem.get("body", b"")
+            final = not mensagem.get("more_body", False)
+            if compressor is None:
+                cabecalhos = MutableHeaders(raw=inicio["headers"])
+                tipo = cabecalhos.get("content-type", "")
+                if "content-encoding" in cabecalhos or tipo.startswith(TIPOS_SEM_COMPRESSAO):
+                    direto = True
+                elif final and len(corpo) < self.minimo:
+                    cabecalhos.add_vary_header("Accept-Encoding")
+                    direto = True
+                if direto:
+                    await send(inicio)
+                    await send(mensagem)
+                    return
+
+                compressor = _Compressor(nome)
+                cabecalhos["Content-Encoding"] = nome
+                cabecalhos.add_vary_header("Accept-Encoding")
+                del cabecalhos["Content-Length"]
+                corpo = compressor.comprimir(corpo, final)
+                if final:
+                    cabecalhos["Content-Length"] = str(len(corpo))
+                await send(inicio)
+                await send({"type": "http.response.body", "body": corpo, "more_body": not final})
+                return
+
+            await send({"type": "http.response.body", "body": compressor.comprimir(corpo, final), "more_body": not final})
+
+        await self.app(scope, receive, enviar)
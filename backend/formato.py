@@ -0,0 +1,42 @@
+"""Formato de armazenamento dos gastos.
+
+`data_gasto` é gravada como data BSON (meia-noite UTC) e o valor como inteiro em
+centavos (`valor_centavos`). A API continua expondo `data_gasto` como
+"YYYY-MM-DD" e `valor` como número decimal. Enquanto `migracoes.py` não termina,
+os leitores também aceitam documentos legados (data em string ISO e `valor` float).
+"""
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+
+def para_centavos(valor: float) -> int:
+    """Converte um valor decimal para centavos sem erro de ponto flutuante"""
+    return int(Decimal(str(valor)).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def de_centavos(centavos: int) -> float:
+    return centavos / 100
+
+
+def centavos_do_gasto(gasto: dict) -> int:
+    """Valor do gasto em centavos (documentos novos ou legados)"""
+    if "valor_centavos" in gasto:
+        return gasto["valor_centavos"]
+    return para_centavos(gasto["valor"])
+
+
+def data_para_bson(data_gasto: date) -> datetime:
+    return datetime(data_gasto.year, data_gasto.month, data_gasto.day)
+
+
+def data_iso(data_gasto) -> str:
+    """data_gasto do documento (data BSON ou string legada) no formato YYYY-MM-DD"""
+    if isinstance(data_gasto, datetime):
+        return data_gasto.date().isoformat()
+    return data_gasto
+
+
+def ano_mes(data_gasto) -> tuple:
+    if isinstance(data_gasto, datetime):
+        return data_gasto.year, data_gasto.month
+    return int(data_gasto[:4]), int(data_gasto[5:7])
@@ -0,0 +1,250 @@
+"""Importação de extratos bancários (CSV e OFX).
+
+Os leitores são geradores: o arquivo é percorrido linha a linha (CSV) ou em
+blocos (OFX), com memória constante independentemente do tamanho. Cada
+transação vira um dicionário no formato de `GastoCreate`, com a categoria
+escolhida pelas regras de descrição, e recebe um hash de deduplicação sobre
+(data_gasto, valor, descricao) para que reimportar o mesmo extrato seja
+idempotente.
+
+O hash numera as repetições de (data, valor, descrição), então a contagem é
+guardada só para as últimas `JANELA_DATAS_IMPORTACAO` datas vistas: extratos
+vêm agrupados por data (em ordem crescente ou decrescente), e a memória fica
+proporcional aos lançamentos dessas datas, não ao arquivo. Um lançamento de
+uma data que já saiu da janela (arquivo fora de ordem) vira erro em vez de
+receber um hash que poderia colidir; ordenar o arquivo por data e reimportar
+resolve, já que os lançamentos gravados são reconhecidos como duplicados.
+
+Uso pela linha de comando:
+
+    python importacao.py extrato.ofx --categoria <id> --tipo-pagamento <id> [--regras regras.json]
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+from datetime import date, datetime
+
+TAMANHO_BLOCO_OFX = 64 * 1024
+JANELA_DATAS_IMPORTACAO = 7  # datas com contagem de repetições em aberto
+
+COLUNAS_DATA = {"data", "date", "data lançamento", "data lancamento", "data_gasto"}
+COLUNAS_DESCRICAO = {"descricao", "descrição", "historico", "histórico", "description", "memo", "title", "lançamento"}
+COLUNAS_VALOR = {"valor", "amount", "value", "valor (r$)", "quantia"}
+
+
+def _normalizar_descricao(descricao: str) -> str:
+    return " ".join(descricao.split())
+
+
+def hash_importacao(data_gasto: date, valor: float, descricao: str, ocorrencia: int = 1) -> str:
+    """Hash de deduplicação de (data_gasto, valor, descricao).
+
+    `ocorrencia` diferencia lançamentos idênticos legítimos no mesmo extrato
+    (ex.: dois cafés no mesmo dia): a n-ésima repetição recebe sempre o mesmo hash.
+    """
+    chave = f"{data_gasto.isoformat()}|{valor:.2f}|{_normalizar_descricao(descricao).lower()}|{ocorrencia}"
+    return hashlib.sha1(chave.encode()).hexdigest()
+
+
+def _parse_valor(texto: str) -> float:
+    texto = texto.replace("R$", "").replace(" ", "").strip()
+    if "," in texto:
+        # Formato brasileiro: 1.234,56
+        texto = texto.replace(".", "").replace(",", ".")
+    return float(texto)
+
+
+def _parse_data(texto: str) -> date:
+    texto = texto.strip()
+    for formato in ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    # OFX: YYYYMMDD[HHMMSS[.XXX]][TZ]
+    if len(texto) >= 8 and texto[:8].isdigit():
+        return datetime.strptime(texto[:8], "%Y%m%d").date()
+    raise ValueError(f"Data não reconhecida: {texto!r}")
+
+
+def _coluna(cabecalho: list, nomes: set) -> int:
+    for indice, coluna in enumerate(cabecalho):
+        if coluna.strip().lower() in nomes:
+            return indice
+    raise ValueError(f"Coluna não encontrada no CSV (esperado uma de: {', '.join(sorted(nomes))})")
+
+
+def ler_csv(linhas):
+    """Transações (data, descricao, valor) de um CSV com cabeçalho, separado por ';' ou ','.
+
+    Linhas ilegíveis são geradas como `ValueError`, sem interromper a leitura.
+    """
+    linhas = iter(linhas)
+    primeira = next(linhas, "")
+    delimitador = ";" if primeira.count(";") > primeira.count(",") else ","
+
+    cabecalho = next(csv.reader([primeira], delimiter=delimitador), [])
+    coluna_data = _coluna(cabecalho, COLUNAS_DATA)
+    coluna_descricao = _coluna(cabecalho, COLUNAS_DESCRICAO)
+    coluna_valor = _coluna(cabecalho, COLUNAS_VALOR)
+
+    for numero, campos in enumerate(csv.reader(linhas, delimiter=delimitador), start=2):
+        if not any(campo.strip() for campo in campos):
+            continue
+        try:
+            transacao = _parse_data(campos[coluna_data]), campos[coluna_descricao], _parse_valor(campos[coluna_valor])
+        except (ValueError, IndexError) as e:
+            transacao = ValueError(f"Linha {numero} inválida: {e}")
+        yield transacao
+
+
+def ler_ofx(blocos):
+    """Transações (data, descricao, valor) dos blocos <STMTTRN> de um OFX (SGML ou XML).
+
+    Transações ilegíveis são geradas como `ValueError`, sem interromper a leitura.
+    """
+    padrao = re.compile(r"<(/?)(\w+)>([^<]*)")
+    resto = ""
+    transacao = None
+
+    for bloco in blocos:
+        texto = resto + bloco
+        # Manter a última tag (possivelmente incompleta) para o próximo bloco
+        corte = texto.rfind("<")
+        texto, resto = texto[:corte], texto[corte:]
+
+        for fechamento, tag, valor in padrao.findall(texto):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if fechamento and transacao is not None:
+                    descricao = transacao.get("MEMO") or transacao.get("NAME") or ""
+                    try:
+                        lida = _parse_data(transacao["DTPOSTED"]), descricao, _parse_valor(transacao["TRNAMT"])
+                    except (ValueError, KeyError) as e:
+                        lida = ValueError(f"Transação OFX inválida: {e}")
+                    transacao = None
+                    yield lida
+                elif not fechamento:
+                    transacao = {}
+            elif transacao is not None and not fechamento and valor.strip():
+                transacao[tag] = valor.strip()
+
+
+def _blocos(arquivo):
+    while True:
+        bloco = arquivo.read(TAMANHO_BLOCO_OFX)
+        if not bloco:
+            return
+        yield bloco
+
+
+def ler_extrato(arquivo, formato: str):
+    """Transações de um arquivo texto já aberto, no formato 'csv' ou 'ofx'"""
+    if formato == "ofx":
+        return ler_ofx(_blocos(arquivo))
+    if formato == "csv":
+        return ler_csv(arquivo)
+    raise ValueError(f"Formato de extrato não suportado: {formato}")
+
+
+def formato_por_nome(nome_arquivo: str) -> str:
+    return "ofx" if nome_arquivo.lower().endswith((".ofx", ".qfx")) else "csv"
+
+
+def compilar_regras(regras: list) -> list:
+    """Regras [{"padrao": "uber|99", "categoria_id": "..."}] compiladas (primeira que casar vence)"""
+    return [(re.compile(regra["padrao"], re.IGNORECASE), regra["categoria_id"]) for regra in regras]
+
+
+def mapear_transacoes(transacoes, categoria_id: str, tipo_pagamento_id: str, regras: list, somente_debitos: bool = True):
+    """Converte transações em payloads de GastoCreate com o hash de deduplicação.
+
+    Em extratos, débitos vêm negativos; com `somente_debitos` os créditos são ignorados.
+    Transações ilegíveis, e as de datas que já saíram da janela, seguem adiante como `ValueError`.
+    """
+    ocorrencias = {}  # data -> Counter de (valor, descrição), da menos para a mais recente
+    encerradas = set()  # uma entrada por dia do calendário, não por lançamento
+
+    for transacao in transacoes:
+        if isinstance(transacao, ValueError):
+            yield transacao
+            continue
+
+        data_gasto, descricao, valor = transacao
+        if valor == 0 or (somente_debitos and valor > 0):
+            continue
+
+        descricao = _normalizar_descricao(descricao) or "Sem descrição"
+        valor = round(abs(valor), 2)
+        categoria_regra = next((categoria for padrao, categoria in regras if padrao.search(descricao)), None)
+
+        # Contagem por (dia, valor, descrição) e não por posição no arquivo: o mesmo extrato
+        # exportado em outra ordem gera os mesmos hashes
+        contagem = ocorrencias.pop(data_gasto, None)
+        if contagem is None:
+            if data_gasto in encerradas:
+                yield ValueError(
+                    f"Lançamento de {data_gasto.isoformat()} fora de ordem: ordene o extrato por data e reimporte"
+                )
+                continue
+            contagem = Counter()
+            if len(ocorrencias) >= JANELA_DATAS_IMPORTACAO:
+                antiga = next(iter(ocorrencias))
+                del ocorrencias[antiga]
+                encerradas.add(antiga)
+        ocorrencias[data_gasto] = contagem
+        chave = (valor, descricao.lower())
+        contagem[chave] += 1
+
+        yield {
+            "descricao": descricao,
+            "valor": valor,
+            "data_gasto": data_gasto,
+            "categoria_id": categoria_regra or categoria_id,
+            "tipo_pagamento_id": tipo_pagamento_id,
+            "hash_importacao": hash_importacao(data_gasto, valor, descricao, contagem[chave])
+        }
+
+
+async def _executar(args) -> int:
+    # Importação tardia: main usa este módulo e cria o cliente MongoDB em conectar_banco()
+    import main
+    main.conectar_banco(offline=False)
+
+    regras = []
+    if args.regras:
+        with open(args.regras, encoding="utf-8") as arquivo_regras:
+            regras = json.load(arquivo_regras)
+
+    formato = args.formato or formato_por_nome(args.arquivo)
+    try:
+        with open(args.arquivo, encoding=args.encoding, newline="") as arquivo:
+            resumo = await main.importar_extrato(
+                ler_extrato(arquivo, formato),
+                args.categoria,
+                args.tipo_pagamento,
+                regras,
+                somente_debitos=not args.incluir_creditos
+            )
+    finally:
+        main.client.close()
+
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importação de extratos bancários (CSV/OFX) para gastos")
+    parser.add_argument("arquivo")
+    parser.add_argument("--categoria", required=True, help="categoria padrão (quando nenhuma regra casar)")
+    parser.add_argument("--tipo-pagamento", required=True)
+    parser.add_argument("--regras", help="arquivo JSON com [{\"padrao\": ..., \"categoria_id\": ...}]")
+    parser.add_argument("--formato", choices=["csv", "ofx"])
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--incluir-creditos", action="store_true", help="importar também valores positivos")
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
@@ -0,0 +1,235 @@
+"""Índices do MongoDB: especificação declarativa, sincronização e checagem de planos.
+
+Passo de migração idempotente, executado uma vez por deploy (antes de subir os
+workers) e não a cada inicialização de worker:
+
+    python indices.py                # cria os que faltam e remove os obsoletos
+    python indices.py --remover      # também remove os que não estão na especificação
+    python indices.py --dry-run      # apenas mostra o que seria feito
+    python indices.py --explicar     # roda explain() nas consultas das rotas; exit 1 se houver COLLSCAN
+
+A remoção geral é opcional e fica fora do deploy: índices criados à mão ou pelo Atlas (Performance
+Advisor, busca) não estão em INDICES e seriam apagados. Os índices conhecidos como obsoletos
+(OBSOLETOS, criados por versões anteriores da API) são removidos sempre.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
+
+from orcamentos import CAMPOS_CHAVE as CAMPOS_CHAVE_ORCAMENTOS, COLECAO_ALERTAS, COLECAO_ORCAMENTOS
+from resumos import CAMPOS_CHAVE, COLECAO_RESUMOS
+
+# Nomes gerados automaticamente pelo pymongo (ex.: "nome_1"), compatíveis com os índices já existentes
+INDICES = {
+    "categorias": [
+        IndexModel([("nome", 1)], unique=True),
+        IndexModel([("versao", 1)]),
+    ],
+    "tipos_pagamento": [
+        IndexModel([("nome", 1)], unique=True),
+        IndexModel([("versao", 1)]),
+    ],
+    "gastos": [
+        # Listagem ordenada, filtros por mês/período, paginação por cursor e exportação (percorrido ao contrário)
+        IndexModel([("data_gasto", -1), ("_id", -1)]),
+        # Sincronização incremental e replay de eventos
+        IndexModel([("versao", 1)]),
+        # Verificação de uso antes de remover categoria / tipo de pagamento e propagação de
+        # alterações em lotes ordenados por _id
+        IndexModel([("categoria.id", 1), ("_id", 1)]),
+        IndexModel([("tipo_pagamento.id", 1), ("_id", 1)]),
+        # Busca textual na descrição (GET /gastos/search)
+        IndexModel([("descricao", "text")], default_language="portuguese"),
+        # Deduplicação de extratos importados
+        IndexModel(
+            [("hash_importacao", 1)],
+            unique=True,
+            partialFilterExpression={"hash_importacao": {"$exists": True}}
+        ),
+    ],
+    "propagacoes": [
+        IndexModel([("estado", 1), ("criado_em", 1)]),
+        IndexModel([("tipo", 1), ("referencia_id", 1), ("estado", 1)]),
+    ],
+    "remocoes": [
+        IndexModel([("colecao", 1), ("versao", 1)]),
+        # Expiração dos tombstones pela retenção (REMOCOES_RETENCAO_DIAS)
+        IndexModel([("removido_em", 1)]),
+    ],
+    COLECAO_RESUMOS: [
+        IndexModel([(campo, 1) for campo in CAMPOS_CHAVE], unique=True),
+    ],
+    # Um orçamento por (ano, mês, categoria): o $inc com upsert depende da unicidade
+    COLECAO_ORCAMENTOS: [
+        IndexModel([(campo, 1) for campo in CAMPOS_CHAVE_ORCAMENTOS], unique=True),
+    ],
+    COLECAO_ALERTAS: [
+        IndexModel([("criado_em", -1)]),
+    ],
+}
+
+# Criados pela inicialização das versões anteriores e substituídos pela especificação acima: só custam
+# nas escritas ((data_gasto, _id) cobre data_gasto; as rotas filtram por id, não por nome)
+OBSOLETOS = {
+    "gastos": ["data_gasto_1", "categoria.nome_1", "tipo_pagamento.nome_1"],
+}
+
+OPCOES_COMPARADAS = ["unique", "partialFilterExpression", "sparse", "expireAfterSeconds"]
+
+
+def _opcoes(indice: dict) -> dict:
+    opcoes = {opcao: indice.get(opcao) for opcao in OPCOES_COMPARADAS}
+    # O servidor omite flags falsas; a especificação também
+    opcoes["unique"] = bool(opcoes["unique"])
+    opcoes["sparse"] = bool(opcoes["sparse"])
+    return opcoes
+
+
+async def sincronizar(database, remover: bool = False, dry_run: bool = False) -> dict:
+    """Alinha os índices de cada coleção à especificação; retorna o que foi criado/removido
+
+    Os OBSOLETOS são removidos sempre; os demais fora da especificação só com `remover`.
+    """
+    alteracoes = {"criados": [], "removidos": []}
+
+    for nome_colecao, modelos in INDICES.items():
+        colecao = database[nome_colecao]
+        existentes = await colecao.index_information()
+        desejados = {modelo.document["name"]: modelo for modelo in modelos}
+
+        a_remover = []
+        for nome, indice in existentes.items():
+            if nome == "_id_":
+                continue
+            desejado = desejados.get(nome)
+            if desejado is None:
+                if remover or nome in OBSOLETOS.get(nome_colecao, []):
+                    a_remover.append(nome)
+            elif _opcoes(indice) != _opcoes(desejado.document):
+                # Mesmas chaves com opções diferentes: recriar
+                a_remover.append(nome)
+
+        a_criar = [modelo for nome, modelo in desejados.items() if nome not in existentes or nome in a_remover]
+
+        for nome in a_remover:
+            alteracoes["removidos"].append(f"{nome_colecao}.{nome}")
+            if not dry_run:
+                await colecao.drop_index(nome)
+
+        if a_criar:
+            alteracoes["criados"].extend(f"{nome_colecao}.{modelo.document['name']}" for modelo in a_criar)
+            if not dry_run:
+                await colecao.create_indexes(a_criar)
+
+    return alteracoes
+
+
+def _consultas_das_rotas() -> list:
+    """(rota, coleção, filtro, ordenação) para cada consulta que as rotas fazem no caminho quente"""
+    # Importação tardia: main não cria conexão na importação, só expõe os construtores de filtro
+    from datetime import date, datetime
+    from bson import ObjectId
+    from main import GASTOS_ORDENACAO, _codificar_cursor, _filtro_cursor, _filtro_datas, _filtro_mes
+
+    filtro_mes = _filtro_mes(2024, 1)
+    cursor = _filtro_cursor(_codificar_cursor({"data_gasto": datetime(2024, 1, 15), "_id": ObjectId()}))
+    periodo = _filtro_datas(date(2024, 1, 1), date(2025, 1, 1))
+
+    return [
+        ("GET /gastos", "gastos", {}, GASTOS_ORDENACAO),
+        ("GET /gastos?mes&ano", "gastos", filtro_mes, GASTOS_ORDENACAO),
+        ("GET /gastos?after", "gastos", {"$and": [filtro_mes, cursor]}, GASTOS_ORDENACAO),
+        ("GET /gastos/changes", "gastos", {"versao": {"$gt": 0}}, [("versao", 1)]),
+        ("GET /gastos/changes (remoções)", "remocoes", {"colecao": "gastos", "versao": {"$gt": 0}}, [("versao", 1)]),
+        ("GET /gastos/changes (snapshot)", "gastos", cursor, GASTOS_ORDENACAO),
+        ("Recarga de ETags (gastos)", "gastos", {"versao": {"$lte": 0}}, [("versao", -1)]),
+        ("Recarga de ETags (remoções)", "remocoes", {"colecao": "gastos", "versao": {"$lte": 0}}, [("versao", -1)]),
+        ("Expiração de remoções", "remocoes", {"removido_em": {"$lt": datetime(2024, 1, 1)}}, [("versao", -1)]),
+        ("GET /gastos/export", "gastos", periodo, [("data_gasto", 1), ("_id", 1)]),
+        ("GET /gastos/search", "gastos", {"$text": {"$search": "mercado"}}, None),
+        ("POST /gastos/importar (hashes)", "gastos", {"hash_importacao": {"$in": ["0" * 40]}}, None),
+        ("GET /eventos (categorias)", "categorias", {"versao": {"$gt": 0}}, [("versao", 1)]),
+        ("GET /eventos (tipos)", "tipos_pagamento", {"versao": {"$gt": 0}}, [("versao", 1)]),
+        ("GET /relatorio/mensal (detalhe)", "gastos", filtro_mes, GASTOS_ORDENACAO),
+        ("GET /relatorio/mensal (resumo)", COLECAO_RESUMOS, {"ano": 2024, "mes": 1}, None),
+        ("GET /relatorio/anual", COLECAO_RESUMOS, {"ano": 2024}, None),
+        ("POST /categorias", "categorias", {"nome": "x"}, None),
+        ("POST /tipos-pagamento", "tipos_pagamento", {"nome": "x"}, None),
+        ("DELETE /categorias/{id}", "gastos", {"categoria.id": "x"}, None),
+        ("DELETE /tipos-pagamento/{id}", "gastos", {"tipo_pagamento.id": "x"}, None),
+        ("Propagação de categoria", "gastos", {"categoria.id": "x", "_id": {"$gt": ObjectId()}}, [("_id", 1)]),
+        ("Propagação de tipo de pagamento", "gastos", {"tipo_pagamento.id": "x", "_id": {"$gt": ObjectId()}}, [("_id", 1)]),
+        ("Propagações pendentes", "propagacoes", {"estado": "pendente"}, [("criado_em", 1)]),
+        ("GET /orcamentos/{ano}/{mes}", COLECAO_ORCAMENTOS, {"ano": 2024, "mes": 1}, None),
+        ("GET /orcamentos/alertas", COLECAO_ALERTAS, {}, [("criado_em", -1)]),
+    ]
+
+
+def _estagios(plano) -> set:
+    """Todos os estágios (stage) de um plano do explain, recursivamente"""
+    estagios = set()
+    if isinstance(plano, dict):
+        if "stage" in plano:
+            estagios.add(plano["stage"])
+        for valor in plano.values():
+            estagios |= _estagios(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            estagios |= _estagios(item)
+    return estagios
+
+
+async def explicar_consultas(database) -> list:
+    """Roda explain() em cada consulta das rotas; retorna as que caíram em COLLSCAN"""
+    regressoes = []
+    for rota, nome_colecao, filtro, ordenacao in _consultas_das_rotas():
+        cursor = database[nome_colecao].find(filtro)
+        if ordenacao:
+            cursor = cursor.sort(ordenacao)
+        plano = await cursor.explain()
+        estagios = _estagios(plano["queryPlanner"]["winningPlan"])
+
+        situacao = "❌ COLLSCAN" if "COLLSCAN" in estagios else "✅"
+        print(f"{situacao} {rota}: {', '.join(sorted(estagios))}")
+        if "COLLSCAN" in estagios:
+            regressoes.append(rota)
+
+    return regressoes
+
+
+async def _executar(args) -> int:
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    database = client[os.environ.get("MONGODB_DATABASE", "controle_gastos")]
+
+    try:
+        if args.explicar:
+            regressoes = await explicar_consultas(database)
+            print(f"📊 {len(regressoes)} consulta(s) com COLLSCAN")
+            return 1 if regressoes else 0
+
+        alteracoes = await sincronizar(database, remover=args.remover, dry_run=args.dry_run)
+        for nome in alteracoes["criados"]:
+            print(f"✅ Índice criado: {nome}")
+        for nome in alteracoes["removidos"]:
+            print(f"🗑️ Índice removido: {nome}")
+        print("🎉 Índices sincronizados" + (" (dry-run)" if args.dry_run else ""))
+        return 0
+    except Exception as e:
+        print(f"❌ Erro ao sincronizar índices: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincronização de índices e checagem de planos de consulta")
+    parser.add_argument("--dry-run", action="store_true", help="mostrar as alterações sem aplicá-las")
+    parser.add_argument("--remover", action="store_true", help="remover índices fora da especificação (inclusive os criados à mão)")
+    parser.add_argument("--explicar", action="store_true", help="checar planos das consultas das rotas (exit 1 se COLLSCAN)")
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
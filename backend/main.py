@@ -1,73 +1,872 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Path, Query, Response, Request, Header, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
-from typing import List, Optional
-from datetime import date, datetime
+import json
+import asyncio
+import base64
+import time
+import codecs
+import io
+import re
+import csv
+import zlib
+import socket
+import itertools
+from contextlib import asynccontextmanager
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele as respostas rápidas usam o json da biblioteca padrão
+    orjson = None
+from typing import List, Literal, Optional
+from datetime import date, datetime, timedelta
 import uvicorn
 from dotenv import load_dotenv
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
+from pydantic import ValidationError
+
+from resumos import COLECAO_RESUMOS, TOTAL_CENTAVOS, aplicar_resumos
+from orcamentos import COLECAO_ALERTAS, COLECAO_ORCAMENTOS, aplicar_orcamentos, definir_limite
+from autocompletar import IndiceDescricoes
+from analitico import DIMENSOES, SnapshotGastos
+from formato import centavos_do_gasto, data_iso, data_para_bson, de_centavos, para_centavos
+import metricas
+from banco_local import ClienteLocal
+from indices import sincronizar
+import compressao
+import protecao
+from importacao import compilar_regras, formato_por_nome, ler_extrato, mapear_transacoes
+
+# Referência para medir o tempo até o primeiro request atendido
+INICIO_PROCESSO = time.perf_counter()
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 app = FastAPI(title="💰 Controle de Gastos", version="2.0.0")
 
+# 🛡️ Banco degradado: prazo por requisição, limite de requisições em andamento e disjuntor (503 imediato).
+# Registrados antes do CORS para ficarem por dentro dele: os 503/504 também levam os headers de CORS
+app.add_middleware(protecao.PrazoRequisicao)
+app.add_middleware(protecao.LimiteRequisicoes)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Propagacao-Id", "ETag"],
 )
 
+# ⏱️ Tempos de inicialização deste worker (desde a importação do módulo)
+estado_inicializacao = {"startup_ms": None, "primeira_requisicao_ms": None}
+
+class MedirPrimeiraRequisicao:
+    """Middleware ASGI que registra o time-to-first-request e depois só repassa"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if scope["type"] == "http" and estado_inicializacao["primeira_requisicao_ms"] is None:
+            estado_inicializacao["primeira_requisicao_ms"] = round((time.perf_counter() - INICIO_PROCESSO) * 1000, 2)
+            print(f"⏱️ Primeiro request atendido {estado_inicializacao['primeira_requisicao_ms']} ms após o início do worker")
+
+# Listas e relatórios grandes saem comprimidos (br/gzip); SSE nunca
+app.add_middleware(compressao.Compressao)
+app.add_middleware(MedirPrimeiraRequisicao)
+app.add_middleware(metricas.MetricasHTTP)
+
 # 🍃 Configuração MongoDB Atlas
 MONGODB_URL = os.environ.get("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.environ.get("MONGODB_DATABASE", "controle_gastos")
 
-# Cliente MongoDB simplificado (usando configurações da URL)
-try:
-    print("🔐 Conectando ao MongoDB...")
-    client = AsyncIOMotorClient(MONGODB_URL)
+# 💾 Armazenamento: "mongodb" (padrão) ou "local" (banco embutido, sem servidor); com ARMAZENAMENTO_LOCAL_DIR
+# os dados do banco local são salvos em disco
+ARMAZENAMENTO = os.environ.get("ARMAZENAMENTO", "mongodb")
+# Modo offline: se o MongoDB não responde ao ping da inicialização, o worker sobe com o banco local.
+# Os dados gravados nele ficam separados e não são enviados ao Atlas quando ele volta
+MODO_OFFLINE = os.environ.get("MODO_OFFLINE", "true").lower() in ("1", "true", "sim")
+ARMAZENAMENTO_LOCAL_DIR = os.environ.get("ARMAZENAMENTO_LOCAL_DIR")
+ARMAZENAMENTO_LOCAL_SALVAR_SEGUNDOS = float(os.environ.get("ARMAZENAMENTO_LOCAL_SALVAR_SEGUNDOS", 30))
+
+# ⏳ Timeouts e pool do cliente MongoDB (0 = padrão do driver / opção da URL). MONGO_TIMEOUT_MS é o prazo
+# de cada operação (timeoutMS do pymongo, inclui seleção de servidor e espera por conexão do pool)
+OPCOES_CLIENTE_MONGO = {
+    "timeoutMS": ("MONGO_TIMEOUT_MS", 10000),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", 5000),
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", 0),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", 0),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", 0),
+}
+
+def _opcoes_cliente() -> dict:
+    opcoes = {}
+    for opcao, (variavel, padrao) in OPCOES_CLIENTE_MONGO.items():
+        valor = int(os.environ.get(variavel, padrao))
+        if valor > 0:
+            opcoes[opcao] = valor
+    return opcoes
+
+# 📡 Eventos em tempo real: "rotas" (publicados pelas rotas de escrita) ou "change_stream" (MongoDB)
+FONTE_EVENTOS = os.environ.get("FONTE_EVENTOS", "rotas")
+SSE_FILA_MAX = int(os.environ.get("SSE_FILA_MAX", 100))
+SSE_REPLAY_MAX = int(os.environ.get("SSE_REPLAY_MAX", 1000))
+SSE_KEEPALIVE_SEGUNDOS = 15
+
+# 🔁 Sincronização incremental: uma versão reservada e não concluída em VERSOES_PRAZO_GRAVACAO_SEGUNDOS
+# (processo que caiu no meio da escrita) deixa de segurar o token de sincronização
+VERSOES_PRAZO_GRAVACAO_SEGUNDOS = float(os.environ.get("VERSOES_PRAZO_GRAVACAO_SEGUNDOS", 60))
+# Tombstones de remoção ficam REMOCOES_RETENCAO_DIAS; um token mais antigo que o horizonte apagado recebe
+# um snapshot novo (completo) em vez de um delta sem as remoções
+REMOCOES_RETENCAO_DIAS = float(os.environ.get("REMOCOES_RETENCAO_DIAS", 30))
+REMOCOES_LIMPEZA_SEGUNDOS = 3600
+
+# 🗂️ Cache em memória de categorias e tipos de pagamento (TTL para segurança com múltiplas instâncias)
+CACHE_REFERENCIAS_TTL = float(os.environ.get("CACHE_REFERENCIAS_TTL", 60))
+CACHE_REFERENCIAS_TENTATIVAS = 3  # recargas seguidas quando escritas concorrentes invalidam a leitura
+
+# 🏷️ ETags por coleção: versões de outros workers chegam a cada ETAG_RECARGA_SEGUNDOS
+ETAG_RECARGA_SEGUNDOS = float(os.environ.get("ETAG_RECARGA_SEGUNDOS", 2))
+
+# 📦 Agrupamento de POST /gastos concorrentes em um único insert_many (opt-in)
+AGRUPAR_INSERCOES = os.environ.get("AGRUPAR_INSERCOES", "false").lower() in ("1", "true", "sim")
+AGRUPAR_INSERCOES_MAX = int(os.environ.get("AGRUPAR_INSERCOES_MAX", 100))
+AGRUPAR_INSERCOES_ESPERA_MS = float(os.environ.get("AGRUPAR_INSERCOES_ESPERA_MS", 2))
+
+# 🔎 Autocompletar de descrições: índice em memória das mais usadas, recarregado periodicamente
+# (pega as escritas de outros workers) e atualizado a cada escrita local
+AUTOCOMPLETAR_MAX = int(os.environ.get("AUTOCOMPLETAR_MAX", 5000))
+AUTOCOMPLETAR_AMOSTRA = 20000
+AUTOCOMPLETAR_RECARGA_SEGUNDOS = float(os.environ.get("AUTOCOMPLETAR_RECARGA_SEGUNDOS", 300))
+
+# 📊 Relatórios analíticos: snapshot colunar dos gastos em memória, atualizado por delta de versão
+# a cada escrita; a carga completa é refeita a cada ANALITICO_RECARGA_COMPLETA_SEGUNDOS
+ANALITICO_RECARGA_COMPLETA_SEGUNDOS = float(os.environ.get("ANALITICO_RECARGA_COMPLETA_SEGUNDOS", 3600))
+
+# 🔁 Propagação de categoria / tipo de pagamento alterados para as cópias embutidas nos gastos
+PROPAGACAO_TAMANHO_LOTE = int(os.environ.get("PROPAGACAO_TAMANHO_LOTE", 500))
+PROPAGACAO_PAUSA_SEGUNDOS = float(os.environ.get("PROPAGACAO_PAUSA_MS", 50)) / 1000
+PROPAGACAO_LEASE_SEGUNDOS = 60
+PROPAGACAO_VERIFICACAO_SEGUNDOS = 30
+PROPAGACAO_MAX_TENTATIVAS = 5
+
+# Cliente e collections são criados por worker na inicialização (conectar_banco),
+# nunca na importação: cada processo após o fork tem o seu próprio pool de conexões
+client = None
+database = None
+categorias_collection = None
+gastos_collection = None
+tipos_pagamento_collection = None
+contadores_collection = None
+remocoes_collection = None
+versoes_concluidas_collection = None
+resumos_collection = None
+propagacoes_collection = None
+orcamentos_collection = None
+alertas_orcamento_collection = None
+modo_offline = False
+
+def conectar_banco(offline: bool = MODO_OFFLINE):
+    """Cria o cliente MongoDB (usando configurações da URL) e as collections deste processo"""
+    global client
     
+    if ARMAZENAMENTO == "local":
+        print("💾 Usando o banco local embutido")
+        client = ClienteLocal(ARMAZENAMENTO_LOCAL_DIR)
+    else:
+        try:
+            print("🔐 Conectando ao MongoDB...")
+            # Listeners de monitoramento alimentam /metrics (tempo por comando e estado do pool) e o disjuntor
+            client = AsyncIOMotorClient(
+                MONGODB_URL,
+                event_listeners=[metricas.MonitorComandos(protecao.disjuntor), metricas.MonitorPool(protecao.disjuntor)],
+                **_opcoes_cliente()
+            )
+        except Exception as e:
+            print(f"⚠️ Erro na criação do cliente MongoDB: {e}")
+            if not offline:
+                raise
+            client = _cliente_offline()
+    
+    _usar_cliente(client)
+
+def _usar_cliente(novo_client):
+    global client, database, categorias_collection, gastos_collection, tipos_pagamento_collection
+    global contadores_collection, remocoes_collection, versoes_concluidas_collection, resumos_collection, propagacoes_collection
+    global orcamentos_collection, alertas_orcamento_collection
+    
+    client = novo_client
     database = client[DATABASE_NAME]
     print(f"📁 Database: {DATABASE_NAME}")
-except Exception as e:
-    print(f"⚠️ Erro na criação do cliente MongoDB: {e}")
-    client = None
-    database = None
-
-# Collections com verificação de segurança
-if database is not None:
+    
     categorias_collection = database.categorias
     gastos_collection = database.gastos
     tipos_pagamento_collection = database.tipos_pagamento
-else:
-    print("❌ Database não inicializado - funcionando no modo offline")
-    categorias_collection = None
-    gastos_collection = None
-    tipos_pagamento_collection = None
+    contadores_collection = database.contadores
+    remocoes_collection = database.remocoes
+    versoes_concluidas_collection = database.versoes_concluidas
+    resumos_collection = database[COLECAO_RESUMOS]
+    propagacoes_collection = database.propagacoes
+    orcamentos_collection = database[COLECAO_ORCAMENTOS]
+    alertas_orcamento_collection = database[COLECAO_ALERTAS]
+
+def _cliente_offline() -> ClienteLocal:
+    global modo_offline
+    modo_offline = True
+    aviso = f"salvo em {ARMAZENAMENTO_LOCAL_DIR}" if ARMAZENAMENTO_LOCAL_DIR else "somente em memória"
+    print(f"💾 Modo offline: usando o banco local embutido ({aviso})")
+    print("⚠️ Os dados do modo offline ficam separados: nada do que for gravado agora chega ao MongoDB Atlas")
+    return ClienteLocal(ARMAZENAMENTO_LOCAL_DIR)
+
+async def _verificar_mongodb():
+    """Ping antes de servir: o Motor conecta sob demanda, então um Atlas inacessível só aparece aqui"""
+    if _banco_local() or not MODO_OFFLINE:
+        return
+    try:
+        # Com timeoutMS o driver ignora serverSelectionTimeoutMS: o prazo do ping é aplicado aqui
+        prazo = _opcoes_cliente().get("serverSelectionTimeoutMS", 30000) / 1000
+        await asyncio.wait_for(client.admin.command("ping"), prazo)
+    except Exception as e:
+        print(f"⚠️ MongoDB não respondeu ao ping da inicialização: {type(e).__name__}: {e}")
+        client.close()
+        _usar_cliente(_cliente_offline())
+
+def _banco_local() -> bool:
+    return isinstance(client, ClienteLocal)
+
+async def _salvar_banco_local():
+    """Grava periodicamente as coleções alteradas do banco local (também salvo no shutdown)"""
+    while True:
+        await asyncio.sleep(ARMAZENAMENTO_LOCAL_SALVAR_SEGUNDOS)
+        try:
+            client.salvar()
+        except Exception as e:
+            print(f"⚠️ Banco local não salvo: {e}")
+
+# 🩺 Monitor de saúde em segundo plano: as rotas leem o estado, sem ping por requisição
+HEALTH_PING_INTERVALO = float(os.environ.get("HEALTH_PING_INTERVALO", 10))
+
+estado_banco = {
+    "conectado": False,
+    "latencia_ms": None,
+    "ultimo_ping": None,
+    "erro": None
+}
+
+async def _pingar_banco():
+    primeiro_ping = estado_banco["ultimo_ping"] is None
+    inicio = time.perf_counter()
+    try:
+        await client.admin.command('ping')
+        if not estado_banco["conectado"]:
+            print("🎉 Banco local pronto!" if _banco_local() else "🎉 MongoDB Atlas conectado com sucesso!")
+        estado_banco["conectado"] = True
+        estado_banco["latencia_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        estado_banco["erro"] = None
+    except Exception as e:
+        if primeiro_ping:
+            print(f"❌ Erro detalhado ao conectar MongoDB: {type(e).__name__}: {e}")
+            print("🔧 Tentativas de resolução:")
+            print("   1. Verificar se IP está na whitelist do MongoDB Atlas")
+            print("   2. Verificar se credenciais estão corretas")
+            print("   3. Verificar se cluster está ativo")
+            print("   4. Verificar conectividade de rede")
+        elif estado_banco["conectado"]:
+            print(f"⚠️ Falha na verificação de conectividade: {e}")
+        protecao.disjuntor.registrar_excecao(e)
+        estado_banco["conectado"] = False
+        estado_banco["erro"] = str(e)
+    estado_banco["ultimo_ping"] = datetime.now()
+
+async def _monitorar_banco():
+    while True:
+        await _pingar_banco()
+        await asyncio.sleep(HEALTH_PING_INTERVALO)
 
 # Função helper para verificar conectividade
 async def check_db_connection():
-    """Verifica se a conexão com o database está ativa"""
+    """Verifica se a conexão com o database está ativa (estado mantido pelo monitor)"""
     if client is None or database is None:
         raise HTTPException(
             status_code=503, 
             detail="Serviço de database indisponível. Tente novamente em alguns instantes."
         )
     
-    try:
-        # Teste rápido de conectividade
-        await client.admin.command('ping')
-        return True
-    except Exception as e:
-        print(f"⚠️ Falha na verificação de conectividade: {e}")
+    if not estado_banco["conectado"]:
         raise HTTPException(
             status_code=503, 
-            detail=f"Database temporariamente indisponível: {str(e)}"
+            detail=f"Database temporariamente indisponível: {estado_banco['erro']}"
+        )
+    return True
+
+# 📄 Helpers de gastos (formatação, filtros e paginação por cursor)
+GASTOS_ORDENACAO = [("data_gasto", -1), ("_id", -1)]
+TAMANHO_PAGINA_PADRAO = 100
+RELATORIO_LOTE_STREAM = 500
+BULK_TAMANHO_LOTE = int(os.environ.get("BULK_TAMANHO_LOTE", 1000))
+BULK_ITEM_MAX_BYTES = 64 * 1024
+IMPORTACAO_TAMANHO_LOTE = 500
+IMPORTACAO_MAX_MENSAGENS = 100
+EXPORTACAO_LOTE = 2000
+CAMPOS_GASTO_OBRIGATORIOS = {"descricao", "valor", "data_gasto"}
+CAMPOS_GASTO_OPCIONAIS = {"categoria", "tipo_pagamento", "criado_em"}
+
+def _gasto_resposta(gasto: dict) -> dict:
+    """Documento do MongoDB direto no formato do modelo Gasto (mesmos campos que o response_model entregaria).
+    
+    Único ponto de saída de gastos (listagem, sincronização, exportação, relatórios e eventos):
+    campos internos como `versao`, `hash_importacao` e `atualizado_em` não vazam.
+    """
+    return {
+        "id": str(gasto["_id"]),
+        "descricao": gasto["descricao"],
+        "valor": de_centavos(gasto["valor_centavos"]) if "valor_centavos" in gasto else float(gasto["valor"]),
+        "data_gasto": data_iso(gasto["data_gasto"]),
+        "categoria": gasto.get("categoria"),
+        "tipo_pagamento": gasto.get("tipo_pagamento"),
+        "criado_em": gasto.get("criado_em")
+    }
+
+def _filtro_datas(inicio: Optional[date] = None, fim: Optional[date] = None) -> dict:
+    """Filtro de data_gasto no intervalo [inicio, fim), qualquer um dos limites opcional"""
+    nativo, legado = {}, {}
+    if inicio:
+        nativo["$gte"], legado["$gte"] = data_para_bson(inicio), inicio.isoformat()
+    if fim:
+        nativo["$lt"], legado["$lt"] = data_para_bson(fim), fim.isoformat()
+    if not nativo:
+        return {}
+    
+    # Gastos ainda não migrados guardam a data como string ISO (ver migracoes.py)
+    return {"$or": [{"data_gasto": nativo}, {"data_gasto": legado}]}
+
+def _filtro_mes(ano: int, mes: int) -> dict:
+    """Filtro de data_gasto para um mês"""
+    if mes == 12:
+        return _filtro_datas(date(ano, 12, 1), date(ano + 1, 1, 1))
+    return _filtro_datas(date(ano, mes, 1), date(ano, mes + 1, 1))
+
+def _codificar_cursor(gasto: dict, **extras) -> str:
+    """Gera o token opaco de paginação a partir de (data_gasto, _id), com campos extras opcionais"""
+    payload = {"d": data_iso(gasto["data_gasto"]), "i": str(gasto["_id"]), **extras}
+    if isinstance(gasto["data_gasto"], datetime):
+        payload["n"] = 1
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def _decodificar_cursor(token: str) -> dict:
+    try:
+        padding = "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(token + padding))
+        payload["d"] = date.fromisoformat(payload["d"])
+        payload["i"] = ObjectId(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+    return payload
+
+def _filtro_cursor(token: str) -> dict:
+    """Filtro keyset: documentos estritamente depois do cursor na ordenação (data_gasto, _id) desc"""
+    payload = _decodificar_cursor(token)
+    data_gasto, gasto_id = payload["d"], payload["i"]
+    
+    if not payload.get("n"):
+        # Cursor sobre um gasto legado (string): na ordenação desc as strings vêm depois das datas
+        data_gasto = data_gasto.isoformat()
+        return {
+            "$or": [
+                {"data_gasto": {"$lt": data_gasto}},
+                {"data_gasto": data_gasto, "_id": {"$lt": gasto_id}}
+            ]
+        }
+    
+    data_gasto = data_para_bson(data_gasto)
+    return {
+        "$or": [
+            {"data_gasto": {"$lt": data_gasto}},
+            {"data_gasto": data_gasto, "_id": {"$lt": gasto_id}},
+            {"data_gasto": {"$type": "string"}}
+        ]
+    }
+
+def _projecao_gasto(fields: Optional[str]) -> Optional[dict]:
+    """Projeção a partir de ?fields=; campos obrigatórios do modelo Gasto são sempre incluídos"""
+    if not fields:
+        return None
+    
+    solicitados = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    invalidos = solicitados - CAMPOS_GASTO_OBRIGATORIOS - CAMPOS_GASTO_OPCIONAIS - {"id"}
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos inválidos em fields: {', '.join(sorted(invalidos))}"
+        )
+    
+    campos = CAMPOS_GASTO_OBRIGATORIOS | (solicitados & CAMPOS_GASTO_OPCIONAIS) | {"valor_centavos"}
+    return {campo: 1 for campo in campos}
+
+# 🔁 Versionamento de alterações (sincronização incremental)
+async def _proxima_versao(quantidade: int = 1) -> int:
+    """Reserva `quantidade` versões no contador global e retorna a última reservada"""
+    contador = await contadores_collection.find_one_and_update(
+        {"_id": "versao"},
+        {"$inc": {"valor": quantidade}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return contador["valor"]
+
+async def _versao_atual() -> int:
+    contador = await contadores_collection.find_one({"_id": "versao"})
+    return contador["valor"] if contador else 0
+
+@asynccontextmanager
+async def _reservar_versoes(quantidade: int = 1):
+    """Reserva versões para uma escrita e marca a faixa como concluída ao sair (com ou sem erro).
+    
+    As versões são reservadas antes da gravação, então duas escritas concorrentes podem
+    terminar fora de ordem. O token de sincronização não é a maior versão vista, e sim a
+    versão consolidada (ver `_versao_consolidada`), que só avança sobre faixas concluídas.
+    O evento deve ser publicado dentro do bloco, antes de a faixa ser concluída.
+    """
+    versao_final = await _proxima_versao(quantidade)
+    try:
+        yield versao_final
+    finally:
+        await versoes_concluidas_collection.insert_one({
+            "_id": versao_final - quantidade + 1,
+            "fim": versao_final,
+            "concluida_em": datetime.now()
+        })
+
+async def _versao_consolidada() -> int:
+    """Maior versão V tal que todas as versões <= V já foram gravadas (ou abandonadas)"""
+    contador = await contadores_collection.find_one({"_id": "versao"})
+    if contador is None:
+        return 0
+    consolidada = contador.get("consolidada")
+    if consolidada is None:
+        # Base anterior à consolidação: o que já estava reservado conta como gravado
+        consolidada = contador["valor"]
+        await contadores_collection.update_one({"_id": "versao"}, {"$max": {"consolidada": consolidada}})
+    
+    # Uma lacuna é uma faixa ainda em gravação; só é pulada quando a faixa seguinte terminou há
+    # mais que o prazo (a reservada antes dela já passou do prazo)
+    abandono = datetime.now() - timedelta(seconds=VERSOES_PRAZO_GRAVACAO_SEGUNDOS)
+    nova = consolidada
+    cursor = versoes_concluidas_collection.find({"_id": {"$gt": consolidada}}).sort("_id", 1).limit(SSE_REPLAY_MAX)
+    async for faixa in cursor:
+        if faixa["_id"] > nova + 1 and faixa["concluida_em"] > abandono:
+            break
+        nova = max(nova, faixa["fim"])
+    
+    if nova > consolidada:
+        await contadores_collection.update_one({"_id": "versao"}, {"$max": {"consolidada": nova}})
+        await versoes_concluidas_collection.delete_many({"_id": {"$lte": nova}})
+    return nova
+
+async def _registrar_remocao(colecao: str, documento_id: str, versao: int):
+    """Grava o tombstone de um documento removido para os clientes em sincronização"""
+    await remocoes_collection.insert_one({
+        "colecao": colecao,
+        "documento_id": documento_id,
+        "versao": versao,
+        "removido_em": datetime.now()
+    })
+
+async def _horizonte_remocoes() -> int:
+    """Maior versão cujos tombstones podem já ter sido apagados pela retenção"""
+    contador = await contadores_collection.find_one({"_id": "versao"}, {"remocoes_expiradas": 1})
+    return (contador or {}).get("remocoes_expiradas", 0)
+
+async def _expirar_remocoes() -> int:
+    """Apaga os tombstones além da retenção; retorna quantos foram apagados"""
+    prazo = datetime.now() - timedelta(days=REMOCOES_RETENCAO_DIAS)
+    ultima = await remocoes_collection.find_one({"removido_em": {"$lt": prazo}}, {"versao": 1}, sort=[("versao", -1)])
+    if ultima is None:
+        return 0
+    # O horizonte avança antes da remoção: quem ler entre os dois passos já recebe o snapshot
+    await contadores_collection.update_one(
+        {"_id": "versao"}, {"$max": {"remocoes_expiradas": ultima["versao"]}}, upsert=True
+    )
+    resultado = await remocoes_collection.delete_many({"versao": {"$lte": ultima["versao"]}})
+    return resultado.deleted_count
+
+async def _monitorar_remocoes():
+    while True:
+        try:
+            apagadas = await _expirar_remocoes()
+            if apagadas:
+                print(f"🧹 {apagadas} tombstone(s) de remoção expirado(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Tombstones de remoção não expirados: {e}")
+        await asyncio.sleep(REMOCOES_LIMPEZA_SEGUNDOS)
+
+def _ler_token_sincronizacao(token: str) -> int:
+    try:
+        versao = int(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Token de sincronização inválido")
+    if versao < 0:
+        raise HTTPException(status_code=400, detail="Token de sincronização inválido")
+    return versao
+
+# 🗂️ Cache das coleções de referência (pequenas e raramente alteradas)
+class CacheReferencias:
+    """Cópia em memória de uma coleção de referência, invalidada nas escritas e limitada por TTL"""
+    
+    def __init__(self, obter_colecao, ttl: float):
+        self.obter_colecao = obter_colecao
+        self.ttl = ttl
+        self.documentos = {}
+        self.carregado_em = None
+        self.geracao = 0  # avança a cada invalidação
+        self.hits = 0
+        self.misses = 0
+        self.recargas = 0
+        self._lock = asyncio.Lock()
+    
+    def _expirado(self) -> bool:
+        return self.carregado_em is None or time.monotonic() - self.carregado_em > self.ttl
+    
+    async def carregar(self):
+        async with self._lock:
+            if not self._expirado():
+                return
+            
+            # Uma invalidação durante a leitura (escrita concorrente) descarta o resultado, que pode
+            # ser anterior à escrita: sem isso a lista velha ficaria em cache sob o ETag novo
+            for _ in range(CACHE_REFERENCIAS_TENTATIVAS):
+                geracao = self.geracao
+                documentos = {}
+                async for documento in self.obter_colecao().find():
+                    documento["id"] = str(documento.pop("_id"))
+                    documentos[documento["id"]] = documento
+                
+                self.documentos = documentos
+                self.recargas += 1
+                if geracao == self.geracao:
+                    self.carregado_em = time.monotonic()
+                    return
+    
+    async def listar(self) -> List[dict]:
+        if self._expirado():
+            await self.carregar()
+        else:
+            self.hits += 1
+        return sorted(self.documentos.values(), key=lambda documento: documento["nome"])
+    
+    async def obter(self, documento_id: str) -> Optional[dict]:
+        if self._expirado():
+            await self.carregar()
+        
+        documento = self.documentos.get(documento_id)
+        if documento is not None:
+            self.hits += 1
+            return documento
+        
+        # Pode ter sido criado por outra instância depois da última carga
+        self.misses += 1
+        documento = await self.obter_colecao().find_one({"_id": ObjectId(documento_id)})
+        if documento is not None:
+            documento["id"] = str(documento.pop("_id"))
+            self.documentos[documento["id"]] = documento
+        return documento
+    
+    def invalidar(self):
+        self.geracao += 1
+        self.carregado_em = None
+    
+    def estatisticas(self) -> dict:
+        return {
+            "documentos": len(self.documentos),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recargas": self.recargas,
+            "ttl_segundos": self.ttl
+        }
+
+cache_categorias = CacheReferencias(lambda: categorias_collection, CACHE_REFERENCIAS_TTL)
+cache_tipos_pagamento = CacheReferencias(lambda: tipos_pagamento_collection, CACHE_REFERENCIAS_TTL)
+CACHES_REFERENCIAS = {"categoria": cache_categorias, "tipo_pagamento": cache_tipos_pagamento}
+
+# 📡 Barramento de eventos em processo (uma fonte, N assinantes SSE)
+COLECOES_EVENTOS = {"gastos": "gasto", "categorias": "categoria", "tipos_pagamento": "tipo_pagamento"}
+COLECOES_POR_TIPO = {tipo: colecao for colecao, tipo in COLECOES_EVENTOS.items()}
+
+class BarramentoEventos:
+    """Fan-out de eventos para filas limitadas, uma por cliente conectado"""
+    
+    def __init__(self, tamanho_fila: int):
+        self.tamanho_fila = tamanho_fila
+        self.assinantes = set()
+    
+    def assinar(self) -> asyncio.Queue:
+        fila = asyncio.Queue(maxsize=self.tamanho_fila)
+        self.assinantes.add(fila)
+        return fila
+    
+    def cancelar(self, fila: asyncio.Queue):
+        self.assinantes.discard(fila)
+    
+    def publicar(self, evento: dict):
+        for fila in list(self.assinantes):
+            try:
+                fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Consumidor lento: descarta o backlog e pede que ele ressincronize pelo token
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait({"tipo": "resync"})
+
+barramento = BarramentoEventos(SSE_FILA_MAX)
+tarefas_segundo_plano = []
+
+# 🏷️ ETag / GET condicional: versão por coleção, sem consultar o banco na requisição
+class VersoesColecoes:
+    """Versão conhecida de cada coleção neste processo, derivada das versões de sincronização.
+    
+    A recarga periódica traz, por coleção, a maior versão gravada até a versão consolidada
+    (igual em todos os workers). As escritas locais entram na hora com a versão que reservaram;
+    como versões menores de outros workers podem terminar depois, o ETag leva as duas até a
+    consolidação alcançar a escrita local. Enquanto a recarga não roda, nenhum ETag é emitido.
+    """
+    
+    def __init__(self, colecoes):
+        self.versoes = dict.fromkeys(colecoes)
+        self.locais = dict.fromkeys(colecoes, 0)
+        self.consolidada = None
+    
+    def avancar(self, colecao: str, versao: int) -> bool:
+        # Nunca volta: uma recarga que não vê uma escrita em andamento não desfaz o avanço
+        atual = self.versoes.get(colecao)
+        if atual is None or versao > atual:
+            self.versoes[colecao] = versao
+            return True
+        return False
+    
+    def registrar(self, colecao: str, versao: int):
+        """Escrita local já gravada: muda o ETag antes de a consolidação chegar até ela"""
+        self.locais[colecao] = max(self.locais[colecao], versao)
+    
+    def versao(self, colecao: str) -> Optional[str]:
+        consolidada = self.versoes.get(colecao)
+        if consolidada is None:
+            return None
+        local = self.locais.get(colecao, 0)
+        return str(consolidada) if local <= consolidada else f"{consolidada}+{local}"
+    
+    def etag(self, colecoes: tuple, codificacao: Optional[str]) -> Optional[str]:
+        versoes = [self.versao(colecao) for colecao in colecoes]
+        if None in versoes:
+            return None
+        # Forte: cada codificação (identity/gzip/br) é uma representação com bytes próprios
+        sufixo = f"-{codificacao}" if codificacao else ""
+        return f'"{app.version}-{".".join(versoes)}{sufixo}"'
+
+versoes_colecoes = VersoesColecoes(COLECOES_EVENTOS)
+
+async def _ultima_versao(colecao, filtro: dict) -> int:
+    documento = await colecao.find_one(filtro, {"versao": 1}, sort=[("versao", -1)])
+    return documento["versao"] if documento else 0
+
+async def _recarregar_versoes():
+    """Consolida as versões e traz a versão de cada coleção até a consolidada (escritas de todos os workers)"""
+    consolidada = await _versao_consolidada()
+    versoes_colecoes.consolidada = consolidada
+    # Tombstones expirados não contam mais no máximo: o horizonte impede que a versão volte
+    horizonte = await _horizonte_remocoes()
+    colecoes = {
+        "gastos": gastos_collection,
+        "categorias": categorias_collection,
+        "tipos_pagamento": tipos_pagamento_collection
+    }
+    for nome, colecao in colecoes.items():
+        ate_consolidada = {"versao": {"$lte": consolidada}}
+        versao = max(
+            horizonte,
+            await _ultima_versao(colecao, ate_consolidada),
+            await _ultima_versao(remocoes_collection, {"colecao": nome, **ate_consolidada})
         )
+        cache = CACHES_REFERENCIAS.get(COLECOES_EVENTOS[nome])
+        if versoes_colecoes.avancar(nome, versao) and cache is not None:
+            # Escrita de outro worker: o ETag novo não pode ser servido com a cópia antiga do cache
+            cache.invalidar()
+
+async def _monitorar_versoes():
+    while True:
+        try:
+            await _recarregar_versoes()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Versões das coleções não recarregadas: {e}")
+        await asyncio.sleep(ETAG_RECARGA_SEGUNDOS)
+
+def _etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidatas = [candidata.strip() for candidata in if_none_match.split(",")]
+    # If-None-Match usa comparação fraca: W/"x" vale como "x"
+    return "*" in candidatas or etag in (candidata.removeprefix("W/") for candidata in candidatas)
+
+def condicional(*colecoes: str):
+    """Dependência de GET: 304 sem consultar o banco se o If-None-Match bate com a versão atual.
+    
+    Devolve os cabeçalhos de cache, já aplicados à resposta; rotas que retornam um
+    Response próprio precisam repassá-los em `headers=`.
+    """
+    def verificar(request: Request, response: Response) -> dict:
+        etag = versoes_colecoes.etag(colecoes, compressao.codificacao(request.headers.get("accept-encoding", "")))
+        if etag is None:
+            return {}
+        cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_corresponde(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=cabecalhos)
+        response.headers.update(cabecalhos)
+        return cabecalhos
+    return verificar
+
+def _json_default(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+def _json_bytes(dados) -> bytes:
+    """JSON em bytes com orjson quando disponível (datas e ObjectId inclusos)"""
+    if orjson is not None:
+        return orjson.dumps(dados, default=_json_default)
+    return json.dumps(dados, default=_json_default, separators=(",", ":")).encode()
+
+class RespostaRapida(Response):
+    """Resposta JSON serializada direto dos dicionários, sem validação Pydantic nem jsonable_encoder"""
+    media_type = "application/json"
+    
+    def render(self, content) -> bytes:
+        return _json_bytes(content)
+
+def _evento(tipo: str, acao: str, documento_id: str, versao: int, dados: Optional[dict] = None) -> dict:
+    if dados is not None:
+        dados = {chave: valor for chave, valor in dados.items() if chave != "_id"}
+        dados["id"] = documento_id
+    return {"tipo": tipo, "acao": acao, "id": documento_id, "versao": versao, "dados": dados}
+
+def _publicar_evento(tipo: str, acao: str, documento_id: str, versao: int, dados: Optional[dict] = None):
+    """Avança a versão da coleção (ETag) e publica a alteração no barramento quando as rotas são a fonte de eventos"""
+    versoes_colecoes.registrar(COLECOES_POR_TIPO[tipo], versao)
+    if FONTE_EVENTOS == "rotas":
+        evento = _evento(tipo, acao, documento_id, versao, dados)
+        evento["marca"] = versoes_colecoes.consolidada
+        barramento.publicar(evento)
+
+def _evento_de_mudanca(mudanca: dict) -> Optional[dict]:
+    """Converte um documento do change stream do MongoDB em evento do barramento"""
+    documento = mudanca.get("fullDocument")
+    colecao = mudanca["ns"]["coll"]
+    if documento and colecao == COLECAO_ALERTAS:
+        # Alertas de orçamento não são versionados: não entram na retomada por Last-Event-ID
+        return _evento("orcamento", "alerta", str(documento["_id"]), None, _formatar_alerta(documento))
+    if not documento or "versao" not in documento:
+        return None
+    
+    if colecao == "remocoes":
+        tipo = COLECOES_EVENTOS.get(documento["colecao"])
+        return _evento(tipo, "removido", documento["documento_id"], documento["versao"]) if tipo else None
+    
+    acao = "criado" if mudanca["operationType"] == "insert" else "atualizado"
+    documento_id = str(documento["_id"])
+    versao = documento["versao"]
+    if colecao == "gastos":
+        documento = _gasto_resposta(documento)
+    return _evento(COLECOES_EVENTOS[colecao], acao, documento_id, versao, documento)
+
+async def _escutar_change_stream():
+    """Uma única assinatura de change stream por processo, retomada pelo resume token"""
+    token_retomada = None
+    pipeline = [{
+        "$match": {
+            "ns.coll": {"$in": list(COLECOES_EVENTOS) + ["remocoes", COLECAO_ALERTAS]},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }
+    }]
+    
+    while True:
+        try:
+            async with database.watch(pipeline, full_document="updateLookup", resume_after=token_retomada) as stream:
+                print("📡 Change stream MongoDB ativo")
+                async for mudanca in stream:
+                    token_retomada = stream.resume_token
+                    evento = _evento_de_mudanca(mudanca)
+                    if evento:
+                        if evento["versao"] is not None:
+                            evento["marca"] = versoes_colecoes.consolidada
+                        # Escritas de outras instâncias também invalidam o cache local
+                        if evento["tipo"] in CACHES_REFERENCIAS:
+                            CACHES_REFERENCIAS[evento["tipo"]].invalidar()
+                        barramento.publicar(evento)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Change stream interrompido, tentando retomar: {e}")
+            await asyncio.sleep(5)
+
+async def _eventos_desde(versao: int) -> Optional[List[dict]]:
+    """Eventos posteriores à versão (retomada via Last-Event-ID); None se exceder o limite de replay
+    ou se as remoções posteriores a ela já tiverem expirado"""
+    if versao < await _horizonte_remocoes():
+        return None
+    consolidada = await _versao_consolidada()
+    colecoes = {
+        "gastos": gastos_collection,
+        "categorias": categorias_collection,
+        "tipos_pagamento": tipos_pagamento_collection
+    }
+    
+    eventos = []
+    for nome, colecao in colecoes.items():
+        cursor = colecao.find({"versao": {"$gt": versao}}).sort("versao", 1).limit(SSE_REPLAY_MAX + 1)
+        async for documento in cursor:
+            documento_id = str(documento["_id"])
+            versao_documento = documento["versao"]
+            if nome == "gastos":
+                documento = _gasto_resposta(documento)
+            eventos.append(_evento(COLECOES_EVENTOS[nome], "atualizado", documento_id, versao_documento, documento))
+    
+    cursor = remocoes_collection.find({"versao": {"$gt": versao}}).sort("versao", 1).limit(SSE_REPLAY_MAX + 1)
+    async for remocao in cursor:
+        tipo = COLECOES_EVENTOS.get(remocao["colecao"])
+        if tipo:
+            eventos.append(_evento(tipo, "removido", remocao["documento_id"], remocao["versao"]))
+    
+    if len(eventos) > SSE_REPLAY_MAX:
+        return None
+    
+    eventos.sort(key=lambda evento: evento["versao"])
+    for evento in eventos:
+        evento["marca"] = min(evento["versao"], consolidada)
+    return eventos
+
+def _formatar_sse(evento: dict) -> str:
+    # O id (Last-Event-ID na reconexão) é a última versão consolidada conhecida, não a versão
+    # do evento: uma escrita com versão menor ainda em andamento não pode ficar para trás
+    linhas = ""
+    if evento.get("marca") is not None:
+        linhas += f"id: {evento['marca']}\n"
+    return linhas + f"data: {json.dumps(evento, default=_json_default)}\n\n"
 
 # Modelos Pydantic
 class CategoriaBase(BaseModel):
@@ -105,6 +904,9 @@ class GastoCreate(BaseModel):
     tipo_pagamento_id: str
     data_gasto: date
 
+class OrcamentoUpdate(BaseModel):
+    limite: Optional[float] = None  # None remove o limite
+
 class Gasto(BaseModel):
     id: str
     descricao: str
@@ -114,77 +916,586 @@ class Gasto(BaseModel):
     tipo_pagamento: Optional[dict] = None
     criado_em: Optional[datetime] = None
 
-# 🚀 Eventos de inicialização com teste de conectividade aprimorado
-@app.on_event("startup")
-async def startup_db_client():
-    global client, database, categorias_collection, gastos_collection, tipos_pagamento_collection
+def _montar_gasto(gasto: GastoCreate, categoria: dict, tipo_pagamento: dict) -> dict:
+    """Documento de gasto a partir do payload e das referências já resolvidas"""
+    # 🎯 NoSQL: dados da categoria e tipo de pagamento embutidos no gasto
+    return {
+        "descricao": gasto.descricao,
+        "valor_centavos": para_centavos(gasto.valor),
+        "data_gasto": data_para_bson(gasto.data_gasto),
+        "categoria": {
+            "id": categoria["id"],
+            "nome": categoria["nome"],
+            "cor": categoria["cor"]
+        },
+        "tipo_pagamento": {
+            "id": tipo_pagamento["id"],
+            "nome": tipo_pagamento["nome"],
+            "icone": tipo_pagamento["icone"],
+            "cor": tipo_pagamento["cor"]
+        }
+    }
+
+# 🎯 Resumos mensais e orçamentos: mantidos com $inc pelas rotas de escrita
+def _formatar_alerta(alerta: dict) -> dict:
+    return {
+        "id": str(alerta["_id"]),
+        "ano": alerta["ano"],
+        "mes": alerta["mes"],
+        "categoria_id": alerta["categoria_id"],
+        "categoria_nome": alerta.get("categoria_nome"),
+        "limiar": alerta["limiar"],
+        "gasto": de_centavos(alerta["gasto_centavos"]),
+        "limite": de_centavos(alerta["limite_centavos"]),
+        "criado_em": alerta["criado_em"],
+    }
+
+async def _registrar_alertas(alertas: List[dict]):
+    """Grava os alertas de orçamento e publica no barramento (a escrita do gasto já está feita)"""
+    try:
+        for alerta in alertas:
+            categoria = cache_categorias.documentos.get(alerta["categoria_id"]) or {}
+            alerta["categoria_nome"] = categoria.get("nome")
+            alerta["criado_em"] = datetime.now()
+            print(f"🚨 Orçamento de {alerta['categoria_nome']} em {alerta['mes']:02d}/{alerta['ano']}: {alerta['limiar']}% do limite")
+        await alertas_orcamento_collection.insert_many(alertas)
+        if FONTE_EVENTOS == "rotas":
+            for alerta in alertas:
+                barramento.publicar(_evento("orcamento", "alerta", str(alerta["_id"]), None, _formatar_alerta(alerta)))
+    except Exception as e:
+        print(f"⚠️ Alertas de orçamento não registrados: {e}")
+
+async def _aplicar_agregados(alteracoes: list):
+    """Aplica (gasto, sinal) aos resumos mensais e aos totais dos orçamentos; alerta os limites cruzados"""
+    _, alertas = await asyncio.gather(
+        aplicar_resumos(resumos_collection, alteracoes),
+        aplicar_orcamentos(orcamentos_collection, alteracoes)
+    )
+    if alertas:
+        await _registrar_alertas(alertas)
+
+async def _inserir_gastos(documentos: List[dict]) -> List[Optional[dict]]:
+    """insert_many(ordered=False) com versões, resumos e evento; retorna o writeError de cada documento (None se inserido)"""
+    async with _reservar_versoes(len(documentos)) as versao_final:
+        for indice, documento in enumerate(documentos):
+            documento["versao"] = versao_final - len(documentos) + 1 + indice
+        
+        erros = [None] * len(documentos)
+        try:
+            await gastos_collection.insert_many(documentos, ordered=False)
+        except BulkWriteError as e:
+            for erro in e.details.get("writeErrors", []):
+                erros[erro["index"]] = erro
+        
+        inseridos = [documento for documento, erro in zip(documentos, erros) if erro is None]
+        for documento in inseridos:
+            indice_descricoes.registrar(documento["descricao"])
+        await _aplicar_agregados([(documento, 1) for documento in inseridos])
+        if inseridos:
+            # Um único evento por lote: os clientes buscam os detalhes pela sincronização incremental
+            _publicar_evento("gasto", "lote", None, versao_final)
     
-    if client is None:
-        print("❌ Cliente MongoDB não foi inicializado")
-        return
+    return erros
+
+class ColetorInsercoes:
+    """Agrupa inserções concorrentes de gastos e grava quando o lote enche ou a espera máxima vence.
     
-    try:
-        print("🔄 Testando conectividade com MongoDB Atlas...")
+    Cada chamador recebe o próprio resultado: o documento ganha `_id` e `versao`, ou a
+    exceção do seu writeError, como aconteceria com insert_one.
+    """
+    
+    def __init__(self, tamanho_maximo: int, espera_segundos: float):
+        self.tamanho_maximo = tamanho_maximo
+        self.espera_segundos = espera_segundos
+        self._pendentes = []
+        self._temporizador = None
+        self._gravacoes = set()
+    
+    async def inserir(self, documento: dict):
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes.append((documento, futuro))
         
-        # Teste de ping com timeout
-        await client.admin.command('ping')
-        print("✅ Ping MongoDB bem-sucedido!")
+        if len(self._pendentes) >= self.tamanho_maximo:
+            self.descarregar()
+        elif self._temporizador is None:
+            self._temporizador = asyncio.get_running_loop().call_later(self.espera_segundos, self.descarregar)
         
-        # Teste de listagem de databases
-        db_list = await client.list_database_names()
-        print(f"📚 Databases disponíveis: {db_list}")
+        await futuro
+    
+    def descarregar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if not self._pendentes:
+            return
         
-        # Teste de acesso ao database específico
-        stats = await database.command("dbstats")
-        print(f"📊 Database stats: {stats.get('dataSize', 0)} bytes")
+        lote, self._pendentes = self._pendentes, []
+        gravacao = asyncio.create_task(self._gravar(lote))
+        self._gravacoes.add(gravacao)
+        gravacao.add_done_callback(self._gravacoes.discard)
+    
+    async def _gravar(self, lote: list):
+        try:
+            erros = await _inserir_gastos([documento for documento, _ in lote])
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        
+        for (_, futuro), erro in zip(lote, erros):
+            if futuro.done():
+                continue
+            if erro is None:
+                futuro.set_result(None)
+            else:
+                futuro.set_exception(WriteError(erro.get("errmsg"), erro.get("code"), erro))
+    
+    async def fechar(self):
+        """Grava o que estiver pendente e aguarda as gravações em andamento"""
+        self.descarregar()
+        if self._gravacoes:
+            await asyncio.gather(*self._gravacoes, return_exceptions=True)
+
+coletor_insercoes = ColetorInsercoes(AGRUPAR_INSERCOES_MAX, AGRUPAR_INSERCOES_ESPERA_MS / 1000) if AGRUPAR_INSERCOES else None
+
+def _decodificar_linha_ndjson(linha: bytes):
+    try:
+        return json.loads(linha)
+    except ValueError as e:
+        # Linha inválida vira erro apenas daquela linha
+        return ValueError(f"JSON inválido: {e}")
+
+def _resolvedor_referencias():
+    """Resolve categoria/tipo de pagamento uma única vez por id distinto (escopo de uma requisição)"""
+    referencias = {}
+    
+    async def resolver(cache: CacheReferencias, documento_id: str) -> Optional[dict]:
+        chave = (id(cache), documento_id)
+        if chave not in referencias:
+            try:
+                referencias[chave] = await cache.obter(documento_id)
+            except InvalidId:
+                referencias[chave] = None
+        return referencias[chave]
+    
+    return resolver
+
+async def importar_extrato(
+    transacoes,
+    categoria_id: str,
+    tipo_pagamento_id: str,
+    regras: list,
+    somente_debitos: bool = True
+) -> dict:
+    """Grava transações de extrato em lotes limitados, ignorando as já importadas (hash_importacao)"""
+    resumo = {"lidas": 0, "inseridas": 0, "duplicadas": 0, "erros": 0, "mensagens_erro": []}
+    resolver = _resolvedor_referencias()
+    lote = []
+    
+    def registrar_erro(mensagem: str):
+        resumo["erros"] += 1
+        if len(resumo["mensagens_erro"]) < IMPORTACAO_MAX_MENSAGENS:
+            resumo["mensagens_erro"].append(mensagem)
+    
+    async def gravar_lote():
+        # Reimportação barata: descarta os hashes já gravados antes de reservar versões
+        hashes = [documento["hash_importacao"] for documento in lote]
+        existentes = set()
+        async for documento in gastos_collection.find({"hash_importacao": {"$in": hashes}}, {"hash_importacao": 1}):
+            existentes.add(documento["hash_importacao"])
+        
+        novos = [documento for documento in lote if documento["hash_importacao"] not in existentes]
+        resumo["duplicadas"] += len(lote) - len(novos)
+        lote.clear()
+        
+        if novos:
+            for erro in await _inserir_gastos(novos):
+                if erro is None:
+                    resumo["inseridas"] += 1
+                elif erro.get("code") == 11000:
+                    # Corrida com outra importação do mesmo extrato: o índice único garante a deduplicação
+                    resumo["duplicadas"] += 1
+                else:
+                    registrar_erro(erro.get("errmsg", "Erro de escrita"))
+    
+    itens = mapear_transacoes(transacoes, categoria_id, tipo_pagamento_id, compilar_regras(regras), somente_debitos)
+    while True:
+        # Leitura e parsing do arquivo (E/S bloqueante e CPU) fora do event loop, um lote por vez
+        parte = await run_in_threadpool(lambda: list(itertools.islice(itens, IMPORTACAO_TAMANHO_LOTE)))
+        if not parte:
+            break
         
-        # Criar índices para performance
-        if categorias_collection:
-            await categorias_collection.create_index("nome", unique=True)
-            print("✅ Índice de categorias criado")
+        for item in parte:
+            resumo["lidas"] += 1
+            if isinstance(item, ValueError):
+                registrar_erro(str(item))
+                continue
+            
+            hash_gasto = item.pop("hash_importacao")
+            try:
+                gasto = GastoCreate.model_validate(item)
+            except ValidationError as e:
+                registrar_erro(f"Transação inválida: {e.errors()[0]['msg']}")
+                continue
+            
+            categoria = await resolver(cache_categorias, gasto.categoria_id)
+            if not categoria:
+                registrar_erro(f"Categoria não encontrada: {gasto.categoria_id}")
+                continue
+            
+            tipo_pagamento = await resolver(cache_tipos_pagamento, gasto.tipo_pagamento_id)
+            if not tipo_pagamento:
+                registrar_erro(f"Tipo de pagamento não encontrado: {gasto.tipo_pagamento_id}")
+                continue
+            
+            documento = _montar_gasto(gasto, categoria, tipo_pagamento)
+            documento["criado_em"] = datetime.now()
+            documento["hash_importacao"] = hash_gasto
+            lote.append(documento)
+            
+            if len(lote) >= IMPORTACAO_TAMANHO_LOTE:
+                await gravar_lote()
+    
+    if lote:
+        await gravar_lote()
+    
+    return resumo
+
+async def _ler_itens_ndjson(request: Request):
+    """Itens de um corpo NDJSON, lidos linha a linha conforme o corpo chega"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *linhas, buffer = buffer.split(b"\n")
+        for linha in linhas:
+            if linha.strip():
+                yield _decodificar_linha_ndjson(linha)
+    if buffer.strip():
+        yield _decodificar_linha_ndjson(buffer)
+
+async def _ler_itens_json_array(request: Request):
+    """Itens de um array JSON, decodificados um a um sem carregar o corpo inteiro"""
+    decodificador = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    aberto = False
+    
+    async for chunk in request.stream():
+        buffer += utf8.decode(chunk)
+        posicao = 0
+        while True:
+            while posicao < len(buffer) and buffer[posicao] in " \t\r\n,":
+                posicao += 1
+            if posicao >= len(buffer):
+                break
+            if not aberto:
+                if buffer[posicao] != "[":
+                    raise ValueError("O corpo deve ser um array JSON ou NDJSON")
+                aberto = True
+                posicao += 1
+                continue
+            if buffer[posicao] == "]":
+                return
+            try:
+                item, posicao = decodificador.raw_decode(buffer, posicao)
+            except json.JSONDecodeError:
+                # Item incompleto: aguardar o próximo pedaço do corpo
+                if len(buffer) - posicao > BULK_ITEM_MAX_BYTES:
+                    raise
+                break
+            yield item
+        buffer = buffer[posicao:]
+    
+    if buffer.strip():
+        raise ValueError("Array JSON incompleto")
+
+# 🔁 PROPAGAÇÃO DE REFERÊNCIAS ALTERADAS
+# Campos de categoria / tipo de pagamento copiados em cada gasto
+CAMPOS_EMBUTIDOS = {"categoria": ["nome", "cor"], "tipo_pagamento": ["nome", "icone", "cor"]}
+propagacao_pendente = asyncio.Event()
+
+def _dono_propagacao() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _colecao_referencia(tipo: str):
+    return categorias_collection if tipo == "categoria" else tipos_pagamento_collection
+
+async def _agendar_propagacao(tipo: str, referencia_id: str) -> str:
+    """Registra a propagação de uma referência alterada; o processamento é em segundo plano"""
+    agora = datetime.now()
+    # Propagações anteriores da mesma referência param no próximo lote: a nova recomeça do início
+    await propagacoes_collection.update_many(
+        {"tipo": tipo, "referencia_id": referencia_id, "estado": {"$in": ["pendente", "executando"]}},
+        {"$set": {"estado": "substituida", "atualizado_em": agora}}
+    )
+    resultado = await propagacoes_collection.insert_one({
+        "tipo": tipo,
+        "referencia_id": referencia_id,
+        "estado": "pendente",
+        "ultimo_id": None,
+        "atualizados": 0,
+        "tentativas": 0,
+        "criado_em": agora,
+        "atualizado_em": agora
+    })
+    propagacao_pendente.set()
+    return str(resultado.inserted_id)
+
+async def _reivindicar_propagacao() -> Optional[dict]:
+    """Assume a propagação pendente mais antiga (ou uma cujo lease expirou, de um worker que caiu)"""
+    agora = datetime.now()
+    return await propagacoes_collection.find_one_and_update(
+        {
+            "$or": [
+                {"estado": "pendente"},
+                {"estado": "executando", "lease_ate": {"$lt": agora}}
+            ],
+            "tentativas": {"$lt": PROPAGACAO_MAX_TENTATIVAS}
+        },
+        {
+            "$set": {
+                "estado": "executando",
+                "dono": _dono_propagacao(),
+                "lease_ate": agora + timedelta(seconds=PROPAGACAO_LEASE_SEGUNDOS),
+                "atualizado_em": agora
+            },
+            "$inc": {"tentativas": 1}
+        },
+        sort=[("criado_em", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _executar_propagacao(propagacao: dict):
+    """Reescreve as cópias embutidas em lotes por _id, renovando o lease e gravando o progresso a cada lote"""
+    tipo = propagacao["tipo"]
+    referencia_id = propagacao["referencia_id"]
+    controle = {"_id": propagacao["_id"], "dono": _dono_propagacao(), "estado": "executando"}
+    ultimo_id = propagacao.get("ultimo_id")
+    
+    while True:
+        # Valores lidos da origem a cada lote: uma propagação atrasada nunca regrava nomes antigos
+        referencia = await _colecao_referencia(tipo).find_one({"_id": ObjectId(referencia_id)})
+        if referencia is None:
+            await propagacoes_collection.update_one(controle, {"$set": {"estado": "cancelada", "concluido_em": datetime.now()}})
+            return
+        valores = {campo: referencia.get(campo) for campo in CAMPOS_EMBUTIDOS[tipo]}
         
-        if tipos_pagamento_collection:
-            await tipos_pagamento_collection.create_index("nome", unique=True)
-            print("✅ Índice de tipos de pagamento criado")
+        filtro = {
+            f"{tipo}.id": referencia_id,
+            "$or": [{f"{tipo}.{campo}": {"$ne": valor}} for campo, valor in valores.items()]
+        }
+        if ultimo_id is not None:
+            filtro["_id"] = {"$gt": ultimo_id}
+        ids = [gasto["_id"] async for gasto in gastos_collection.find(filtro, {"_id": 1}).sort("_id", 1).limit(PROPAGACAO_TAMANHO_LOTE)]
+        if not ids:
+            break
         
-        if gastos_collection:
-            await gastos_collection.create_index("data_gasto")
-            await gastos_collection.create_index("categoria.nome")
-            await gastos_collection.create_index("tipo_pagamento.nome")
-            print("✅ Índices de gastos criados")
+        # Versão própria por gasto para que a sincronização incremental entregue cada alteração
+        async with _reservar_versoes(len(ids)) as versao_final:
+            operacoes = [
+                UpdateOne(
+                    {"_id": gasto_id, f"{tipo}.id": referencia_id},
+                    {"$set": {
+                        **{f"{tipo}.{campo}": valor for campo, valor in valores.items()},
+                        "versao": versao_final - len(ids) + 1 + indice
+                    }}
+                )
+                for indice, gasto_id in enumerate(ids)
+            ]
+            resultado = await gastos_collection.bulk_write(operacoes, ordered=False)
+            if tipo == "categoria":
+                # Os relatórios compartilham a versão dos gastos: o nome muda junto com o lote que a avança
+                await resumos_collection.update_many(
+                    {"categoria_id": referencia_id},
+                    {"$set": {"categoria_nome": valores["nome"], "categoria_cor": valores["cor"]}}
+                )
+            ultimo_id = ids[-1]
+            _publicar_evento("gasto", "lote", None, versao_final)
         
-        print("🎉 MongoDB Atlas conectado com sucesso!")
+        agora = datetime.now()
+        progresso = await propagacoes_collection.find_one_and_update(
+            controle,
+            {
+                "$set": {
+                    "ultimo_id": ultimo_id,
+                    "lease_ate": agora + timedelta(seconds=PROPAGACAO_LEASE_SEGUNDOS),
+                    "atualizado_em": agora
+                },
+                "$inc": {"atualizados": resultado.modified_count}
+            }
+        )
+        if progresso is None:
+            print(f"⏹️ Propagação {propagacao['_id']} interrompida (substituída ou lease perdido)")
+            return
+        await asyncio.sleep(PROPAGACAO_PAUSA_SEGUNDOS)
+    
+    concluida = await propagacoes_collection.find_one_and_update(
+        controle,
+        {"$set": {"estado": "concluida", "concluido_em": datetime.now(), "lease_ate": None}},
+        return_document=ReturnDocument.AFTER
+    )
+    if concluida:
+        print(f"✅ Propagação de {tipo} {referencia_id} concluída: {concluida['atualizados']} gasto(s)")
+
+async def _processar_propagacoes():
+    """Laço de segundo plano: acordado por novas propagações locais e, periodicamente, para retomar as de outros workers"""
+    while True:
+        propagacao_pendente.clear()
+        propagacao = None
+        try:
+            propagacao = await _reivindicar_propagacao()
+            if propagacao:
+                await _executar_propagacao(propagacao)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Erro na propagação: {e}")
+            if propagacao:
+                # Volta para a fila até o limite de tentativas; o progresso (ultimo_id) é mantido
+                estado = "falhou" if propagacao["tentativas"] >= PROPAGACAO_MAX_TENTATIVAS else "pendente"
+                await propagacoes_collection.update_one(
+                    {"_id": propagacao["_id"], "estado": "executando"},
+                    {"$set": {"estado": estado, "erro": str(e), "lease_ate": None}}
+                )
         
+        try:
+            await asyncio.wait_for(propagacao_pendente.wait(), PROPAGACAO_VERIFICACAO_SEGUNDOS)
+        except asyncio.TimeoutError:
+            pass
+
+def _formatar_propagacao(propagacao: dict) -> dict:
+    propagacao["id"] = str(propagacao.pop("_id"))
+    if propagacao.get("ultimo_id") is not None:
+        propagacao["ultimo_id"] = str(propagacao["ultimo_id"])
+    return propagacao
+
+# 🔎 AUTOCOMPLETAR DE DESCRIÇÕES
+indice_descricoes = IndiceDescricoes(AUTOCOMPLETAR_MAX)
+
+async def _carregar_descricoes():
+    """Descrições mais frequentes entre os gastos mais recentes"""
+    pipeline = [
+        {"$sort": {"_id": -1}},
+        {"$limit": AUTOCOMPLETAR_AMOSTRA},
+        {"$group": {"_id": "$descricao", "quantidade": {"$sum": 1}, "ultimo": {"$max": "$_id"}}},
+        {"$sort": {"quantidade": -1}},
+        {"$limit": AUTOCOMPLETAR_MAX}
+    ]
+    descricoes = await gastos_collection.aggregate(pipeline).to_list(None)
+    indice_descricoes.carregar(
+        (item["_id"], item["quantidade"], item["ultimo"].generation_time.timestamp())
+        for item in descricoes if isinstance(item["_id"], str)
+    )
+
+async def _manter_indice_descricoes():
+    while True:
+        try:
+            await _carregar_descricoes()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Índice de autocompletar não carregado: {e}")
+        await asyncio.sleep(AUTOCOMPLETAR_RECARGA_SEGUNDOS)
+
+# 📊 SNAPSHOT ANALÍTICO
+snapshot_gastos = SnapshotGastos()
+_lock_snapshot = asyncio.Lock()
+
+async def _snapshot_analitico() -> SnapshotGastos:
+    """Snapshot atualizado: só busca o delta quando a versão da coleção de gastos avançou"""
+    async with _lock_snapshot:
+        # Lida antes da atualização: uma escrita durante a busca dispara outro delta na próxima consulta
+        versao = versoes_colecoes.versao("gastos")
+        carregado_em = snapshot_gastos.carregado_em
+        if carregado_em is None or time.monotonic() - carregado_em > ANALITICO_RECARGA_COMPLETA_SEGUNDOS:
+            await snapshot_gastos.recarregar(gastos_collection, await _versao_consolidada())
+        elif versao is None or versao != snapshot_gastos.versao_colecao:
+            consolidada = await _versao_consolidada()
+            if not await snapshot_gastos.aplicar_delta(gastos_collection, remocoes_collection, consolidada):
+                await snapshot_gastos.recarregar(gastos_collection, consolidada)
+        snapshot_gastos.versao_colecao = versao
+    return snapshot_gastos
+
+async def _nomes_referencia(dimensao: str) -> dict:
+    if dimensao not in CACHES_REFERENCIAS:
+        return {}
+    return {documento["id"]: documento["nome"] for documento in await CACHES_REFERENCIAS[dimensao].listar()}
+
+async def _rotulos(dimensao: str, chaves: list) -> List[dict]:
+    """Chaves de uma dimensão com o nome atual (categorias e tipos removidos ficam com nome None)"""
+    nomes = await _nomes_referencia(dimensao)
+    if not nomes:
+        return [{"chave": chave, "nome": chave} for chave in chaves]
+    return [{"chave": chave, "nome": nomes.get(chave)} for chave in chaves]
+
+# 🚀 Inicialização enxuta: nenhum round trip ao database bloqueia o primeiro request.
+# Ping, cache e change stream rodam em segundo plano; índices são criados por `python indices.py`
+async def _aquecer_caches():
+    try:
+        await cache_categorias.carregar()
+        await cache_tipos_pagamento.carregar()
+        print("✅ Cache de categorias e tipos de pagamento carregado")
     except Exception as e:
-        print(f"❌ Erro detalhado ao conectar MongoDB: {type(e).__name__}: {e}")
-        print("🔧 Tentativas de resolução:")
-        print("   1. Verificar se IP está na whitelist do MongoDB Atlas")
-        print("   2. Verificar se credenciais estão corretas")
-        print("   3. Verificar se cluster está ativo")
-        print("   4. Verificar conectividade de rede")
-        
-        # Não falhar a aplicação, apenas logar o erro
-        print("⚠️ Aplicação iniciará em modo degradado")
+        print(f"⚠️ Cache de referências não carregado (será carregado sob demanda): {e}")
+
+@app.exception_handler(HTTPException)
+async def tratar_http_exception(request: Request, exc: HTTPException):
+    """O 500 das rotas causado por MongoDB indisponível/lento vira 503 com Retry-After"""
+    causa = exc.__context__
+    if exc.status_code == 500 and causa is not None and protecao.indisponibilidade(causa):
+        protecao.disjuntor.registrar_excecao(causa)
+        segundos = max(1, round(protecao.disjuntor.segundos_aberto))
+        exc = HTTPException(status_code=503, detail=exc.detail, headers={"Retry-After": str(segundos)})
+    return await http_exception_handler(request, exc)
+
+@app.on_event("startup")
+async def startup_db_client():
+    global FONTE_EVENTOS
+    conectar_banco()
+    await _verificar_mongodb()
+    
+    if _banco_local():
+        # Mesmos índices do MongoDB (únicos, parciais, texto); em memória é instantâneo
+        await sincronizar(database)
+        if ARMAZENAMENTO_LOCAL_DIR:
+            tarefas_segundo_plano.append(asyncio.create_task(_salvar_banco_local()))
+        if FONTE_EVENTOS == "change_stream":
+            print("⚠️ Banco local não tem change stream: eventos publicados pelas rotas")
+            FONTE_EVENTOS = "rotas"
+    
+    tarefas_segundo_plano.append(asyncio.create_task(_monitorar_banco()))
+    tarefas_segundo_plano.append(asyncio.create_task(_aquecer_caches()))
+    tarefas_segundo_plano.append(asyncio.create_task(_monitorar_versoes()))
+    tarefas_segundo_plano.append(asyncio.create_task(_monitorar_remocoes()))
+    tarefas_segundo_plano.append(asyncio.create_task(_manter_indice_descricoes()))
+    # Retoma propagações interrompidas (deploy/queda) e processa as novas
+    tarefas_segundo_plano.append(asyncio.create_task(_processar_propagacoes()))
+    
+    if FONTE_EVENTOS == "change_stream":
+        tarefas_segundo_plano.append(asyncio.create_task(_escutar_change_stream()))
+    
+    estado_inicializacao["startup_ms"] = round((time.perf_counter() - INICIO_PROCESSO) * 1000, 2)
+    print(f"⏱️ Worker {os.getpid()} pronto em {estado_inicializacao['startup_ms']} ms")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for tarefa in tarefas_segundo_plano:
+        tarefa.cancel()
+    
+    if coletor_insercoes is not None:
+        await coletor_insercoes.fechar()
+    
     if client is not None:
         client.close()
         print("📝 Conexão MongoDB fechada")
 
 # 🏷️ ROTAS PARA CATEGORIAS
-@app.get("/categorias", response_model=List[Categoria])
+@app.get("/categorias", response_model=List[Categoria], dependencies=[Depends(condicional("categorias"))])
 async def listar_categorias():
     try:
-        categorias = []
-        cursor = categorias_collection.find().sort("nome", 1)
-        
-        async for categoria in cursor:
-            categoria["id"] = str(categoria["_id"])
-            del categoria["_id"]
-            categorias.append(categoria)
-        
-        return categorias
+        return await cache_categorias.listar()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar categorias: {e}")
 
@@ -203,8 +1514,12 @@ async def criar_categoria(categoria: CategoriaCreate):
             "criado_em": datetime.now()
         }
         
-        result = await categorias_collection.insert_one(categoria_data)
-        categoria_data["id"] = str(result.inserted_id)
+        async with _reservar_versoes() as versao:
+            categoria_data["versao"] = versao
+            result = await categorias_collection.insert_one(categoria_data)
+            categoria_data["id"] = str(result.inserted_id)
+            cache_categorias.invalidar()
+            _publicar_evento("categoria", "criado", categoria_data["id"], versao, categoria_data)
         
         return categoria_data
     except HTTPException:
@@ -212,6 +1527,40 @@ async def criar_categoria(categoria: CategoriaCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar categoria: {e}")
 
+@app.put("/categorias/{categoria_id}", response_model=Categoria)
+async def atualizar_categoria(categoria_id: str, categoria: CategoriaCreate, response: Response):
+    """Atualiza a categoria; os gastos recebem o novo nome/cor por uma propagação em segundo plano"""
+    try:
+        existing = await categorias_collection.find_one({"nome": categoria.nome, "_id": {"$ne": ObjectId(categoria_id)}})
+        if existing:
+            raise HTTPException(status_code=400, detail="Categoria já existe")
+        
+        async with _reservar_versoes() as versao:
+            categoria_data = await categorias_collection.find_one_and_update(
+                {"_id": ObjectId(categoria_id)},
+                {"$set": {
+                    "nome": categoria.nome,
+                    "cor": categoria.cor,
+                    "atualizado_em": datetime.now(),
+                    "versao": versao
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if categoria_data is None:
+                raise HTTPException(status_code=404, detail="Categoria não encontrada")
+            
+            categoria_data["id"] = str(categoria_data.pop("_id"))
+            cache_categorias.invalidar()
+            _publicar_evento("categoria", "atualizado", categoria_id, versao, categoria_data)
+        response.headers["X-Propagacao-Id"] = await _agendar_propagacao("categoria", categoria_id)
+        
+        return categoria_data
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar categoria: {e}")
+
 @app.delete("/categorias/{categoria_id}")
 async def deletar_categoria(categoria_id: str):
     try:
@@ -223,10 +1572,15 @@ async def deletar_categoria(categoria_id: str):
                 detail=f"Não é possível deletar categoria com {gastos_count} gasto(s) associado(s)"
             )
         
-        result = await categorias_collection.delete_one({"_id": ObjectId(categoria_id)})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Categoria não encontrada")
+        async with _reservar_versoes() as versao:
+            result = await categorias_collection.delete_one({"_id": ObjectId(categoria_id)})
+            
+            if result.deleted_count == 0:
+                raise HTTPException(status_code=404, detail="Categoria não encontrada")
+            
+            await _registrar_remocao("categorias", categoria_id, versao)
+            cache_categorias.invalidar()
+            _publicar_evento("categoria", "removido", categoria_id, versao)
         
         return {"deleted": result.deleted_count}
     except HTTPException:
@@ -235,18 +1589,10 @@ async def deletar_categoria(categoria_id: str):
         raise HTTPException(status_code=500, detail=f"Erro ao deletar categoria: {e}")
 
 # 💳 ROTAS PARA TIPOS DE PAGAMENTO
-@app.get("/tipos-pagamento", response_model=List[TipoPagamento])
+@app.get("/tipos-pagamento", response_model=List[TipoPagamento], dependencies=[Depends(condicional("tipos_pagamento"))])
 async def listar_tipos_pagamento():
     try:
-        tipos = []
-        cursor = tipos_pagamento_collection.find().sort("nome", 1)
-        
-        async for tipo in cursor:
-            tipo["id"] = str(tipo["_id"])
-            del tipo["_id"]
-            tipos.append(tipo)
-        
-        return tipos
+        return await cache_tipos_pagamento.listar()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar tipos de pagamento: {e}")
 
@@ -266,8 +1612,12 @@ async def criar_tipo_pagamento(tipo: TipoPagamentoCreate):
             "criado_em": datetime.now()
         }
         
-        result = await tipos_pagamento_collection.insert_one(tipo_data)
-        tipo_data["id"] = str(result.inserted_id)
+        async with _reservar_versoes() as versao:
+            tipo_data["versao"] = versao
+            result = await tipos_pagamento_collection.insert_one(tipo_data)
+            tipo_data["id"] = str(result.inserted_id)
+            cache_tipos_pagamento.invalidar()
+            _publicar_evento("tipo_pagamento", "criado", tipo_data["id"], versao, tipo_data)
         
         return tipo_data
     except HTTPException:
@@ -275,6 +1625,41 @@ async def criar_tipo_pagamento(tipo: TipoPagamentoCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar tipo de pagamento: {e}")
 
+@app.put("/tipos-pagamento/{tipo_id}", response_model=TipoPagamento)
+async def atualizar_tipo_pagamento(tipo_id: str, tipo: TipoPagamentoCreate, response: Response):
+    """Atualiza o tipo de pagamento; os gastos recebem as alterações por uma propagação em segundo plano"""
+    try:
+        existing = await tipos_pagamento_collection.find_one({"nome": tipo.nome, "_id": {"$ne": ObjectId(tipo_id)}})
+        if existing:
+            raise HTTPException(status_code=400, detail="Tipo de pagamento já existe")
+        
+        async with _reservar_versoes() as versao:
+            tipo_data = await tipos_pagamento_collection.find_one_and_update(
+                {"_id": ObjectId(tipo_id)},
+                {"$set": {
+                    "nome": tipo.nome,
+                    "icone": tipo.icone,
+                    "cor": tipo.cor,
+                    "atualizado_em": datetime.now(),
+                    "versao": versao
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if tipo_data is None:
+                raise HTTPException(status_code=404, detail="Tipo de pagamento não encontrado")
+            
+            tipo_data["id"] = str(tipo_data.pop("_id"))
+            cache_tipos_pagamento.invalidar()
+            _publicar_evento("tipo_pagamento", "atualizado", tipo_id, versao, tipo_data)
+        response.headers["X-Propagacao-Id"] = await _agendar_propagacao("tipo_pagamento", tipo_id)
+        
+        return tipo_data
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar tipo de pagamento: {e}")
+
 @app.delete("/tipos-pagamento/{tipo_id}")
 async def deletar_tipo_pagamento(tipo_id: str):
     try:
@@ -286,10 +1671,15 @@ async def deletar_tipo_pagamento(tipo_id: str):
                 detail=f"Não é possível deletar tipo com {gastos_count} gasto(s) associado(s)"
             )
         
-        result = await tipos_pagamento_collection.delete_one({"_id": ObjectId(tipo_id)})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Tipo de pagamento não encontrado")
+        async with _reservar_versoes() as versao:
+            result = await tipos_pagamento_collection.delete_one({"_id": ObjectId(tipo_id)})
+            
+            if result.deleted_count == 0:
+                raise HTTPException(status_code=404, detail="Tipo de pagamento não encontrado")
+            
+            await _registrar_remocao("tipos_pagamento", tipo_id, versao)
+            cache_tipos_pagamento.invalidar()
+            _publicar_evento("tipo_pagamento", "removido", tipo_id, versao)
         
         return {"deleted": result.deleted_count}
     except HTTPException:
@@ -297,71 +1687,281 @@ async def deletar_tipo_pagamento(tipo_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar tipo de pagamento: {e}")
 
+# 🔁 ACOMPANHAMENTO DAS PROPAGAÇÕES
+@app.get("/propagacoes")
+async def listar_propagacoes(limit: int = Query(50, ge=1, le=500)):
+    try:
+        propagacoes = await propagacoes_collection.find().sort("criado_em", -1).limit(limit).to_list(None)
+        return [_formatar_propagacao(propagacao) for propagacao in propagacoes]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao listar propagações: {e}")
+
+@app.get("/propagacoes/{propagacao_id}")
+async def obter_propagacao(propagacao_id: str):
+    try:
+        propagacao = await propagacoes_collection.find_one({"_id": ObjectId(propagacao_id)})
+        if propagacao is None:
+            raise HTTPException(status_code=404, detail="Propagação não encontrada")
+        return _formatar_propagacao(propagacao)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter propagação: {e}")
+
 # 💰 ROTAS PARA GASTOS
 @app.get("/gastos", response_model=List[Gasto])
-async def listar_gastos(mes: Optional[int] = None, ano: Optional[int] = None):
+async def listar_gastos(
+    mes: Optional[int] = Query(None, ge=1, le=12),
+    ano: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    cache: dict = Depends(condicional("gastos"))
+):
     try:
         # Construir filtro de data (se especificado)
         filter_query = {}
         if mes and ano:
-            # Filtrar por string de data (formato YYYY-MM)
-            start_date = f"{ano}-{mes:02d}-01"
-            if mes == 12:
-                end_date = f"{ano + 1}-01-01"
-            else:
-                end_date = f"{ano}-{mes + 1:02d}-01"
-            
-            filter_query["data_gasto"] = {
-                "$gte": start_date,
-                "$lt": end_date
-            }
+            filter_query = _filtro_mes(ano, mes)
+        
+        # Paginação keyset (opt-in): continua a partir do cursor usando o índice (data_gasto, _id)
+        if after:
+            filter_query = {"$and": [filter_query, _filtro_cursor(after)]} if filter_query else _filtro_cursor(after)
+            if limit is None:
+                limit = TAMANHO_PAGINA_PADRAO
         
         gastos = []
-        cursor = gastos_collection.find(filter_query).sort("data_gasto", -1)
+        cursor = gastos_collection.find(filter_query, _projecao_gasto(fields)).sort(GASTOS_ORDENACAO)
+        if limit:
+            # Buscar um item extra para saber se existe próxima página
+            cursor = cursor.limit(limit + 1)
         
         async for gasto in cursor:
-            gasto["id"] = str(gasto["_id"])
-            del gasto["_id"]
             gastos.append(gasto)
         
-        return gastos
+        headers = dict(cache)
+        if limit and len(gastos) > limit:
+            gastos = gastos[:limit]
+            headers["X-Next-Cursor"] = _codificar_cursor(gastos[-1])
+        
+        # O response_model fica só na documentação: a lista já sai no formato de Gasto
+        return RespostaRapida([_gasto_resposta(gasto) for gasto in gastos], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar gastos: {e}")
 
+@app.get("/gastos/search", response_model=List[Gasto])
+async def buscar_gastos(
+    q: str = Query(..., min_length=1),
+    de: Optional[date] = Query(None, alias="from"),
+    ate: Optional[date] = Query(None, alias="to"),
+    categoria_id: Optional[str] = None,
+    tipo_pagamento_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Busca textual na descrição (índice de texto), ordenada por relevância"""
+    try:
+        filtro = {"$text": {"$search": q}}
+        filtro.update(_filtro_datas(de, ate + timedelta(days=1) if ate else None))
+        if categoria_id:
+            filtro["categoria.id"] = categoria_id
+        if tipo_pagamento_id:
+            filtro["tipo_pagamento.id"] = tipo_pagamento_id
+        
+        cursor = gastos_collection.find(filtro, {"score": {"$meta": "textScore"}}).sort(
+            [("score", {"$meta": "textScore"}), ("data_gasto", -1)]
+        ).limit(limit)
+        
+        return RespostaRapida([_gasto_resposta(gasto) async for gasto in cursor])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar gastos: {e}")
+
+@app.get("/gastos/autocomplete")
+async def autocompletar_descricao(q: str = "", limit: int = Query(10, ge=1, le=50)):
+    """Sugestões de descrição por prefixo (sem acesso ao banco)"""
+    return indice_descricoes.sugerir(q, limit)
+
+async def _pagina_snapshot(token: int, after: Optional[str], limit: int) -> RespostaRapida:
+    """Uma página do snapshot, na ordenação de GET /gastos. O que mudar durante a leitura das
+    páginas passa do token e reaparece no delta seguinte (a mesclagem é idempotente)"""
+    filtro = _filtro_cursor(after) if after else {}
+    documentos = await gastos_collection.find(filtro).sort(GASTOS_ORDENACAO).limit(limit + 1).to_list(None)
+    mais = len(documentos) > limit
+    documentos = documentos[:limit]
+    return RespostaRapida({
+        "gastos": [_gasto_resposta(gasto) for gasto in documentos],
+        "removidos": [],
+        "token": str(token),
+        "mais": mais,
+        "proximo": _codificar_cursor(documentos[-1], t=token) if mais else None,
+        "completo": True
+    })
+
+@app.get("/gastos/changes")
+async def alteracoes_gastos(
+    since: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=5000)
+):
+    """Sincronização incremental: gastos criados/alterados e removidos depois do token.
+    
+    Sem token (ou com um token anterior às remoções já expiradas) a resposta é um snapshot
+    (`completo`), paginado por (data_gasto, _id): as páginas seguintes vêm com `after=proximo`
+    e trazem o mesmo token, o da primeira página.
+    """
+    try:
+        if after is not None:
+            cursor = _decodificar_cursor(after)
+            if not isinstance(cursor.get("t"), int):
+                raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+            return await _pagina_snapshot(cursor["t"], after, limit)
+        
+        # Versão consolidada lida antes das consultas: tudo até ela já está gravado, então o token
+        # nunca passa de uma escrita que reservou a versão e ainda não terminou
+        consolidada = await _versao_consolidada()
+        
+        if since is None:
+            return await _pagina_snapshot(consolidada, None, limit)
+        
+        versao_inicial = _ler_token_sincronizacao(since)
+        if versao_inicial < await _horizonte_remocoes():
+            # Remoções posteriores ao token já foram apagadas: o cliente recomeça do snapshot
+            return await _pagina_snapshot(consolidada, None, limit)
+        faixa = {"$gt": versao_inicial, "$lte": consolidada}
+        
+        alterados = await gastos_collection.find(
+            {"versao": faixa}
+        ).sort("versao", 1).limit(limit).to_list(None)
+        removidos = await remocoes_collection.find(
+            {"colecao": "gastos", "versao": faixa}
+        ).sort("versao", 1).limit(limit).to_list(None)
+        
+        # Intercalar por versão e cortar no limite; com mais páginas o token aponta para a
+        # última alteração entregue, senão para a versão consolidada
+        eventos = sorted(
+            [(gasto["versao"], "gasto", gasto) for gasto in alterados] +
+            [(remocao["versao"], "remocao", remocao) for remocao in removidos],
+            key=lambda evento: evento[0]
+        )
+        mais = len(eventos) > limit or len(alterados) == limit or len(removidos) == limit
+        eventos = eventos[:limit]
+        
+        gastos = []
+        ids_removidos = []
+        for _, tipo, documento in eventos:
+            if tipo == "gasto":
+                gastos.append(_gasto_resposta(documento))
+            else:
+                ids_removidos.append(documento["documento_id"])
+        
+        token = eventos[-1][0] if mais else max(consolidada, versao_inicial)
+        
+        return RespostaRapida({"gastos": gastos, "removidos": ids_removidos, "token": str(token), "mais": mais, "completo": False})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao sincronizar gastos: {e}")
+
+@app.get("/gastos/export")
+async def exportar_gastos(
+    formato: Literal["csv", "ndjson"] = Query("ndjson", alias="format"),
+    de: Optional[date] = Query(None, alias="from"),
+    ate: Optional[date] = Query(None, alias="to"),
+    gzip: bool = False
+):
+    """Exportação em fluxo direto do cursor (sem validação Pydantic por linha)"""
+    try:
+        filtro = _filtro_datas(de, ate + timedelta(days=1) if ate else None)
+        
+        projecao = {
+            "descricao": 1, "valor": 1, "valor_centavos": 1, "data_gasto": 1,
+            "categoria": 1, "tipo_pagamento": 1, "criado_em": 1
+        }
+        cursor = gastos_collection.find(filtro, projecao).sort([("data_gasto", 1), ("_id", 1)]).batch_size(EXPORTACAO_LOTE)
+        
+        def linhas_csv(lote: List[dict]) -> bytes:
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            for gasto in lote:
+                escritor.writerow([
+                    str(gasto["_id"]),
+                    data_iso(gasto.get("data_gasto")),
+                    gasto.get("descricao"),
+                    f"{centavos_do_gasto(gasto) / 100:.2f}",
+                    (gasto.get("categoria") or {}).get("nome"),
+                    (gasto.get("tipo_pagamento") or {}).get("nome")
+                ])
+            return buffer.getvalue().encode()
+        
+        def linhas_ndjson(lote: List[dict]) -> bytes:
+            return b"".join(_json_bytes(_gasto_resposta(gasto)) + b"\n" for gasto in lote)
+        
+        codificar = linhas_csv if formato == "csv" else linhas_ndjson
+        
+        async def gerar():
+            compressor = zlib.compressobj(wbits=31) if gzip else None
+            
+            def saida(dados: bytes) -> bytes:
+                return compressor.compress(dados) if compressor else dados
+            
+            if formato == "csv":
+                yield saida(b"id,data_gasto,descricao,valor,categoria,tipo_pagamento\r\n")
+            
+            lote = []
+            async for gasto in cursor:
+                lote.append(gasto)
+                if len(lote) == EXPORTACAO_LOTE:
+                    yield saida(codificar(lote))
+                    lote = []
+            if lote:
+                yield saida(codificar(lote))
+            if compressor:
+                yield compressor.flush()
+        
+        extensao = "csv" if formato == "csv" else "ndjson"
+        headers = {"Content-Disposition": f'attachment; filename="gastos.{extensao}"'}
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
+        
+        return StreamingResponse(
+            gerar(),
+            media_type="text/csv" if formato == "csv" else "application/x-ndjson",
+            headers=headers
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar gastos: {e}")
+
 @app.post("/gastos", response_model=Gasto)
 async def criar_gasto(gasto: GastoCreate):
     try:
         # Buscar dados da categoria (embutir no documento)
-        categoria = await categorias_collection.find_one({"_id": ObjectId(gasto.categoria_id)})
+        categoria = await cache_categorias.obter(gasto.categoria_id)
         if not categoria:
             raise HTTPException(status_code=404, detail="Categoria não encontrada")
         
         # Buscar dados do tipo de pagamento
-        tipo_pagamento = await tipos_pagamento_collection.find_one({"_id": ObjectId(gasto.tipo_pagamento_id)})
+        tipo_pagamento = await cache_tipos_pagamento.obter(gasto.tipo_pagamento_id)
         if not tipo_pagamento:
             raise HTTPException(status_code=404, detail="Tipo de pagamento não encontrado")
         
-        # 🎯 NoSQL: dados da categoria e tipo de pagamento embutidos no gasto
-        gasto_data = {
-            "descricao": gasto.descricao,
-            "valor": gasto.valor,
-            "data_gasto": gasto.data_gasto.isoformat(),  # Converter para string ISO
-            "categoria": {
-                "id": str(categoria["_id"]),
-                "nome": categoria["nome"],
-                "cor": categoria["cor"]
-            },
-            "tipo_pagamento": {
-                "id": str(tipo_pagamento["_id"]),
-                "nome": tipo_pagamento["nome"],
-                "icone": tipo_pagamento["icone"],
-                "cor": tipo_pagamento["cor"]
-            },
-            "criado_em": datetime.now()
-        }
+        gasto_data = _montar_gasto(gasto, categoria, tipo_pagamento)
+        gasto_data["criado_em"] = datetime.now()
         
-        result = await gastos_collection.insert_one(gasto_data)
-        gasto_data["id"] = str(result.inserted_id)
+        if coletor_insercoes is not None:
+            # Versão, resumos e evento (um "lote" por insert_many) ficam a cargo de _inserir_gastos
+            await coletor_insercoes.inserir(gasto_data)
+            return _gasto_resposta(gasto_data)
+        
+        async with _reservar_versoes() as versao:
+            gasto_data["versao"] = versao
+            await gastos_collection.insert_one(gasto_data)
+            await _aplicar_agregados([(gasto_data, 1)])
+            indice_descricoes.registrar(gasto_data["descricao"])
+            gasto_data = _gasto_resposta(gasto_data)
+            _publicar_evento("gasto", "criado", gasto_data["id"], versao, gasto_data)
         
         return gasto_data
     except HTTPException:
@@ -369,50 +1969,159 @@ async def criar_gasto(gasto: GastoCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar gasto: {e}")
 
+@app.post("/gastos/bulk")
+async def criar_gastos_lote(request: Request):
+    """Criação em massa a partir de um array JSON ou NDJSON, com resultado por linha"""
+    try:
+        tipo_conteudo = request.headers.get("content-type", "")
+        if "ndjson" in tipo_conteudo or "jsonl" in tipo_conteudo:
+            itens = _ler_itens_ndjson(request)
+        else:
+            itens = _ler_itens_json_array(request)
+        
+        # Referências resolvidas uma vez por id distinto nesta requisição
+        resolver = _resolvedor_referencias()
+        
+        resultados = []
+        pendentes = []
+        
+        async def gravar_pendentes():
+            erros = await _inserir_gastos([documento for _, documento in pendentes])
+            for (linha, documento), erro in zip(pendentes, erros):
+                if erro is None:
+                    resultados.append({"linha": linha, "id": str(documento["_id"])})
+                else:
+                    resultados.append({"linha": linha, "erro": erro.get("errmsg", "Erro de escrita")})
+            pendentes.clear()
+        
+        linha = 0
+        try:
+            async for item in itens:
+                linha += 1
+                if isinstance(item, ValueError):
+                    resultados.append({"linha": linha, "erro": str(item)})
+                    continue
+                
+                try:
+                    gasto = GastoCreate.model_validate(item)
+                except ValidationError as e:
+                    mensagens = [f"{'.'.join(str(parte) for parte in erro['loc'])}: {erro['msg']}" for erro in e.errors()]
+                    resultados.append({"linha": linha, "erro": "; ".join(mensagens)})
+                    continue
+                
+                categoria = await resolver(cache_categorias, gasto.categoria_id)
+                if not categoria:
+                    resultados.append({"linha": linha, "erro": "Categoria não encontrada"})
+                    continue
+                
+                tipo_pagamento = await resolver(cache_tipos_pagamento, gasto.tipo_pagamento_id)
+                if not tipo_pagamento:
+                    resultados.append({"linha": linha, "erro": "Tipo de pagamento não encontrado"})
+                    continue
+                
+                documento = _montar_gasto(gasto, categoria, tipo_pagamento)
+                documento["criado_em"] = datetime.now()
+                pendentes.append((linha, documento))
+                
+                if len(pendentes) >= BULK_TAMANHO_LOTE:
+                    await gravar_pendentes()
+        except ValueError as e:
+            # JSON malformado: interrompe a leitura, mas mantém o que já foi gravado
+            resultados.append({"linha": linha + 1, "erro": f"JSON inválido: {e}"})
+        
+        if pendentes:
+            await gravar_pendentes()
+        
+        resultados.sort(key=lambda resultado: resultado["linha"])
+        inseridos = sum(1 for resultado in resultados if "id" in resultado)
+        
+        return {
+            "inseridos": inseridos,
+            "erros": len(resultados) - inseridos,
+            "resultados": resultados
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar gastos em lote: {e}")
+
+@app.post("/gastos/importar")
+async def importar_gastos(
+    arquivo: UploadFile = File(...),
+    categoria_id: str = Form(...),
+    tipo_pagamento_id: str = Form(...),
+    formato: Optional[Literal["csv", "ofx"]] = Form(None),
+    regras: Optional[str] = Form(None),
+    somente_debitos: bool = Form(True),
+    encoding: str = Form("utf-8")
+):
+    """Importa um extrato CSV/OFX lido em fluxo; reimportar o mesmo arquivo não duplica gastos"""
+    try:
+        # Categoria/tipo padrão precisam existir antes de ler o arquivo
+        if not await _resolvedor_referencias()(cache_categorias, categoria_id):
+            raise HTTPException(status_code=404, detail="Categoria não encontrada")
+        if not await _resolvedor_referencias()(cache_tipos_pagamento, tipo_pagamento_id):
+            raise HTTPException(status_code=404, detail="Tipo de pagamento não encontrado")
+        
+        try:
+            regras_categoria = json.loads(regras) if regras else []
+            compilar_regras(regras_categoria)
+        except (ValueError, KeyError, TypeError, re.error) as e:
+            raise HTTPException(status_code=400, detail=f"Regras de categoria inválidas: {e}")
+        
+        # O arquivo é lido em fluxo dentro de importar_extrato, lote a lote no threadpool
+        texto = io.TextIOWrapper(arquivo.file, encoding=encoding, errors="replace", newline="")
+        transacoes = ler_extrato(texto, formato or formato_por_nome(arquivo.filename or ""))
+        
+        try:
+            return await importar_extrato(transacoes, categoria_id, tipo_pagamento_id, regras_categoria, somente_debitos)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Extrato inválido: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao importar extrato: {e}")
+
 @app.put("/gastos/{gasto_id}", response_model=Gasto)
 async def atualizar_gasto(gasto_id: str, gasto_update: GastoCreate):
     try:
         # Buscar dados da categoria
-        categoria = await categorias_collection.find_one({"_id": ObjectId(gasto_update.categoria_id)})
+        categoria = await cache_categorias.obter(gasto_update.categoria_id)
         if not categoria:
             raise HTTPException(status_code=404, detail="Categoria não encontrada")
         
         # Buscar dados do tipo de pagamento
-        tipo_pagamento = await tipos_pagamento_collection.find_one({"_id": ObjectId(gasto_update.tipo_pagamento_id)})
+        tipo_pagamento = await cache_tipos_pagamento.obter(gasto_update.tipo_pagamento_id)
         if not tipo_pagamento:
             raise HTTPException(status_code=404, detail="Tipo de pagamento não encontrado")
         
         # Atualizar gasto
-        update_data = {
-            "descricao": gasto_update.descricao,
-            "valor": gasto_update.valor,
-            "data_gasto": gasto_update.data_gasto.isoformat(),  # Converter para string ISO
-            "categoria": {
-                "id": str(categoria["_id"]),
-                "nome": categoria["nome"],
-                "cor": categoria["cor"]
-            },
-            "tipo_pagamento": {
-                "id": str(tipo_pagamento["_id"]),
-                "nome": tipo_pagamento["nome"],
-                "icone": tipo_pagamento["icone"],
-                "cor": tipo_pagamento["cor"]
-            },
-            "atualizado_em": datetime.now()
-        }
+        update_data = _montar_gasto(gasto_update, categoria, tipo_pagamento)
+        update_data["atualizado_em"] = datetime.now()
         
-        result = await gastos_collection.update_one(
-            {"_id": ObjectId(gasto_id)},
-            {"$set": update_data}
-        )
-        
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Gasto não encontrado")
-        
-        # Retornar gasto atualizado
-        gasto_atualizado = await gastos_collection.find_one({"_id": ObjectId(gasto_id)})
-        gasto_atualizado["id"] = str(gasto_atualizado["_id"])
-        del gasto_atualizado["_id"]
+        async with _reservar_versoes() as versao:
+            update_data["versao"] = versao
+            
+            # Versão anterior necessária para o delta dos resumos mensais e dos orçamentos
+            gasto_anterior = await gastos_collection.find_one_and_update(
+                {"_id": ObjectId(gasto_id)},
+                # Gastos legados perdem o valor em float ao serem reescritos
+                {"$set": update_data, "$unset": {"valor": ""}},
+                return_document=ReturnDocument.BEFORE
+            )
+            
+            if gasto_anterior is None:
+                raise HTTPException(status_code=404, detail="Gasto não encontrado")
+            
+            gasto_atualizado = {**gasto_anterior, **update_data}
+            # Só uma descrição nova conta como uso; editar valor ou data não infla a frequência
+            if gasto_atualizado["descricao"] != gasto_anterior["descricao"]:
+                indice_descricoes.descartar(gasto_anterior["descricao"])
+                indice_descricoes.registrar(gasto_atualizado["descricao"])
+            gasto_atualizado.pop("valor", None)
+            await _aplicar_agregados([(gasto_anterior, -1), (gasto_atualizado, 1)])
+            
+            # Retornar gasto atualizado
+            gasto_atualizado = _gasto_resposta(gasto_atualizado)
+            _publicar_evento("gasto", "atualizado", gasto_id, versao, gasto_atualizado)
         
         return gasto_atualizado
     except HTTPException:
@@ -423,12 +2132,20 @@ async def atualizar_gasto(gasto_id: str, gasto_update: GastoCreate):
 @app.delete("/gastos/{gasto_id}")
 async def deletar_gasto(gasto_id: str):
     try:
-        result = await gastos_collection.delete_one({"_id": ObjectId(gasto_id)})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Gasto não encontrado")
+        # Versão reservada antes da remoção: o tombstone é gravado logo depois dela, antes dos
+        # agregados, e uma falha nestes não deixa os clientes em sincronização com o gasto removido
+        async with _reservar_versoes() as versao:
+            gasto_removido = await gastos_collection.find_one_and_delete({"_id": ObjectId(gasto_id)})
+            
+            if gasto_removido is None:
+                raise HTTPException(status_code=404, detail="Gasto não encontrado")
+            
+            await _registrar_remocao("gastos", gasto_id, versao)
+            await _aplicar_agregados([(gasto_removido, -1)])
+            indice_descricoes.descartar(gasto_removido["descricao"])
+            _publicar_evento("gasto", "removido", gasto_id, versao)
         
-        return {"deleted": result.deleted_count}
+        return {"deleted": 1}
     except HTTPException:
         raise
     except Exception as e:
@@ -436,104 +2153,115 @@ async def deletar_gasto(gasto_id: str):
 
 # 📊 RELATÓRIOS (usando agregações MongoDB)
 @app.get("/relatorio/mensal/{ano}/{mes}")
-async def relatorio_mensal(ano: int, mes: int):
+async def relatorio_mensal(
+    ano: int,
+    mes: int = Path(..., ge=1, le=12),
+    include_gastos: Literal["false", "paged", "stream"] = "stream",
+    limit: int = Query(TAMANHO_PAGINA_PADRAO, ge=1, le=500),
+    after: Optional[str] = None,
+    cache: dict = Depends(condicional("gastos"))
+):
     try:
-        # Filtro de data usando strings
-        start_date = f"{ano}-{mes:02d}-01"
-        if mes == 12:
-            end_date = f"{ano + 1}-01-01"
-        else:
-            end_date = f"{ano}-{mes + 1:02d}-01"
-        
-        date_filter = {
-            "data_gasto": {
-                "$gte": start_date,
-                "$lt": end_date
-            }
-        }
-        
-        # 🎯 Agregação MongoDB: Total do mês
-        pipeline_total = [
-            {"$match": date_filter},
-            {"$group": {"_id": None, "total": {"$sum": "$valor"}}}
-        ]
-        result_total = await gastos_collection.aggregate(pipeline_total).to_list(None)
-        total = result_total[0]["total"] if result_total else 0.0
-        
-        # 🎯 Agregação: Gastos por categoria
-        pipeline_categoria = [
-            {"$match": date_filter},
+        # 🎯 Uma única agregação ($facet) sobre os resumos mensais: total + gastos por categoria
+        pipeline_resumo = [
+            {"$match": {"ano": ano, "mes": mes}},
             {
-                "$group": {
-                    "_id": "$categoria.nome",
-                    "total": {"$sum": "$valor"},
-                    "quantidade": {"$sum": 1},
-                    "cor": {"$first": "$categoria.cor"}
+                "$facet": {
+                    "total": [
+                        {"$group": {"_id": None, "total": {"$sum": TOTAL_CENTAVOS}}}
+                    ],
+                    "por_categoria": [
+                        {
+                            "$group": {
+                                "_id": "$categoria_nome",
+                                "total": {"$sum": TOTAL_CENTAVOS},
+                                "quantidade": {"$sum": "$quantidade"},
+                                "cor": {"$first": "$categoria_cor"}
+                            }
+                        },
+                        {"$sort": {"total": -1}}
+                    ]
                 }
-            },
-            {"$sort": {"total": -1}}
+            }
         ]
-        por_categoria = await gastos_collection.aggregate(pipeline_categoria).to_list(None)
+        resumo = (await resumos_collection.aggregate(pipeline_resumo).to_list(None))[0]
         
         # Formatar resultado
+        por_categoria = resumo["por_categoria"]
         for item in por_categoria:
             item["nome"] = item["_id"]
+            item["total"] = de_centavos(item["total"])
             del item["_id"]
         
-        # Gastos detalhados
-        gastos = []
-        cursor = gastos_collection.find(date_filter).sort("data_gasto", -1)
-        async for gasto in cursor:
-            gasto["id"] = str(gasto["_id"])
-            del gasto["_id"]
-            gastos.append(gasto)
-        
-        return {
+        relatorio = {
             "mes": mes,
             "ano": ano,
-            "total": total,
-            "por_categoria": por_categoria,
-            "gastos": gastos
+            "total": de_centavos(resumo["total"][0]["total"]) if resumo["total"] else 0.0,
+            "por_categoria": por_categoria
         }
+        
+        if include_gastos == "false":
+            return relatorio
+        
+        # Gastos detalhados
+        date_filter = _filtro_mes(ano, mes)
+        
+        if include_gastos == "paged":
+            filtro = {"$and": [date_filter, _filtro_cursor(after)]} if after else date_filter
+            gastos = await gastos_collection.find(filtro).sort(GASTOS_ORDENACAO).limit(limit + 1).to_list(None)
+            
+            relatorio["proximo"] = _codificar_cursor(gastos[limit - 1]) if len(gastos) > limit else None
+            relatorio["gastos"] = [_gasto_resposta(gasto) for gasto in gastos[:limit]]
+            return RespostaRapida(relatorio, headers=cache)
+        
+        # stream: o resumo sai imediatamente e os gastos são enviados conforme saem do cursor
+        cursor = gastos_collection.find(date_filter).sort(GASTOS_ORDENACAO).batch_size(RELATORIO_LOTE_STREAM)
+        cabecalho = _json_bytes(relatorio)[:-1] + b',"gastos":['
+        
+        async def gerar():
+            yield cabecalho
+            separador = b""
+            lote = []
+            async for gasto in cursor:
+                lote.append(_json_bytes(_gasto_resposta(gasto)))
+                if len(lote) == RELATORIO_LOTE_STREAM:
+                    yield separador + b",".join(lote)
+                    separador = b","
+                    lote = []
+            if lote:
+                yield separador + b",".join(lote)
+            yield b"]}"
+        
+        return StreamingResponse(gerar(), media_type="application/json", headers=cache)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no relatório mensal: {e}")
 
-@app.get("/relatorio/anual/{ano}")
+@app.get("/relatorio/anual/{ano}", dependencies=[Depends(condicional("gastos"))])
 async def relatorio_anual(ano: int):
     try:
-        # 🎯 Agregação MongoDB: Dados anuais usando strings de data
+        # 🎯 Agregação sobre os resumos mensais: O(meses × categorias) em vez de todos os gastos
         pipeline = [
-            {
-                "$match": {
-                    "data_gasto": {
-                        "$gte": f"{ano}-01-01",
-                        "$lt": f"{ano + 1}-01-01"
-                    }
-                }
-            },
-            {
-                "$addFields": {
-                    "mes": {"$toInt": {"$substr": ["$data_gasto", 5, 2]}}
-                }
-            },
+            {"$match": {"ano": ano}},
             {
                 "$group": {
                     "_id": "$mes",
-                    "total": {"$sum": "$valor"},
-                    "quantidade": {"$sum": 1}
+                    "total": {"$sum": TOTAL_CENTAVOS},
+                    "quantidade": {"$sum": "$quantidade"}
                 }
             },
             {"$sort": {"_id": 1}}
         ]
         
-        result = await gastos_collection.aggregate(pipeline).to_list(None)
+        result = await resumos_collection.aggregate(pipeline).to_list(None)
         
         # Formatar resultado
         meses = []
         for item in result:
             meses.append({
                 "mes": item["_id"],
-                "total": item["total"],
+                "total": de_centavos(item["total"]),
                 "quantidade": item["quantidade"]
             })
         
@@ -544,22 +2272,307 @@ async def relatorio_anual(ano: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no relatório anual: {e}")
 
-@app.get("/")
-async def root():
-    # Verificar status da conexão
-    db_status = "🟢 Conectado"
+# 📊 ANALÍTICO (snapshot colunar em memória, sem agregação no MongoDB)
+COLECOES_ANALITICO = ("gastos", "categorias", "tipos_pagamento")
+
+@app.get("/analitico/pivot", dependencies=[Depends(condicional(*COLECOES_ANALITICO))])
+async def analitico_pivot(
+    linhas: Literal[DIMENSOES] = "categoria",
+    colunas: Literal[DIMENSOES] = "mes",
+    metrica: Literal["total", "quantidade", "media"] = "total",
+    de: Optional[date] = Query(None, alias="from"),
+    ate: Optional[date] = Query(None, alias="to"),
+    categoria_id: Optional[str] = None,
+    tipo_pagamento_id: Optional[str] = None
+):
+    """Tabela dinâmica linhas × colunas (categoria, tipo de pagamento, mês, ano) no período"""
+    if linhas == colunas:
+        raise HTTPException(status_code=400, detail="Linhas e colunas devem ser dimensões diferentes")
     try:
-        if client and database:
-            await client.admin.command('ping')
-        else:
-            db_status = "🔴 Desconectado"
+        snapshot = await _snapshot_analitico()
+        tabela = snapshot.pivot(linhas, colunas, snapshot.filtrar(de, ate, categoria_id, tipo_pagamento_id))
+        
+        def valor(total: int, quantidade: int):
+            if metrica == "quantidade":
+                return quantidade
+            if metrica == "media":
+                return round(de_centavos(total) / quantidade, 2) if quantidade else None
+            return de_centavos(total)
+        
+        totais_linhas = [sum(linha) for linha in tabela["totais"]]
+        quantidades_linhas = [sum(linha) for linha in tabela["quantidades"]]
+        totais_colunas = [sum(coluna) for coluna in zip(*tabela["totais"])] if tabela["totais"] else []
+        quantidades_colunas = [sum(coluna) for coluna in zip(*tabela["quantidades"])] if tabela["quantidades"] else []
+        
+        return {
+            "linhas": await _rotulos(linhas, tabela["linhas"]),
+            "colunas": await _rotulos(colunas, tabela["colunas"]),
+            "metrica": metrica,
+            "valores": [
+                [valor(total, quantidade) for total, quantidade in zip(*celulas)]
+                for celulas in zip(tabela["totais"], tabela["quantidades"])
+            ],
+            "total_linhas": [valor(*par) for par in zip(totais_linhas, quantidades_linhas)],
+            "total_colunas": [valor(*par) for par in zip(totais_colunas, quantidades_colunas)],
+            "total": valor(sum(totais_linhas), sum(quantidades_linhas))
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        db_status = f"🟡 Instável: {str(e)[:50]}..."
+        raise HTTPException(status_code=500, detail=f"Erro no pivot analítico: {e}")
+
+@app.get("/analitico/ano-a-ano/{ano}", dependencies=[Depends(condicional(*COLECOES_ANALITICO))])
+async def analitico_ano_a_ano(
+    ano: int,
+    por: Literal["mes", "categoria", "tipo_pagamento"] = "mes",
+    categoria_id: Optional[str] = None,
+    tipo_pagamento_id: Optional[str] = None
+):
+    """Comparação com o ano anterior por mês, categoria ou tipo de pagamento"""
+    if not 1 < ano <= 9999:
+        raise HTTPException(status_code=400, detail="Ano inválido")
+    try:
+        snapshot = await _snapshot_analitico()
+        linhas = snapshot.filtrar(date(ano - 1, 1, 1), date(ano, 12, 31), categoria_id, tipo_pagamento_id)
+        comparacao = snapshot.ano_a_ano(ano, por, linhas)
+        
+        def variacao(atual: int, anterior: int):
+            return round((atual - anterior) * 100 / anterior, 2) if anterior else None
+        
+        itens = []
+        rotulos = await _rotulos(por, comparacao["chaves"])
+        for indice, rotulo in enumerate(rotulos):
+            atual, anterior = comparacao["totais"][indice], comparacao["totais_anteriores"][indice]
+            itens.append({
+                **rotulo,
+                "total": de_centavos(atual),
+                "total_anterior": de_centavos(anterior),
+                "quantidade": comparacao["quantidades"][indice],
+                "quantidade_anterior": comparacao["quantidades_anteriores"][indice],
+                "variacao_percentual": variacao(atual, anterior)
+            })
+        
+        total, total_anterior = sum(comparacao["totais"]), sum(comparacao["totais_anteriores"])
+        return {
+            "ano": ano,
+            "ano_anterior": ano - 1,
+            "por": por,
+            "itens": itens,
+            "total": de_centavos(total),
+            "total_anterior": de_centavos(total_anterior),
+            "variacao_percentual": variacao(total, total_anterior)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na comparação anual: {e}")
+
+@app.get("/analitico/media-movel", dependencies=[Depends(condicional(*COLECOES_ANALITICO))])
+async def analitico_media_movel(
+    janela: int = Query(3, ge=1, le=24),
+    de: Optional[date] = Query(None, alias="from"),
+    ate: Optional[date] = Query(None, alias="to"),
+    categoria_id: Optional[str] = None,
+    tipo_pagamento_id: Optional[str] = None
+):
+    """Totais mensais com a média móvel dos últimos `janela` meses (3 e 12 são os usuais)"""
+    try:
+        snapshot = await _snapshot_analitico()
+        serie = snapshot.media_movel(janela, snapshot.filtrar(de, ate, categoria_id, tipo_pagamento_id))
+        
+        return {
+            "janela": janela,
+            "meses": [
+                {
+                    "mes": mes,
+                    "total": de_centavos(total),
+                    "quantidade": quantidade,
+                    "media_movel": round(de_centavos(media), 2) if media is not None else None
+                }
+                for mes, total, quantidade, media in zip(serie["meses"], serie["totais"], serie["quantidades"], serie["medias"])
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na média móvel: {e}")
+
+@app.get("/analitico/top-descricoes", dependencies=[Depends(condicional("gastos"))])
+async def analitico_top_descricoes(
+    n: int = Query(10, ge=1, le=100),
+    metrica: Literal["total", "quantidade"] = "total",
+    de: Optional[date] = Query(None, alias="from"),
+    ate: Optional[date] = Query(None, alias="to"),
+    categoria_id: Optional[str] = None,
+    tipo_pagamento_id: Optional[str] = None
+):
+    """Descrições com maior total (ou mais frequentes) no período, agrupadas sem acentos/maiúsculas"""
+    try:
+        snapshot = await _snapshot_analitico()
+        linhas = snapshot.filtrar(de, ate, categoria_id, tipo_pagamento_id)
+        return [
+            {"descricao": descricao, "total": de_centavos(total), "quantidade": quantidade}
+            for descricao, total, quantidade in snapshot.top_descricoes(n, metrica, linhas)
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro no top de descrições: {e}")
+
+# 🎯 ORÇAMENTOS (totais mantidos pelas rotas de escrita: leitura O(categorias))
+def _formatar_orcamento(categoria: dict, orcamento: Optional[dict]) -> dict:
+    orcamento = orcamento or {}
+    gasto = orcamento.get("gasto_centavos", 0)
+    limite = orcamento.get("limite_centavos")
+    if limite is None:
+        situacao = "sem_limite"
+    elif gasto >= limite and (limite > 0 or gasto > 0):
+        # Limite zero (gravado antes da validação do PUT): qualquer gasto estoura, nenhum fica "ok"
+        situacao = "estourado"
+    elif limite > 0 and gasto * 100 >= 80 * limite:
+        situacao = "alerta"
+    else:
+        situacao = "ok"
+    return {
+        "categoria": {"id": categoria["id"], "nome": categoria["nome"], "cor": categoria.get("cor")},
+        "limite": de_centavos(limite) if limite is not None else None,
+        "gasto": de_centavos(gasto),
+        "restante": de_centavos(limite - gasto) if limite is not None else None,
+        "percentual": round(gasto * 100 / limite, 1) if limite else None,
+        "quantidade": orcamento.get("quantidade", 0),
+        "situacao": situacao
+    }
+
+@app.get("/orcamentos/alertas")
+async def listar_alertas_orcamento(limit: int = Query(50, ge=1, le=500)):
+    """Alertas de 80% / 100% do limite, mais recentes primeiro"""
+    try:
+        alertas = await alertas_orcamento_collection.find().sort("criado_em", -1).limit(limit).to_list(None)
+        return [_formatar_alerta(alerta) for alerta in alertas]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao listar alertas de orçamento: {e}")
+
+@app.get("/orcamentos/{ano}/{mes}")
+async def listar_orcamentos(ano: int, mes: int = Path(..., ge=1, le=12)):
+    """Limite, gasto e situação de cada categoria no mês"""
+    try:
+        orcamentos = {
+            orcamento["categoria_id"]: orcamento
+            async for orcamento in orcamentos_collection.find({"ano": ano, "mes": mes})
+        }
+        categorias = [
+            _formatar_orcamento(categoria, orcamentos.get(categoria["id"]))
+            for categoria in await cache_categorias.listar()
+        ]
+        
+        total_gasto = sum(orcamento.get("gasto_centavos", 0) for orcamento in orcamentos.values())
+        total_limite = sum(orcamento.get("limite_centavos") or 0 for orcamento in orcamentos.values())
+        return {
+            "ano": ano,
+            "mes": mes,
+            "total_gasto": de_centavos(total_gasto),
+            "total_limite": de_centavos(total_limite),
+            "categorias": categorias
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao listar orçamentos: {e}")
+
+@app.put("/orcamentos/{ano}/{mes}/{categoria_id}")
+async def definir_orcamento(ano: int, categoria_id: str, orcamento: OrcamentoUpdate, mes: int = Path(..., ge=1, le=12)):
+    try:
+        # Em centavos: um limite que arredonda para zero também é recusado
+        limite = para_centavos(orcamento.limite) if orcamento.limite is not None else None
+        if limite is not None and limite <= 0:
+            raise HTTPException(status_code=400, detail="O limite deve ser positivo (use null para remover)")
+        
+        categoria = await cache_categorias.obter(categoria_id)
+        if not categoria:
+            raise HTTPException(status_code=404, detail="Categoria não encontrada")
+        
+        documento = await definir_limite(orcamentos_collection, ano, mes, categoria_id, limite)
+        return _formatar_orcamento(categoria, documento)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao definir orçamento: {e}")
+
+# 📈 MÉTRICAS (formato Prometheus)
+@app.get("/metrics")
+async def exportar_metricas():
+    """Latência por rota, requisições em andamento, tempo por comando do MongoDB e estado do pool"""
+    return Response(content=metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 🗂️ ESTATÍSTICAS DO CACHE DE REFERÊNCIAS
+@app.get("/cache/estatisticas")
+async def estatisticas_cache():
+    """Contadores de hit/miss do cache de categorias e tipos de pagamento e estado do snapshot analítico"""
+    return {
+        "categorias": cache_categorias.estatisticas(),
+        "tipos_pagamento": cache_tipos_pagamento.estatisticas(),
+        "analitico": snapshot_gastos.estatisticas()
+    }
+
+# 📡 EVENTOS EM TEMPO REAL (Server-Sent Events)
+@app.get("/eventos")
+async def eventos(request: Request, last_event_id: Optional[str] = Header(None)):
+    """Stream SSE de alterações em gastos, categorias e tipos de pagamento"""
+    versao_retomada = _ler_token_sincronizacao(last_event_id) if last_event_id else None
+    
+    # Assinar antes do replay para não perder eventos publicados no intervalo
+    fila = barramento.assinar()
+    
+    async def gerar():
+        try:
+            yield "retry: 3000\n\n"
+            
+            entregues = set()
+            if versao_retomada is not None:
+                replay = await _eventos_desde(versao_retomada)
+                if replay is None:
+                    yield _formatar_sse({"tipo": "resync"})
+                else:
+                    for evento in replay:
+                        yield _formatar_sse(evento)
+                        entregues.add(evento["versao"])
+            
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=SSE_KEEPALIVE_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                # Ignorar o que já foi entregue pelo replay (uma versão menor ainda pode chegar depois)
+                if evento.get("versao") in entregues:
+                    continue
+                yield _formatar_sse(evento)
+        finally:
+            barramento.cancelar(fila)
+    
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/")
+async def root():
+    # Status da conexão mantido pelo monitor em segundo plano
+    if client is None or database is None:
+        db_status = "🔴 Desconectado"
+    elif estado_banco["conectado"]:
+        db_status = "🟢 Conectado"
+    elif estado_banco["ultimo_ping"] is None:
+        db_status = "⚪ Verificando"
+    else:
+        db_status = f"🟡 Instável: {str(estado_banco['erro'])[:50]}..."
     
     return {
         "message": "💰 API de Controle de Gastos",
         "version": "2.0.0",
-        "database": f"MongoDB Atlas - {db_status}",
+        "database": f"{'Banco local' if _banco_local() else 'MongoDB Atlas'} - {db_status}",
         "framework": "FastAPI + Motor",
         "ssl_config": "Otimizado para Railway",
         "docs": "/docs",
@@ -569,7 +2582,36 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Endpoint para verificação de saúde da aplicação"""
+    """Endpoint para verificação de saúde da aplicação (sem round trip ao database)"""
+    if client is None or database is None:
+        return {
+            "status": "unhealthy",
+            "database": "disconnected",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    ultimo_ping = estado_banco["ultimo_ping"]
+    if modo_offline:
+        status, database_status = "degraded", "offline: banco local"
+    elif estado_banco["conectado"]:
+        status, database_status = "healthy", "connected"
+    else:
+        status, database_status = "degraded", f"error: {estado_banco['erro']}"
+    
+    return {
+        "status": status,
+        "database": database_status,
+        "armazenamento": "offline" if modo_offline else "local" if _banco_local() else "mongodb",
+        "latencia_ms": estado_banco["latencia_ms"],
+        "ultimo_ping": ultimo_ping.isoformat() if ultimo_ping else None,
+        "disjuntor": protecao.disjuntor.resumo(),
+        "inicializacao": estado_inicializacao,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/health/profundo")
+async def health_check_profundo():
+    """Verificação completa sob demanda: ping e leitura real no database"""
     try:
         if client is None or database is None:
             return {
@@ -578,7 +2620,9 @@ async def health_check():
                 "timestamp": datetime.now().isoformat()
             }
         
-        await client.admin.command('ping')
+        await _pingar_banco()
+        if not estado_banco["conectado"]:
+            raise RuntimeError(estado_banco["erro"])
         
         # Contar documentos para verificar acesso
         categorias_count = await categorias_collection.count_documents({})
@@ -586,6 +2630,7 @@ async def health_check():
         return {
             "status": "healthy",
             "database": "connected",
+            "latencia_ms": estado_banco["latencia_ms"],
             "categorias": categorias_count,
             "timestamp": datetime.now().isoformat()
         }
@@ -603,6 +2648,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=port,
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),  # Um processo por worker, cliente criado após o fork
         reload=False,  # Desabilitar reload em produção
         log_level="info"
     )
@@ -0,0 +1,286 @@
+"""Métricas no formato de texto do Prometheus, sem dependências externas.
+
+As métricas são por processo: com vários workers do uvicorn cada scrape de
+`/metrics` é atendido por um deles, identificado em `processo_info{worker="<pid>"}`.
+
+- Latência por rota (template do caminho, ex. `/gastos/{gasto_id}`) e requisições em andamento,
+  medidas por um middleware ASGI.
+- Duração de cada comando do MongoDB por coleção e operação, via command monitoring do pymongo,
+  com log das consultas acima de `MONGO_CONSULTA_LENTA_MS`.
+- Estado do pool de conexões via connection pool monitoring.
+- Estado do disjuntor do MongoDB e requisições rejeitadas (ver `protecao.py`); os listeners
+  também alimentam o disjuntor com o resultado de cada comando e as falhas de checkout.
+
+Os listeners do pymongo rodam nas threads do Motor, por isso cada métrica tem o próprio lock.
+"""
+import json
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_MONGO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONSULTA_LENTA_MS = float(os.environ.get("MONGO_CONSULTA_LENTA_MS", 200))
+TAMANHO_MAXIMO_LOG = 500
+ROTA_DESCONHECIDA = "desconhecida"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def exportar(self) -> str:
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        with self._lock:
+            valores = dict(self._valores)
+        for chave, valor in sorted(valores.items()):
+            linhas.extend(self._linhas(chave, valor))
+        return "\n".join(linhas)
+
+    def _linhas(self, chave: tuple, valor) -> list:
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {valor}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, *rotulos, valor: float = 1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def incrementar(self, *rotulos, valor: float = 1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def decrementar(self, *rotulos, valor: float = 1):
+        self.incrementar(*rotulos, valor=-valor)
+
+    def definir(self, *rotulos, valor: float):
+        with self._lock:
+            self._valores[rotulos] = valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str, rotulos: tuple = (), buckets: tuple = BUCKETS_HTTP):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = buckets
+
+    def observar(self, valor: float, *rotulos):
+        with self._lock:
+            contagens = self._valores.get(rotulos)
+            if contagens is None:
+                # [contagem por bucket..., soma, total]
+                contagens = self._valores[rotulos] = [0] * len(self.buckets) + [0.0, 0]
+            for indice, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    contagens[indice] += 1
+            contagens[-2] += valor
+            contagens[-1] += 1
+
+    def _linhas(self, chave: tuple, contagens: list) -> list:
+        limites = [f'le="{limite}"' for limite in self.buckets] + ['le="+Inf"']
+        acumulados = contagens[:len(self.buckets)] + [contagens[-1]]
+        linhas = [
+            f"{self.nome}_bucket{_rotulos(self.rotulos, chave, limite)} {quantidade}"
+            for limite, quantidade in zip(limites, acumulados)
+        ]
+        linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {round(contagens[-2], 6)}")
+        linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {contagens[-1]}")
+        return linhas
+
+
+# 📊 Registro de métricas do processo
+http_duracao = Histograma(
+    "http_requisicao_duracao_segundos", "Duração das requisições HTTP por rota", ("metodo", "rota", "status")
+)
+http_em_andamento = Medidor("http_requisicoes_em_andamento", "Requisições HTTP sendo atendidas")
+mongo_duracao = Histograma(
+    "mongo_comando_duracao_segundos", "Duração dos comandos do MongoDB", ("colecao", "operacao"), BUCKETS_MONGO
+)
+mongo_falhas = Contador("mongo_comandos_falhos_total", "Comandos do MongoDB que falharam", ("colecao", "operacao"))
+mongo_lentas = Contador(
+    "mongo_consultas_lentas_total", "Comandos acima de MONGO_CONSULTA_LENTA_MS", ("colecao", "operacao")
+)
+pool_conexoes = Medidor("mongo_pool_conexoes_abertas", "Conexões abertas no pool por servidor", ("servidor",))
+pool_em_uso = Medidor("mongo_pool_conexoes_em_uso", "Conexões emprestadas a operações por servidor", ("servidor",))
+pool_falhas_checkout = Contador(
+    "mongo_pool_checkout_falhas_total", "Falhas ao obter conexão do pool", ("servidor", "motivo")
+)
+pool_limpezas = Contador("mongo_pool_limpezas_total", "Vezes em que o pool foi limpo (erro de rede/servidor)", ("servidor",))
+disjuntor_estado = Medidor("mongo_disjuntor_estado", "Disjuntor do MongoDB: 0 fechado, 1 meio aberto, 2 aberto")
+requisicoes_rejeitadas = Contador(
+    "http_requisicoes_rejeitadas_total", "Requisições recusadas sem chegar à rota (disjuntor, sobrecarga, prazo)", ("motivo",)
+)
+
+METRICAS = [
+    http_duracao, http_em_andamento, mongo_duracao, mongo_falhas, mongo_lentas,
+    pool_conexoes, pool_em_uso, pool_falhas_checkout, pool_limpezas, disjuntor_estado, requisicoes_rejeitadas
+]
+
+
+def exportar() -> str:
+    """Todas as métricas no formato de exposição de texto do Prometheus"""
+    info = f'# TYPE processo_info gauge\nprocesso_info{{worker="{os.getpid()}"}} 1'
+    return "\n".join([info] + [metrica.exportar() for metrica in METRICAS]) + "\n"
+
+
+class MetricasHTTP:
+    """Middleware ASGI: duração até o fim do corpo (inclusive respostas em fluxo) e requisições em andamento"""
+
+    def __init__(self, app):
+        self.app = app
+        self._rotas = None
+
+    def _rota(self, scope) -> str:
+        # Template do caminho (cardinalidade limitada); o roteador só deixa o endpoint no scope
+        if self._rotas is None:
+            self._rotas = {
+                getattr(rota, "endpoint", None): rota.path
+                for rota in scope["app"].routes if hasattr(rota, "path")
+            }
+        return self._rotas.get(scope.get("endpoint"), ROTA_DESCONHECIDA)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        http_em_andamento.incrementar()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            http_em_andamento.decrementar()
+            http_duracao.observar(time.perf_counter() - inicio, scope["method"], self._rota(scope), status)
+
+
+def _colecao(comando: dict, nome: str) -> str:
+    alvo = comando.get(nome)
+    if nome == "getMore":
+        return comando.get("collection", "-")
+    return alvo if isinstance(alvo, str) else "-"
+
+
+def _resumir(comando: dict) -> str:
+    resumo = {
+        chave: valor for chave, valor in comando.items()
+        if chave not in ("documents", "updates", "deletes", "lsid", "$clusterTime", "$db", "txnNumber")
+    }
+    return json.dumps(resumo, default=str, ensure_ascii=False)[:TAMANHO_MAXIMO_LOG]
+
+
+class MonitorComandos(monitoring.CommandListener):
+    """Tempo de cada comando do MongoDB por coleção e operação, com log de consultas lentas"""
+
+    def __init__(self, disjuntor=None):
+        self._pendentes = {}
+        self._lock = threading.Lock()
+        self._disjuntor = disjuntor
+
+    def started(self, event):
+        chave = (event.request_id, event.connection_id)
+        with self._lock:
+            self._pendentes[chave] = (_colecao(event.command, event.command_name), event.command)
+
+    def _finalizar(self, event):
+        with self._lock:
+            return self._pendentes.pop((event.request_id, event.connection_id), ("-", None))
+
+    def succeeded(self, event):
+        colecao, comando = self._finalizar(event)
+        segundos = event.duration_micros / 1_000_000
+        mongo_duracao.observar(segundos, colecao, event.command_name)
+        if self._disjuntor is not None:
+            self._disjuntor.registrar_comando()
+        if segundos * 1000 >= CONSULTA_LENTA_MS:
+            mongo_lentas.incrementar(colecao, event.command_name)
+            print(f"🐢 Consulta lenta ({segundos * 1000:.1f} ms) {colecao}.{event.command_name}: {_resumir(comando or {})}")
+
+    def failed(self, event):
+        colecao, _ = self._finalizar(event)
+        mongo_duracao.observar(event.duration_micros / 1_000_000, colecao, event.command_name)
+        mongo_falhas.incrementar(colecao, event.command_name)
+        if self._disjuntor is not None:
+            self._disjuntor.registrar_comando(event.failure)
+
+
+def _servidor(event) -> str:
+    return f"{event.address[0]}:{event.address[1]}"
+
+
+class MonitorPool(monitoring.ConnectionPoolListener):
+    """Conexões abertas/em uso e falhas de checkout do pool do MongoDB"""
+
+    def __init__(self, disjuntor=None):
+        self._disjuntor = disjuntor
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pool_limpezas.incrementar(_servidor(event))
+
+    def pool_closed(self, event):
+        servidor = _servidor(event)
+        pool_conexoes.definir(servidor, valor=0)
+        pool_em_uso.definir(servidor, valor=0)
+
+    def connection_created(self, event):
+        pool_conexoes.incrementar(_servidor(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pool_conexoes.decrementar(_servidor(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pool_falhas_checkout.incrementar(_servidor(event), event.reason)
+        # Sem conexão (erro ao conectar ou fila do pool esgotada) nenhum comando chega a ser monitorado
+        if self._disjuntor is not None and event.reason in ("connectionError", "timeout"):
+            self._disjuntor.registrar_falha()
+
+    def connection_checked_out(self, event):
+        pool_em_uso.incrementar(_servidor(event))
+
+    def connection_checked_in(self, event):
+        pool_em_uso.decrementar(_servidor(event))
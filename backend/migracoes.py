@@ -0,0 +1,145 @@
+"""Migração dos gastos para data BSON e valor inteiro em centavos.
+
+Gastos antigos guardam `data_gasto` como string ISO e `valor` como float. A
+migração percorre esses documentos em lotes ordenados por `_id`, com uma pausa
+entre lotes para não disputar o banco com as rotas, e grava o progresso em
+`contadores` (`_id: "migracao_centavos"`): se for interrompida, continua do
+último lote. Cada atualização é condicionada aos valores lidos, então um gasto
+reescrito pela API no meio do caminho (já no formato novo) não é sobrescrito.
+Ao final os resumos mensais são reconstruídos em centavos e a migração é marcada como
+concluída; execuções seguintes terminam imediatamente.
+
+Depois dela vem a carga inicial dos orçamentos, com marcador próprio em `contadores`
+(`_id: "carga_orcamentos"`): bases que concluíram a migração antes de existirem os
+orçamentos também a recebem, uma única vez.
+
+A conversão dos gastos tolera escritas da API, mas as reconstruções não: elas substituem os
+resumos inteiros (`$out`) e os totais dos orçamentos, e um `$inc` aplicado durante elas se perderia. Por isso o deploy
+roda a migração antes de subir o uvicorn, e não em segundo plano.
+
+    python migracoes.py                      # executa/continua a migração
+    python migracoes.py --lote 1000 --pausa-ms 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+
+from formato import data_para_bson, para_centavos
+import orcamentos
+import resumos
+
+MIGRACAO_CENTAVOS = "migracao_centavos"
+CARGA_ORCAMENTOS = "carga_orcamentos"
+FILTRO_PENDENTES = {
+    "$or": [
+        {"data_gasto": {"$type": "string"}},
+        {"valor_centavos": {"$exists": False}}
+    ]
+}
+
+
+def _atualizacao(gasto: dict) -> UpdateOne:
+    data_gasto = gasto["data_gasto"]
+    if isinstance(data_gasto, str):
+        data_gasto = data_para_bson(date.fromisoformat(data_gasto[:10]))
+
+    atualizacao = {"$set": {"data_gasto": data_gasto}}
+    if "valor" in gasto:
+        atualizacao["$set"]["valor_centavos"] = para_centavos(gasto["valor"])
+        atualizacao["$unset"] = {"valor": ""}
+
+    # A versão não muda: a representação na API é a mesma antes e depois
+    filtro = {"_id": gasto["_id"], "data_gasto": gasto["data_gasto"]}
+    if "valor" in gasto:
+        filtro["valor"] = gasto["valor"]
+    return UpdateOne(filtro, atualizacao)
+
+
+async def migrar_gastos(database, tamanho_lote: int = 500, pausa: float = 0.05) -> dict:
+    """Converte os gastos legados em lotes; retorna o progresso da migração"""
+    contadores = database.contadores
+    estado = await contadores.find_one({"_id": MIGRACAO_CENTAVOS}) or {}
+    if estado.get("concluida"):
+        return estado
+
+    ultimo_id = estado.get("ultimo_id")
+    while True:
+        filtro = {**FILTRO_PENDENTES, "_id": {"$gt": ultimo_id}} if ultimo_id else FILTRO_PENDENTES
+        lote = await database.gastos.find(
+            filtro, {"data_gasto": 1, "valor": 1}
+        ).sort("_id", 1).limit(tamanho_lote).to_list(None)
+        if not lote:
+            break
+
+        resultado = await database.gastos.bulk_write([_atualizacao(gasto) for gasto in lote], ordered=False)
+        ultimo_id = lote[-1]["_id"]
+        estado = await contadores.find_one_and_update(
+            {"_id": MIGRACAO_CENTAVOS},
+            {
+                "$set": {"ultimo_id": ultimo_id, "atualizado_em": datetime.now()},
+                "$inc": {"migrados": resultado.modified_count}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        print(f"🔄 {estado['migrados']} gasto(s) migrado(s)")
+        await asyncio.sleep(pausa)
+
+    # Totais em float acumulados antes da migração são recalculados a partir dos centavos
+    linhas = await resumos.reconstruir(database)
+    print(f"✅ Resumos reconstruídos: {linhas} linha(s)")
+
+    return await contadores.find_one_and_update(
+        {"_id": MIGRACAO_CENTAVOS},
+        {"$set": {"concluida": True, "concluida_em": datetime.now()}, "$setOnInsert": {"migrados": 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def carregar_orcamentos(database) -> dict:
+    """Carga inicial dos totais dos orçamentos a partir dos resumos; roda uma vez por base"""
+    contadores = database.contadores
+    estado = await contadores.find_one({"_id": CARGA_ORCAMENTOS}) or {}
+    if estado.get("concluida"):
+        return estado
+
+    # Os orçamentos partem dos resumos, então a migração (que os reconstrói) vem antes
+    linhas = await orcamentos.reconstruir(database)
+    print(f"✅ Orçamentos recalculados: {linhas} linha(s)")
+    return await contadores.find_one_and_update(
+        {"_id": CARGA_ORCAMENTOS},
+        {"$set": {"concluida": True, "concluida_em": datetime.now(), "linhas": linhas}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _executar(args) -> int:
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    database = client[os.environ.get("MONGODB_DATABASE", "controle_gastos")]
+
+    try:
+        estado = await migrar_gastos(database, args.lote, args.pausa_ms / 1000)
+        print(f"🎉 Migração para centavos concluída ({estado.get('migrados', 0)} gasto(s) migrado(s))")
+        await carregar_orcamentos(database)
+        return 0
+    except Exception as e:
+        print(f"❌ Erro na migração: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migração dos gastos para data BSON e valor em centavos")
+    parser.add_argument("--lote", type=int, default=500, help="gastos por lote")
+    parser.add_argument("--pausa-ms", type=int, default=50, help="pausa entre lotes")
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
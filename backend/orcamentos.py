@@ -0,0 +1,143 @@
+"""Orçamentos mensais por categoria, com o total gasto mantido incrementalmente.
+
+Cada documento de `orcamentos` guarda, por (ano, mês, categoria), o limite definido pelo
+usuário (`limite_centavos`, opcional), o total gasto em centavos e a quantidade de gastos.
+As mesmas rotas de escrita que mantêm os resumos mensais aplicam `$inc` aqui; o
+`find_one_and_update` devolve o total depois do incremento e, com o delta da própria
+escrita, sabe-se o total de antes: o cruzamento de 80% e 100% do limite sai daí, sem
+reler gastos nem resumos. Escritas concorrentes são serializadas pelo `$inc`, então cada
+cruzamento gera um único alerta (que volta a valer se o total cair e subir de novo).
+
+Definir um limite não lê os resumos: o documento do mês é criado (ou atualizado) num único
+upsert, com total zero só se ainda não existir, então um gasto gravado ao mesmo tempo entra
+uma vez, pelo próprio `$inc`. Isso exige que todo mês com gastos anteriores a esta coleção já
+tenha o seu documento, criado pela carga inicial a partir de `resumos_mensais` (limites
+preservados). O deploy a executa uma vez, em `migracoes.py`, antes de subir o uvicorn; à mão:
+
+    python orcamentos.py --reconstruir
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+
+from formato import ano_mes, centavos_do_gasto
+from resumos import COLECAO_RESUMOS, TOTAL_CENTAVOS
+
+COLECAO_ORCAMENTOS = "orcamentos"
+COLECAO_ALERTAS = "alertas_orcamento"
+CAMPOS_CHAVE = ["ano", "mes", "categoria_id"]
+LIMIARES = (80, 100)  # percentuais do limite que geram alerta
+
+
+def chave_orcamento(gasto: dict) -> dict:
+    """Chave (ano, mês, categoria) do orçamento de um gasto"""
+    ano, mes = ano_mes(gasto["data_gasto"])
+    return {"ano": ano, "mes": mes, "categoria_id": (gasto.get("categoria") or {}).get("id")}
+
+
+def limiares_cruzados(antes: int, depois: int, limite) -> list:
+    """Limiares (%) que o total atravessou para cima, de `antes` para `depois` (aritmética inteira)"""
+    if not limite or limite <= 0:
+        return []
+    return [limiar for limiar in LIMIARES if antes * 100 < limiar * limite <= depois * 100]
+
+
+async def aplicar_orcamentos(colecao, alteracoes: list) -> list:
+    """Aplica (gasto, sinal) aos totais dos orçamentos; retorna os alertas dos limiares cruzados"""
+    deltas = {}
+    for gasto, sinal in alteracoes:
+        chave = tuple(chave_orcamento(gasto).items())
+        delta = deltas.setdefault(chave, {"total": 0, "quantidade": 0})
+        delta["total"] += sinal * centavos_do_gasto(gasto)
+        delta["quantidade"] += sinal
+
+    async def incrementar(chave: tuple, delta: dict) -> list:
+        documento = await colecao.find_one_and_update(
+            dict(chave),
+            {"$inc": {"gasto_centavos": delta["total"], "quantidade": delta["quantidade"]}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        depois = documento["gasto_centavos"]
+        limite = documento.get("limite_centavos")
+        return [
+            {**dict(chave), "limiar": limiar, "gasto_centavos": depois, "limite_centavos": limite}
+            for limiar in limiares_cruzados(depois - delta["total"], depois, limite)
+        ]
+
+    # Atualizações que não mudam valor nem mês/categoria (ex.: só a descrição) não custam round trip
+    alvos = [(chave, delta) for chave, delta in deltas.items() if delta["total"] or delta["quantidade"]]
+    resultados = await asyncio.gather(*(incrementar(chave, delta) for chave, delta in alvos))
+    return [alerta for alertas in resultados for alerta in alertas]
+
+
+async def definir_limite(colecao, ano: int, mes: int, categoria_id: str, limite_centavos) -> dict:
+    """Define (ou remove, com None) o limite; um orçamento novo começa zerado e recebe os $inc das escritas"""
+    if limite_centavos is None:
+        atualizacao = {"$unset": {"limite_centavos": ""}}
+    else:
+        atualizacao = {"$set": {"limite_centavos": limite_centavos}}
+    # Atômico com os $inc das rotas: o total existente nunca é recalculado aqui
+    atualizacao["$setOnInsert"] = {"gasto_centavos": 0, "quantidade": 0}
+    return await colecao.find_one_and_update(
+        {"ano": ano, "mes": mes, "categoria_id": categoria_id},
+        atualizacao,
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def reconstruir(database) -> int:
+    """Recalcula os totais de todos os orçamentos a partir dos resumos mensais (limites preservados)"""
+    pipeline = [
+        {
+            "$group": {
+                "_id": {"ano": "$ano", "mes": "$mes", "categoria_id": "$categoria_id"},
+                "total": {"$sum": TOTAL_CENTAVOS},
+                "quantidade": {"$sum": "$quantidade"}
+            }
+        }
+    ]
+    marca = datetime.now()
+    operacoes = [
+        UpdateOne(
+            item["_id"],
+            {"$set": {"gasto_centavos": int(item["total"]), "quantidade": item["quantidade"], "reconstruido_em": marca}},
+            upsert=True
+        )
+        async for item in database[COLECAO_RESUMOS].aggregate(pipeline)
+    ]
+    colecao = database[COLECAO_ORCAMENTOS]
+    if operacoes:
+        await colecao.bulk_write(operacoes, ordered=False)
+    # Orçamentos de meses sem nenhum gasto nos resumos ficam zerados
+    await colecao.update_many(
+        {"reconstruido_em": {"$ne": marca}},
+        {"$set": {"gasto_centavos": 0, "quantidade": 0, "reconstruido_em": marca}}
+    )
+    return len(operacoes)
+
+
+async def _executar(args) -> int:
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    database = client[os.environ.get("MONGODB_DATABASE", "controle_gastos")]
+
+    try:
+        total = await reconstruir(database)
+        print(f"✅ Orçamentos recalculados a partir dos resumos: {total} linha(s)")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Totais dos orçamentos mensais por categoria")
+    parser.add_argument("--reconstruir", action="store_true", required=True, help="recalcular os totais a partir dos resumos")
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
@@ -0,0 +1,109 @@
+"""Paridade entre o banco local e o MongoDB nas consultas que as rotas fazem.
+
+O banco local (banco_local.py) implementa só o subconjunto do Motor que o projeto usa;
+esta checagem copia as coleções do MongoDB para um banco local, cria os mesmos índices
+e roda nos dois as consultas das rotas (as mesmas de `indices.py --explicar`) e o
+pipeline dos resumos, comparando os resultados:
+
+    python paridade.py               # exit 1 se algum resultado divergir
+    python paridade.py --limite 500  # compara só os 500 primeiros de cada consulta ordenada
+
+Lê as coleções inteiras: rode contra uma cópia ou fora do horário de pico. A busca
+textual do banco local não faz stemming (palavras inteiras, sem acento/caixa), então
+divergências em GET /gastos/search com plurais são esperadas.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from banco_local import ClienteLocal
+from indices import _consultas_das_rotas, sincronizar
+from resumos import PIPELINE_RESUMOS
+
+PARIDADE_LIMITE_PADRAO = 1000
+
+
+async def copiar(origem, destino, colecoes) -> int:
+    """Copia as coleções da origem para o destino; retorna quantos documentos foram copiados"""
+    total = 0
+    for nome in colecoes:
+        documentos = await origem[nome].find().to_list(None)
+        if documentos:
+            await destino[nome].insert_many(documentos)
+        total += len(documentos)
+    return total
+
+
+async def _ids(colecao, filtro, ordenacao, limite: int) -> list:
+    cursor = colecao.find(filtro, {"_id": 1})
+    if ordenacao:
+        cursor = cursor.sort(ordenacao)
+    ids = [documento["_id"] async for documento in cursor.limit(limite)]
+    # Sem ordenação pedida a ordem natural difere entre os bancos: compara só o conjunto
+    return ids if ordenacao else sorted(ids, key=str)
+
+
+async def comparar(mongodb, local, limite: int = PARIDADE_LIMITE_PADRAO) -> list:
+    """Roda as consultas das rotas nos dois bancos; retorna as que divergiram"""
+    divergencias = []
+    for rota, nome_colecao, filtro, ordenacao in _consultas_das_rotas():
+        # O limite só vale para consultas ordenadas; sem ordem o recorte seria arbitrário
+        esperado = await _ids(mongodb[nome_colecao], filtro, ordenacao, limite if ordenacao else 0)
+        atual = await _ids(local[nome_colecao], filtro, ordenacao, limite if ordenacao else 0)
+        if esperado != atual:
+            divergencias.append({
+                "consulta": rota,
+                "somente_mongodb": len(set(esperado) - set(atual)),
+                "somente_local": len(set(atual) - set(esperado)),
+                "mesmos_documentos": set(esperado) == set(atual)
+            })
+        print(f"{'❌' if esperado != atual else '✅'} {rota}: {len(esperado)} documento(s)")
+
+    esperados = sorted(map(repr, await mongodb.gastos.aggregate(PIPELINE_RESUMOS).to_list(None)))
+    atuais = sorted(map(repr, await local.gastos.aggregate(PIPELINE_RESUMOS).to_list(None)))
+    if esperados != atuais:
+        divergencias.append({
+            "consulta": "Pipeline dos resumos",
+            "somente_mongodb": len(set(esperados) - set(atuais)),
+            "somente_local": len(set(atuais) - set(esperados)),
+            "mesmos_documentos": False
+        })
+    print(f"{'❌' if esperados != atuais else '✅'} Pipeline dos resumos: {len(esperados)} linha(s)")
+
+    return divergencias
+
+
+async def _executar(args) -> int:
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    nome_banco = os.environ.get("MONGODB_DATABASE", "controle_gastos")
+    mongodb = client[nome_banco]
+    local = ClienteLocal()[nome_banco]
+
+    try:
+        colecoes = {nome_colecao for _, nome_colecao, _, _ in _consultas_das_rotas()}
+        await sincronizar(local)
+        total = await copiar(mongodb, local, sorted(colecoes))
+        print(f"📥 {total} documento(s) copiados para o banco local")
+
+        divergencias = await comparar(mongodb, local, args.limite)
+        for divergencia in divergencias:
+            print(f"⚠️ Divergência: {divergencia}")
+        print(f"📊 {len(divergencias)} divergência(s) entre o banco local e o MongoDB")
+        return 1 if divergencias else 0
+    except Exception as e:
+        print(f"❌ Erro na checagem de paridade: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paridade entre o banco local e o MongoDB nas consultas das rotas")
+    parser.add_argument("--limite", type=int, default=PARIDADE_LIMITE_PADRAO,
+                        help="documentos comparados por consulta ordenada")
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
@@ -0,0 +1,237 @@
+"""Proteção da API quando o MongoDB degrada: disjuntor, limite de requisições e prazo por requisição.
+
+- Disjuntor: depois de `DISJUNTOR_FALHAS` falhas seguidas de disponibilidade (rede, timeout,
+  primário indisponível) as rotas que usam o banco respondem 503 na hora, sem empilhar
+  corrotinas esperando o pool. A cada `DISJUNTOR_ABERTO_SEGUNDOS` uma requisição passa como
+  sonda; o ping do monitor de saúde também sonda. Um comando bem-sucedido fecha o disjuntor.
+  Erros de aplicação (chave duplicada, validação) contam como sinal de banco respondendo.
+- Limite de requisições em andamento por worker (`MAX_REQUISICOES_EM_ANDAMENTO`): o excedente
+  recebe 503 com `Retry-After` em vez de fila, então a latência e a memória ficam limitadas.
+- Prazo por requisição (`PRAZO_REQUISICAO_SEGUNDOS`): sem o início da resposta dentro do prazo a
+  leitura é cancelada e o cliente recebe 504. Respostas em fluxo já iniciadas não são interrompidas.
+  Escritas não têm prazo: cancelá-las entre a gravação e a atualização dos resumos/orçamentos
+  deixaria os agregados errados e o cliente com um 504 para algo que foi gravado. Cada comando
+  delas continua limitado pelo timeout do driver (`MONGO_TIMEOUT_MS`).
+
+Os eventos do pymongo chegam pelas threads do Motor, por isso o disjuntor tem lock.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import metricas
+
+DISJUNTOR_FALHAS = int(os.environ.get("DISJUNTOR_FALHAS", 5))
+DISJUNTOR_ABERTO_SEGUNDOS = float(os.environ.get("DISJUNTOR_ABERTO_SEGUNDOS", 10))
+MAX_REQUISICOES_EM_ANDAMENTO = int(os.environ.get("MAX_REQUISICOES_EM_ANDAMENTO", 200))
+PRAZO_REQUISICAO_SEGUNDOS = float(os.environ.get("PRAZO_REQUISICAO_SEGUNDOS", 15))
+
+# Rotas que não dependem do banco (ou servem para sondá-lo) passam mesmo com o disjuntor aberto
+ROTAS_SEM_BANCO = ("/", "/health", "/health/profundo", "/metrics", "/cache/estatisticas", "/gastos/autocomplete")
+# Conexões longas (SSE) não ocupam vaga do limite nem têm prazo
+ROTAS_LONGAS = ("/eventos",)
+# Só leituras podem ser canceladas no meio: uma escrita interrompida deixa resumos e orçamentos para trás
+METODOS_COM_PRAZO = ("GET", "HEAD")
+
+# Erros do pymongo / códigos do servidor que indicam banco indisponível ou lento
+ERROS_INDISPONIBILIDADE = {
+    "AutoReconnect", "ConnectionFailure", "NetworkTimeout", "NotPrimaryError",
+    "ServerSelectionTimeoutError", "ExecutionTimeout", "WaitQueueTimeoutError",
+}
+CODIGOS_INDISPONIBILIDADE = {
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    50,     # MaxTimeMSExpired
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    189,    # PrimarySteppedDown
+    262,    # ExceededTimeLimit
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+}
+
+FECHADO, MEIO_ABERTO, ABERTO = "fechado", "meio_aberto", "aberto"
+_VALOR_ESTADO = {FECHADO: 0, MEIO_ABERTO: 1, ABERTO: 2}
+
+
+def indisponibilidade(falha) -> bool:
+    """True se a falha (exceção ou documento de falha do command monitoring) é de disponibilidade"""
+    if isinstance(falha, BaseException):
+        return type(falha).__name__ in ERROS_INDISPONIBILIDADE or bool(getattr(falha, "timeout", False))
+    if not isinstance(falha, dict):
+        return False
+    return falha.get("errtype") in ERROS_INDISPONIBILIDADE or falha.get("code") in CODIGOS_INDISPONIBILIDADE
+
+
+class Disjuntor:
+    def __init__(self, falhas_para_abrir: int = DISJUNTOR_FALHAS, segundos_aberto: float = DISJUNTOR_ABERTO_SEGUNDOS):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.segundos_aberto = segundos_aberto
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self._proxima_sonda = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        """Se a requisição pode usar o banco; aberto, libera uma sonda a cada `segundos_aberto`"""
+        if self.falhas_para_abrir <= 0:
+            return True
+        with self._lock:
+            if self.estado == FECHADO:
+                return True
+            agora = time.monotonic()
+            if agora < self._proxima_sonda:
+                return False
+            self._proxima_sonda = agora + self.segundos_aberto
+            self._mudar(MEIO_ABERTO)
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas_seguidas = 0
+            if self.estado != FECHADO:
+                print("🟢 Disjuntor do MongoDB fechado: banco respondendo de novo")
+                self._mudar(FECHADO)
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self.estado == MEIO_ABERTO or (
+                self.estado == FECHADO and 0 < self.falhas_para_abrir <= self.falhas_seguidas
+            ):
+                if self.estado == FECHADO:
+                    print(f"🔴 Disjuntor do MongoDB aberto após {self.falhas_seguidas} falhas seguidas")
+                self._proxima_sonda = time.monotonic() + self.segundos_aberto
+                self._mudar(ABERTO)
+
+    def registrar_comando(self, falha: Optional[dict] = None):
+        """Resultado de um comando (command monitoring): None = sucesso"""
+        if falha is not None and indisponibilidade(falha):
+            self.registrar_falha()
+        else:
+            self.registrar_sucesso()
+
+    def registrar_excecao(self, erro: BaseException):
+        """Exceção vista pela rota: só conta a seleção de servidor, que não passa pelos listeners"""
+        if type(erro).__name__ == "ServerSelectionTimeoutError":
+            self.registrar_falha()
+
+    def _mudar(self, estado: str):
+        self.estado = estado
+        metricas.disjuntor_estado.definir(valor=_VALOR_ESTADO[estado])
+
+    def resumo(self) -> dict:
+        return {"estado": self.estado, "falhas_seguidas": self.falhas_seguidas}
+
+
+disjuntor = Disjuntor()
+
+
+async def _responder_erro(send, status: int, detalhe: str, cabecalhos: tuple = ()):
+    corpo = json.dumps({"detail": detalhe}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(corpo)).encode()),
+            *cabecalhos,
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+class LimiteRequisicoes:
+    """Middleware ASGI: 503 imediato com o disjuntor aberto ou acima do limite de requisições em andamento"""
+
+    def __init__(self, app, maximo: int = MAX_REQUISICOES_EM_ANDAMENTO, disjuntor: Disjuntor = disjuntor):
+        self.app = app
+        self.maximo = maximo
+        self.disjuntor = disjuntor
+        self.em_andamento = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        caminho = scope["path"]
+        retry_after = ((b"retry-after", str(max(1, round(self.disjuntor.segundos_aberto))).encode()),)
+        if caminho not in ROTAS_SEM_BANCO and not self.disjuntor.permitir():
+            metricas.requisicoes_rejeitadas.incrementar("disjuntor")
+            await _responder_erro(send, 503, "Banco de dados indisponível, tente novamente em instantes", retry_after)
+            return
+
+        if caminho in ROTAS_LONGAS or self.maximo <= 0:
+            await self.app(scope, receive, send)
+            return
+        if self.em_andamento >= self.maximo:
+            metricas.requisicoes_rejeitadas.incrementar("sobrecarga")
+            await _responder_erro(send, 503, "Servidor sobrecarregado, tente novamente em instantes", ((b"retry-after", b"1"),))
+            return
+
+        self.em_andamento += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.em_andamento -= 1
+
+
+class PrazoRequisicao:
+    """Middleware ASGI: cancela a leitura que não começou a responder dentro do prazo e devolve 504"""
+
+    def __init__(self, app, prazo: float = PRAZO_REQUISICAO_SEGUNDOS):
+        self.app = app
+        self.prazo = prazo
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or self.prazo <= 0
+            or scope["method"] not in METODOS_COM_PRAZO or scope["path"] in ROTAS_LONGAS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        iniciada = False
+        expirada = False
+
+        async def enviar(mensagem):
+            nonlocal iniciada
+            if expirada:
+                return
+            if mensagem["type"] == "http.response.start":
+                iniciada = True
+            await send(mensagem)
+
+        tarefa = asyncio.ensure_future(self.app(scope, receive, enviar))
+        try:
+            await asyncio.wait_for(asyncio.shield(tarefa), self.prazo)
+            return
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            tarefa.cancel()
+            raise
+
+        if iniciada:
+            # Resposta em fluxo já começou: o prazo vale só até o primeiro byte
+            await tarefa
+            return
+
+        expirada = True
+        tarefa.cancel()
+        try:
+            await tarefa
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass  # a rota já foi abandonada; o cliente recebe o 504
+        metricas.requisicoes_rejeitadas.incrementar("prazo")
+        await _responder_erro(send, 504, f"Tempo limite da requisição excedido ({self.prazo:g} s)")
@@ -0,0 +1,181 @@
+"""Resumos mensais pré-agregados de gastos.
+
+Cada documento de `resumos_mensais` guarda soma (em centavos) e quantidade de
+gastos por (ano, mês, categoria, tipo de pagamento). As rotas de escrita mantêm os resumos
+com `$inc`; este módulo também reconstrói e verifica os resumos a partir dos
+gastos brutos:
+
+    python resumos.py --verificar     # relata divergências (exit 1 se houver)
+    python resumos.py --reconstruir   # recalcula tudo a partir de `gastos`
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from formato import ano_mes, centavos_do_gasto
+
+COLECAO_RESUMOS = "resumos_mensais"
+CAMPOS_CHAVE = ["ano", "mes", "categoria_id", "tipo_pagamento_id"]
+
+# Soma de um resumo em centavos; resumos anteriores à migração para centavos
+# ainda podem ter o `total` em float até a reconstrução feita por migracoes.py
+TOTAL_CENTAVOS = {
+    "$add": [
+        {"$ifNull": ["$total_centavos", 0]},
+        {"$round": [{"$multiply": [{"$ifNull": ["$total", 0]}, 100]}, 0]}
+    ]
+}
+
+# Mesmo agrupamento das rotas, calculado sobre os gastos brutos (já migrados: data BSON e centavos)
+PIPELINE_RESUMOS = [
+    {
+        "$group": {
+            "_id": {
+                "ano": {"$year": "$data_gasto"},
+                "mes": {"$month": "$data_gasto"},
+                "categoria_id": "$categoria.id",
+                "tipo_pagamento_id": "$tipo_pagamento.id"
+            },
+            "total_centavos": {"$sum": "$valor_centavos"},
+            "quantidade": {"$sum": 1},
+            "categoria_nome": {"$last": "$categoria.nome"},
+            "categoria_cor": {"$last": "$categoria.cor"}
+        }
+    },
+    {
+        "$project": {
+            "_id": 0,
+            "ano": "$_id.ano",
+            "mes": "$_id.mes",
+            "categoria_id": "$_id.categoria_id",
+            "tipo_pagamento_id": "$_id.tipo_pagamento_id",
+            "total_centavos": 1,
+            "quantidade": 1,
+            "categoria_nome": 1,
+            "categoria_cor": 1
+        }
+    }
+]
+
+
+def chave_resumo(gasto: dict) -> dict:
+    """Chave (ano, mês, categoria, tipo de pagamento) do resumo de um gasto"""
+    ano, mes = ano_mes(gasto["data_gasto"])
+    return {
+        "ano": ano,
+        "mes": mes,
+        "categoria_id": (gasto.get("categoria") or {}).get("id"),
+        "tipo_pagamento_id": (gasto.get("tipo_pagamento") or {}).get("id")
+    }
+
+
+async def aplicar_resumos(colecao, alteracoes: list):
+    """Aplica uma lista de (gasto, sinal) aos resumos em um único bulk_write.
+
+    Alterações com a mesma chave são somadas antes da escrita; resumos que
+    zeraram depois de um decremento são removidos.
+    """
+    deltas = {}
+    for gasto, sinal in alteracoes:
+        chave = tuple(chave_resumo(gasto).items())
+        delta = deltas.setdefault(chave, {"total": 0, "quantidade": 0, "decremento": False, "categoria": None})
+        delta["total"] += sinal * centavos_do_gasto(gasto)
+        delta["quantidade"] += sinal
+        if sinal > 0:
+            delta["categoria"] = gasto.get("categoria") or {}
+        else:
+            delta["decremento"] = True
+
+    operacoes = []
+    decrementadas = []
+    for chave, delta in deltas.items():
+        filtro = dict(chave)
+        atualizacao = {"$inc": {"total_centavos": delta["total"], "quantidade": delta["quantidade"]}}
+        if delta["categoria"] is not None:
+            atualizacao["$set"] = {
+                "categoria_nome": delta["categoria"].get("nome"),
+                "categoria_cor": delta["categoria"].get("cor")
+            }
+        operacoes.append(UpdateOne(filtro, atualizacao, upsert=True))
+        if delta["decremento"]:
+            decrementadas.append(filtro)
+
+    if not operacoes:
+        return
+
+    await colecao.bulk_write(operacoes, ordered=True)
+
+    if decrementadas:
+        await colecao.delete_many({"$or": decrementadas, "quantidade": {"$lte": 0}})
+
+
+async def criar_indices(colecao):
+    await colecao.create_index([(campo, 1) for campo in CAMPOS_CHAVE], unique=True)
+
+
+async def reconstruir(database):
+    """Recalcula os resumos a partir dos gastos (substituição atômica via $out)"""
+    pipeline = PIPELINE_RESUMOS + [{"$out": COLECAO_RESUMOS}]
+    await database.gastos.aggregate(pipeline).to_list(None)
+    await criar_indices(database[COLECAO_RESUMOS])
+    return await database[COLECAO_RESUMOS].count_documents({})
+
+
+async def verificar(database) -> list:
+    """Compara os resumos mantidos incrementalmente com os gastos brutos (exige a migração concluída)"""
+    esperados = {}
+    async for resumo in database.gastos.aggregate(PIPELINE_RESUMOS):
+        esperados[tuple(resumo[campo] for campo in CAMPOS_CHAVE)] = resumo
+
+    atuais = {}
+    async for resumo in database[COLECAO_RESUMOS].find():
+        resumo["total_centavos"] = resumo.get("total_centavos", 0) + round(resumo.get("total", 0) * 100)
+        atuais[tuple(resumo.get(campo) for campo in CAMPOS_CHAVE)] = resumo
+
+    divergencias = []
+    for chave in sorted(set(esperados) | set(atuais), key=str):
+        esperado = esperados.get(chave, {"total_centavos": 0, "quantidade": 0})
+        atual = atuais.get(chave, {"total_centavos": 0, "quantidade": 0})
+        if esperado["total_centavos"] != atual["total_centavos"] or esperado["quantidade"] != atual["quantidade"]:
+            divergencias.append({
+                **dict(zip(CAMPOS_CHAVE, chave)),
+                "total_centavos_esperado": esperado["total_centavos"],
+                "total_centavos_atual": atual["total_centavos"],
+                "quantidade_esperada": esperado["quantidade"],
+                "quantidade_atual": atual["quantidade"]
+            })
+
+    return divergencias
+
+
+async def _executar(args) -> int:
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    database = client[os.environ.get("MONGODB_DATABASE", "controle_gastos")]
+
+    try:
+        if args.reconstruir:
+            total = await reconstruir(database)
+            print(f"✅ Resumos reconstruídos: {total} linha(s)")
+            return 0
+
+        divergencias = await verificar(database)
+        for divergencia in divergencias:
+            print(f"⚠️ Divergência: {divergencia}")
+        print(f"📊 {len(divergencias)} divergência(s) encontrada(s)")
+        return 1 if divergencias else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrução e verificação dos resumos mensais de gastos")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--verificar", action="store_true", help="relatar divergências entre resumos e gastos")
+    grupo.add_argument("--reconstruir", action="store_true", help="recalcular os resumos a partir dos gastos")
+    sys.exit(asyncio.run(_executar(parser.parse_args())))
@@ -0,0 +1,62 @@
+"""API rodando sobre o banco local embutido: cada teste recebe um banco em memória vazio.
+
+A aplicação sobe uma vez por sessão (startup real, tarefas em segundo plano inclusas);
+o que muda entre os testes é o cliente de banco, trocado como no fallback do modo offline.
+"""
+import os
+
+# Antes de importar a aplicação: nada de MongoDB nem de dados gravados em disco (o .env não sobrescreve)
+os.environ["ARMAZENAMENTO"] = "local"
+os.environ["ARMAZENAMENTO_LOCAL_DIR"] = ""
+os.environ["FONTE_EVENTOS"] = "rotas"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from banco_local import ClienteLocal
+from indices import sincronizar
+
+
+@pytest.fixture(scope="session")
+def aplicacao():
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def api(aplicacao, monkeypatch):
+    async def banco_novo():
+        main._usar_cliente(ClienteLocal())
+        await sincronizar(main.database)
+
+    aplicacao.portal.call(banco_novo)
+    monkeypatch.setattr(main, "versoes_colecoes", main.VersoesColecoes(main.COLECOES_EVENTOS))
+    for cache in main.CACHES_REFERENCIAS.values():
+        cache.invalidar()
+    return aplicacao
+
+
+@pytest.fixture
+def referencias(api):
+    """Uma categoria e um tipo de pagamento para os gastos do teste"""
+    categoria = api.post("/categorias", json={"nome": "Mercado"}).json()
+    tipo = api.post("/tipos-pagamento", json={"nome": "Pix"}).json()
+    return categoria["id"], tipo["id"]
+
+
+@pytest.fixture
+def criar_gasto(api, referencias):
+    categoria_id, tipo_id = referencias
+
+    def criar(descricao: str, valor: float, data_gasto: str) -> dict:
+        resposta = api.post("/gastos", json={
+            "descricao": descricao,
+            "valor": valor,
+            "data_gasto": data_gasto,
+            "categoria_id": categoria_id,
+            "tipo_pagamento_id": tipo_id
+        })
+        assert resposta.status_code == 200, resposta.text
+        return resposta.json()
+    return criar
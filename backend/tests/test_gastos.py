@@ -0,0 +1,76 @@
+import main
+
+
+def test_paginacao_por_cursor_percorre_tudo_sem_repetir(api, criar_gasto):
+    # Datas repetidas: o desempate por _id é o que impede repetição entre páginas
+    criados = [criar_gasto(f"Gasto {i}", 10 + i, f"2024-03-{1 + i % 3:02d}") for i in range(7)]
+
+    vistos = []
+    resposta = api.get("/gastos", params={"limit": 3})
+    while True:
+        assert resposta.status_code == 200
+        vistos += resposta.json()
+        cursor = resposta.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        resposta = api.get("/gastos", params={"limit": 3, "after": cursor})
+
+    assert [gasto["id"] for gasto in vistos] == [gasto["id"] for gasto in api.get("/gastos").json()]
+    assert sorted(gasto["id"] for gasto in vistos) == sorted(gasto["id"] for gasto in criados)
+    datas = [gasto["data_gasto"] for gasto in vistos]
+    assert datas == sorted(datas, reverse=True)
+
+
+def test_cursor_invalido_e_recusado(api):
+    assert api.get("/gastos", params={"after": "nao-e-cursor"}).status_code == 400
+
+
+def test_etag_responde_304_ate_a_proxima_escrita(api, criar_gasto):
+    criar_gasto("Padaria", 12.5, "2024-03-01")
+    api.portal.call(main._recarregar_versoes)
+
+    primeira = api.get("/gastos")
+    etag = primeira.headers["ETag"]
+    assert api.get("/gastos", headers={"If-None-Match": etag}).status_code == 304
+    assert api.get("/gastos", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    # A escrita local muda o ETag na hora, sem esperar a recarga
+    criar_gasto("Feira", 30, "2024-03-02")
+    segunda = api.get("/gastos", headers={"If-None-Match": etag})
+    assert segunda.status_code == 200
+    assert len(segunda.json()) == 2
+
+    # Consolidada, a versão fica igual à que os outros workers calculam
+    api.portal.call(main._recarregar_versoes)
+    terceira = api.get("/gastos", headers={"If-None-Match": segunda.headers["ETag"]})
+    assert terceira.status_code == 200
+    assert api.get("/gastos", headers={"If-None-Match": terceira.headers["ETag"]}).status_code == 304
+
+
+def test_etag_por_colecao(api, referencias, criar_gasto):
+    api.portal.call(main._recarregar_versoes)
+    etag = api.get("/categorias").headers["ETag"]
+
+    criar_gasto("Padaria", 12.5, "2024-03-01")
+    api.portal.call(main._recarregar_versoes)
+    assert api.get("/categorias", headers={"If-None-Match": etag}).status_code == 304
+
+    api.post("/categorias", json={"nome": "Lazer"})
+    assert api.get("/categorias", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_escrita_de_outro_worker_chega_pela_recarga(api, referencias):
+    api.portal.call(main._recarregar_versoes)
+    etag = api.get("/categorias").headers["ETag"]
+
+    async def outro_worker():
+        # Mesmo caminho de uma escrita, sem passar pelas rotas deste processo
+        async with main._reservar_versoes() as versao:
+            await main.categorias_collection.insert_one({"nome": "Viagem", "cor": "#000000", "versao": versao})
+
+    api.portal.call(outro_worker)
+    assert api.get("/categorias", headers={"If-None-Match": etag}).status_code == 304
+    api.portal.call(main._recarregar_versoes)
+    resposta = api.get("/categorias", headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert "Viagem" in [categoria["nome"] for categoria in resposta.json()]
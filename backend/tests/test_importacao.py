@@ -0,0 +1,45 @@
+import random
+
+
+def _importar(api, referencias, linhas: list) -> dict:
+    categoria_id, tipo_id = referencias
+    resposta = api.post(
+        "/gastos/importar",
+        files={"arquivo": ("extrato.csv", "\n".join(["data,descricao,valor"] + linhas).encode())},
+        data={"categoria_id": categoria_id, "tipo_pagamento_id": tipo_id}
+    )
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()
+
+
+def test_reimportar_o_mesmo_extrato_nao_duplica(api, referencias):
+    # Lançamentos idênticos no mesmo dia são gastos distintos (dois cafés), não duplicatas
+    linhas = [f"{dia:02d}/03/2024,Cafe,-5.00" for dia in (1, 1, 2, 3, 3, 3)]
+    linhas += [f"0{dia}/03/2024,Mercado {dia},-{dia}0.00" for dia in range(1, 9)]
+
+    primeira = _importar(api, referencias, linhas)
+    assert primeira["inseridas"] == 14 and primeira["duplicadas"] == 0
+
+    # Outra ordem dentro do mesmo extrato gera os mesmos hashes
+    embaralhadas = list(linhas)
+    random.Random(1).shuffle(embaralhadas)
+    segunda = _importar(api, referencias, embaralhadas)
+    assert segunda["inseridas"] == 0 and segunda["duplicadas"] == 14
+    assert len(api.get("/gastos").json()) == 14
+
+
+def test_extrato_com_mais_um_lancamento_importa_so_o_novo(api, referencias):
+    linhas = ["01/03/2024,Cafe,-5.00", "01/03/2024,Cafe,-5.00"]
+    _importar(api, referencias, linhas)
+
+    resultado = _importar(api, referencias, linhas + ["01/03/2024,Cafe,-5.00"])
+    assert resultado["inseridas"] == 1 and resultado["duplicadas"] == 2
+
+
+def test_data_fora_da_janela_vira_erro(api, referencias):
+    linhas = [f"{dia:02d}/03/2024,Gasto {dia},-1.00" for dia in range(1, 12)] + ["01/03/2024,Atrasado,-1.00"]
+
+    resultado = _importar(api, referencias, linhas)
+    assert resultado["inseridas"] == 11
+    assert resultado["erros"] == 1
+    assert "fora de ordem" in resultado["mensagens_erro"][0]
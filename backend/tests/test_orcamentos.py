@@ -0,0 +1,63 @@
+def _situacao(api, categoria_id: str) -> dict:
+    orcamentos = api.get("/orcamentos/2024/3").json()["categorias"]
+    return next(orcamento for orcamento in orcamentos if orcamento["categoria"]["id"] == categoria_id)
+
+
+def test_alertas_ao_cruzar_80_e_100_por_cento(api, referencias, criar_gasto):
+    categoria_id, _ = referencias
+    resposta = api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": 100})
+    assert resposta.status_code == 200
+    assert resposta.json()["situacao"] == "ok"
+
+    criar_gasto("Mercado", 79.99, "2024-03-05")
+    assert api.get("/orcamentos/alertas").json() == []
+    assert _situacao(api, categoria_id)["situacao"] == "ok"
+
+    criar_gasto("Padaria", 0.01, "2024-03-06")
+    assert [alerta["limiar"] for alerta in api.get("/orcamentos/alertas").json()] == [80]
+    assert _situacao(api, categoria_id)["situacao"] == "alerta"
+
+    # Outro mês não conta para o orçamento de março
+    criar_gasto("Abril", 50, "2024-04-01")
+    assert len(api.get("/orcamentos/alertas").json()) == 1
+
+    criar_gasto("Feira", 20, "2024-03-07")
+    alertas = api.get("/orcamentos/alertas").json()
+    assert [alerta["limiar"] for alerta in alertas] == [100, 80]
+    assert alertas[0]["gasto"] == 100 and alertas[0]["limite"] == 100
+    situacao = _situacao(api, categoria_id)
+    assert situacao["situacao"] == "estourado" and situacao["restante"] == 0
+
+
+def test_um_gasto_que_cruza_os_dois_limiares_gera_dois_alertas(api, referencias, criar_gasto):
+    categoria_id, _ = referencias
+    api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": 10})
+    criar_gasto("Tudo de uma vez", 15, "2024-03-01")
+    assert sorted(alerta["limiar"] for alerta in api.get("/orcamentos/alertas").json()) == [80, 100]
+
+
+def test_remover_gasto_volta_abaixo_do_limite(api, referencias, criar_gasto):
+    categoria_id, _ = referencias
+    api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": 10})
+    gasto = criar_gasto("Caro", 12, "2024-03-01")
+    assert _situacao(api, categoria_id)["situacao"] == "estourado"
+
+    api.delete(f"/gastos/{gasto['id']}")
+    situacao = _situacao(api, categoria_id)
+    assert situacao["situacao"] == "ok" and situacao["gasto"] == 0
+
+
+def test_limite_definido_depois_dos_gastos_considera_o_total(api, referencias, criar_gasto):
+    categoria_id, _ = referencias
+    criar_gasto("Antes do limite", 9, "2024-03-01")
+    resposta = api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": 10}).json()
+    assert resposta["gasto"] == 9 and resposta["situacao"] == "alerta"
+
+
+def test_limite_invalido(api, referencias):
+    categoria_id, _ = referencias
+    assert api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": 0}).status_code == 400
+    assert api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": 0.001}).status_code == 400
+    assert api.put("/orcamentos/2024/3/000000000000000000000000", json={"limite": 10}).status_code == 404
+    removido = api.put(f"/orcamentos/2024/3/{categoria_id}", json={"limite": None}).json()
+    assert removido["situacao"] == "sem_limite"
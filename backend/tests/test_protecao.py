@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+import protecao
+
+
+def _app_de_teste(liberar: asyncio.Event = None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/lenta")
+    async def lenta():
+        await asyncio.sleep(1)
+        return {"ok": True}
+
+    @app.post("/lenta")
+    async def escrita_lenta():
+        await asyncio.sleep(0.2)
+        return {"gravado": True}
+
+    @app.get("/fluxo")
+    async def fluxo():
+        async def gerar():
+            yield b"inicio\n"
+            await asyncio.sleep(0.2)
+            yield b"fim\n"
+        return StreamingResponse(gerar(), media_type="text/plain")
+
+    @app.get("/espera")
+    async def espera():
+        await liberar.wait()
+        return {"ok": True}
+
+    @app.get("/gastos")
+    async def gastos():
+        return []
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def _cliente(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste")
+
+
+def test_prazo_cancela_leitura_lenta_com_504():
+    app = protecao.PrazoRequisicao(_app_de_teste(), prazo=0.05)
+
+    async def cenario():
+        async with _cliente(app) as cliente:
+            return await cliente.get("/lenta")
+
+    resposta = asyncio.run(cenario())
+    assert resposta.status_code == 504
+    assert "0.05" in resposta.json()["detail"]
+
+
+def test_prazo_nao_vale_para_escritas():
+    app = protecao.PrazoRequisicao(_app_de_teste(), prazo=0.05)
+
+    async def cenario():
+        async with _cliente(app) as cliente:
+            return await cliente.post("/lenta")
+
+    resposta = asyncio.run(cenario())
+    assert resposta.status_code == 200
+    assert resposta.json() == {"gravado": True}
+
+
+def test_prazo_nao_interrompe_resposta_em_fluxo_ja_iniciada():
+    app = protecao.PrazoRequisicao(_app_de_teste(), prazo=0.05)
+
+    async def cenario():
+        async with _cliente(app) as cliente:
+            return await cliente.get("/fluxo")
+
+    resposta = asyncio.run(cenario())
+    assert resposta.status_code == 200
+    assert resposta.text == "inicio\nfim\n"
+
+
+def test_disjuntor_aberto_responde_503_e_libera_uma_sonda():
+    disjuntor = protecao.Disjuntor(falhas_para_abrir=2, segundos_aberto=0.1)
+    app = protecao.LimiteRequisicoes(_app_de_teste(), disjuntor=disjuntor)
+
+    async def cenario():
+        async with _cliente(app) as cliente:
+            assert (await cliente.get("/gastos")).status_code == 200
+            disjuntor.registrar_falha()
+            disjuntor.registrar_falha()
+            assert disjuntor.estado == protecao.ABERTO
+
+            rejeitada = await cliente.get("/gastos")
+            assert rejeitada.status_code == 503
+            assert rejeitada.headers["Retry-After"] == "1"
+            # Rotas sem banco continuam respondendo (o health check sonda o banco)
+            assert (await cliente.get("/health")).status_code == 200
+
+            await asyncio.sleep(0.15)
+            assert (await cliente.get("/gastos")).status_code == 200
+            assert disjuntor.estado == protecao.MEIO_ABERTO
+            assert (await cliente.get("/gastos")).status_code == 503
+
+            disjuntor.registrar_sucesso()
+            assert (await cliente.get("/gastos")).status_code == 200
+
+    asyncio.run(cenario())
+
+
+def test_disjuntor_conta_so_falhas_de_disponibilidade():
+    disjuntor = protecao.Disjuntor(falhas_para_abrir=1)
+    disjuntor.registrar_comando({"code": 11000, "errtype": "DuplicateKeyError"})
+    assert disjuntor.estado == protecao.FECHADO
+    disjuntor.registrar_comando({"code": 50, "errtype": "OperationFailure"})
+    assert disjuntor.estado == protecao.ABERTO
+
+
+def test_excedente_de_requisicoes_recebe_503_sem_fila():
+    async def cenario():
+        liberar = asyncio.Event()
+        app = protecao.LimiteRequisicoes(_app_de_teste(liberar), maximo=1, disjuntor=protecao.Disjuntor())
+        async with _cliente(app) as cliente:
+            ocupando = asyncio.create_task(cliente.get("/espera"))
+            while app.em_andamento == 0:
+                await asyncio.sleep(0.01)
+
+            excedente = await cliente.get("/gastos")
+            liberar.set()
+            return await ocupando, excedente, app.em_andamento
+
+    ocupando, excedente, em_andamento = asyncio.run(cenario())
+    assert ocupando.status_code == 200
+    assert excedente.status_code == 503
+    assert excedente.headers["Retry-After"] == "1"
+    assert em_andamento == 0
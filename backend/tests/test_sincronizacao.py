@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import main
+
+
+def _snapshot(api, limit: int) -> tuple:
+    pagina = api.get("/gastos/changes", params={"limit": limit}).json()
+    assert pagina["completo"]
+    token = pagina["token"]
+    gastos = pagina["gastos"]
+    while pagina["proximo"]:
+        pagina = api.get("/gastos/changes", params={"after": pagina["proximo"], "limit": limit}).json()
+        assert pagina["token"] == token
+        gastos += pagina["gastos"]
+    return token, gastos
+
+
+def _versao_do_gasto(api, gasto_id: str) -> int:
+    async def ler():
+        documento = await main.gastos_collection.find_one({"_id": main.ObjectId(gasto_id)})
+        return documento["versao"]
+    return api.portal.call(ler)
+
+
+def test_snapshot_paginado_e_delta_pelo_token(api, criar_gasto):
+    criados = [criar_gasto(f"Gasto {i}", 5, f"2024-01-{1 + i % 4:02d}") for i in range(9)]
+
+    token, gastos = _snapshot(api, limit=4)
+    assert sorted(gasto["id"] for gasto in gastos) == sorted(gasto["id"] for gasto in criados)
+
+    novo = criar_gasto("Depois do snapshot", 7, "2024-02-01")
+    api.delete(f"/gastos/{criados[0]['id']}")
+    delta = api.get("/gastos/changes", params={"since": token}).json()
+    assert not delta["completo"]
+    assert [gasto["id"] for gasto in delta["gastos"]] == [novo["id"]]
+    assert delta["removidos"] == [criados[0]["id"]]
+
+    # Nada novo: mesmo token, delta vazio
+    vazio = api.get("/gastos/changes", params={"since": delta["token"]}).json()
+    assert vazio["gastos"] == [] and vazio["removidos"] == []
+    assert vazio["token"] == delta["token"]
+
+
+def test_delta_paginado_respeita_o_limite(api, criar_gasto):
+    token, _ = _snapshot(api, limit=10)
+    for i in range(5):
+        criar_gasto(f"Gasto {i}", 1, "2024-01-01")
+
+    recebidos = []
+    while True:
+        delta = api.get("/gastos/changes", params={"since": token, "limit": 2}).json()
+        recebidos += delta["gastos"]
+        token = delta["token"]
+        if not delta["mais"]:
+            break
+    assert len({gasto["id"] for gasto in recebidos}) == 5
+
+
+def test_token_anterior_as_remocoes_expiradas_recebe_snapshot(api, criar_gasto):
+    gastos = [criar_gasto(f"Gasto {i}", 3, "2024-01-01") for i in range(3)]
+    token_antigo, _ = _snapshot(api, limit=10)
+
+    api.delete(f"/gastos/{gastos[0]['id']}")
+    token_recente = api.get("/gastos/changes", params={"since": token_antigo}).json()["token"]
+
+    async def envelhecer_e_expirar():
+        await main.remocoes_collection.update_many({}, {"$set": {"removido_em": datetime.now() - timedelta(days=main.REMOCOES_RETENCAO_DIAS + 1)}})
+        return await main._expirar_remocoes()
+
+    assert api.portal.call(envelhecer_e_expirar) == 1
+
+    # O tombstone sumiu: um delta a partir do token antigo não traria a remoção
+    resposta = api.get("/gastos/changes", params={"since": token_antigo}).json()
+    assert resposta["completo"]
+    assert sorted(gasto["id"] for gasto in resposta["gastos"]) == sorted(gasto["id"] for gasto in gastos[1:])
+    assert api.portal.call(main._eventos_desde, int(token_antigo)) is None
+
+    # Quem já tinha visto a remoção continua no delta
+    assert not api.get("/gastos/changes", params={"since": token_recente}).json()["completo"]
+
+
+def test_tokens_e_cursores_invalidos(api):
+    assert api.get("/gastos/changes", params={"since": "abc"}).status_code == 400
+    assert api.get("/gastos/changes", params={"after": "abc"}).status_code == 400
+    # Cursor de GET /gastos (sem o token do snapshot) não serve para o snapshot
+    cursor = main._codificar_cursor({"data_gasto": datetime(2024, 1, 1), "_id": main.ObjectId()})
+    assert api.get("/gastos/changes", params={"after": cursor}).status_code == 400
+
+
+def test_versao_reservada_por_escrita_que_falhou_nao_segura_o_token(api, criar_gasto):
+    async def escrita_que_falha():
+        try:
+            async with main._reservar_versoes():
+                raise RuntimeError("falha simulada")
+        except RuntimeError:
+            pass
+
+    api.portal.call(escrita_que_falha)
+    gasto = criar_gasto("Depois da falha", 2, "2024-01-01")
+    delta = api.get("/gastos/changes", params={"since": "0"}).json()
+    assert [item["id"] for item in delta["gastos"]] == [gasto["id"]]
+    assert int(delta["token"]) == _versao_do_gasto(api, gasto["id"])
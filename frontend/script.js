@@ -2,12 +2,14 @@ const API_URL = 'http://localhost:8000';
 let categorias = [];
 let tiposPagamento = [];
 let gastos = [];
+let syncToken = null;
 let autoRefreshInterval;
+let autocompleteTimeout;
 
 // Inicialização
 document.addEventListener('DOMContentLoaded', function() {
     setDateToToday();
-    startAutoRefresh();
+    startLiveUpdates();
     checkConnection();
     loadCategorias();
     loadTiposPagamento();
@@ -17,6 +19,7 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('form-gasto').addEventListener('submit', handleAddGasto);
     document.getElementById('form-categoria').addEventListener('submit', handleAddCategoria);
     document.getElementById('form-pagamento').addEventListener('submit', handleAddTipoPagamento);
+    document.getElementById('gasto-descricao').addEventListener('input', handleDescricaoInput);
     
     // Modal event listeners
     document.addEventListener('click', function(e) {
@@ -67,12 +70,69 @@ function setDateToToday() {
 }
 
 function startAutoRefresh() {
+    if (autoRefreshInterval) {
+        return;
+    }
     autoRefreshInterval = setInterval(() => {
-        loadGastos();
-        calculateTotal();
+        syncGastos();
     }, 5000);
 }
 
+function stopAutoRefresh() {
+    clearInterval(autoRefreshInterval);
+    autoRefreshInterval = null;
+}
+
+// Atualizações em tempo real via SSE; o polling fica apenas como fallback
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        startAutoRefresh();
+        return;
+    }
+    
+    const eventSource = new EventSource(`${API_URL}/eventos`);
+    
+    eventSource.onopen = () => {
+        // Conectado (ou reconectado): parar o polling e recuperar o que ficou para trás
+        stopAutoRefresh();
+        syncGastos();
+    };
+    
+    eventSource.onerror = () => {
+        // O EventSource reconecta sozinho (enviando Last-Event-ID); até lá, polling
+        startAutoRefresh();
+    };
+    
+    eventSource.onmessage = (event) => handleLiveEvent(JSON.parse(event.data));
+}
+
+function handleLiveEvent(evento) {
+    if (evento.tipo === 'resync') {
+        syncGastos();
+        loadCategorias();
+        loadTiposPagamento();
+    } else if (evento.tipo === 'gasto' && evento.acao === 'lote') {
+        // Criação em massa: os detalhes vêm pela sincronização incremental
+        syncGastos();
+    } else if (evento.tipo === 'gasto') {
+        if (evento.acao === 'removido') {
+            applyGastosDelta({ gastos: [], removidos: [evento.id] });
+        } else {
+            applyGastosDelta({ gastos: [evento.dados], removidos: [] });
+        }
+        updateHistorico();
+        calculateTotal();
+    } else if (evento.tipo === 'categoria') {
+        loadCategorias();
+    } else if (evento.tipo === 'tipo_pagamento') {
+        loadTiposPagamento();
+    } else if (evento.tipo === 'orcamento' && evento.acao === 'alerta') {
+        const alerta = evento.dados;
+        const nome = alerta.categoria_nome || 'categoria';
+        showNotification(`Orçamento de ${nome}: ${alerta.limiar}% do limite atingido`, alerta.limiar >= 100 ? 'error' : 'info');
+    }
+}
+
 async function checkConnection() {
     const statusIndicator = document.getElementById('status-indicator');
     const statusText = document.getElementById('status-text');
@@ -111,6 +171,29 @@ async function loadTiposPagamento() {
     }
 }
 
+// Sugestões de descrição (debounce para não disparar um request por tecla)
+function handleDescricaoInput(e) {
+    clearTimeout(autocompleteTimeout);
+    const termo = e.target.value.trim();
+    if (termo.length < 2) return;
+    
+    autocompleteTimeout = setTimeout(async () => {
+        try {
+            const response = await fetch(`${API_URL}/gastos/autocomplete?q=${encodeURIComponent(termo)}&limit=8`);
+            const sugestoes = await response.json();
+            const datalist = document.getElementById('descricoes-sugeridas');
+            datalist.innerHTML = '';
+            sugestoes.forEach(sugestao => {
+                const option = document.createElement('option');
+                option.value = sugestao.descricao;
+                datalist.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Erro ao buscar sugestões:', error);
+        }
+    }, 150);
+}
+
 function updateCategoriaSelect() {
     const select = document.getElementById('gasto-categoria');
     select.innerHTML = '<option value="">Selecione uma categoria...</option>';
@@ -137,8 +220,26 @@ function updateTipoPagamentoSelect() {
 
 async function loadGastos() {
     try {
-        const response = await fetch(`${API_URL}/gastos`);
-        gastos = await response.json();
+        // Snapshot paginado + token (o da primeira página) para as sincronizações incrementais seguintes
+        let url = `${API_URL}/gastos/changes`;
+        const carregados = [];
+        let token = null;
+        
+        while (url) {
+            const response = await fetch(url);
+            if (!response.ok) {
+                throw new Error('Resposta inválida');
+            }
+            const pagina = await response.json();
+            carregados.push(...pagina.gastos);
+            if (token === null) {
+                token = pagina.token;
+            }
+            url = pagina.proximo ? `${API_URL}/gastos/changes?after=${encodeURIComponent(pagina.proximo)}` : null;
+        }
+        
+        gastos = carregados;
+        syncToken = token;
         
         updateHistorico();
         calculateTotal();
@@ -147,6 +248,54 @@ async function loadGastos() {
     }
 }
 
+async function syncGastos() {
+    if (syncToken === null) {
+        return loadGastos();
+    }
+    
+    try {
+        let changed = false;
+        let mais = true;
+        
+        // Buscar apenas o que mudou desde o último token
+        while (mais) {
+            const response = await fetch(`${API_URL}/gastos/changes?since=${encodeURIComponent(syncToken)}`);
+            if (!response.ok) {
+                throw new Error('Resposta inválida');
+            }
+            const delta = await response.json();
+            
+            if (delta.completo) {
+                // Token anterior às remoções já expiradas: recomeçar do snapshot
+                return loadGastos();
+            }
+            
+            if (delta.gastos.length > 0 || delta.removidos.length > 0) {
+                applyGastosDelta(delta);
+                changed = true;
+            }
+            syncToken = delta.token;
+            mais = delta.mais;
+        }
+        
+        if (changed) {
+            updateHistorico();
+            calculateTotal();
+        }
+    } catch (error) {
+        console.error('Erro ao sincronizar gastos:', error);
+    }
+}
+
+function applyGastosDelta(delta) {
+    const porId = new Map(gastos.map(gasto => [gasto.id, gasto]));
+    
+    delta.gastos.forEach(gasto => porId.set(gasto.id, gasto));
+    delta.removidos.forEach(id => porId.delete(id));
+    
+    gastos = Array.from(porId.values());
+}
+
 function updateHistorico() {
     const container = document.getElementById('historico-content');
     
@@ -212,8 +361,8 @@ async function handleAddGasto(event) {
             document.getElementById('form-gasto').reset();
             setDateToToday();
             
-            // Recarregar dados
-            loadGastos();
+            // Sincronizar dados
+            syncGastos();
             
             // Mostrar mensagem de sucesso
             showNotification('Gasto adicionado com sucesso!', 'success');
@@ -237,7 +386,7 @@ async function deleteGasto(gastoId) {
         });
         
         if (response.ok) {
-            loadGastos();
+            syncGastos();
             showNotification('Gasto removido com sucesso!', 'success');
         } else {
             const error = await response.json();